@@ -1,7 +1,25 @@
 """
 
+Submodules are imported on first access, so `import downloader` and the
+command line tool load only what they use.
 """
 
-from . import aria2c, settings, user
+import importlib
 
-__all__ = ['aria2c', 'settings', 'user']
+__all__ = ['aio', 'aria2c', 'autotune', 'batch', 'cache', 'distributed',
+           'engine', 'governor', 'metrics', 'mirrors', 'options', 'pool',
+           'preflight', 'priority', 'profiling', 'progress', 'rpc', 'rules',
+           'scheduler', 'session', 'settings', 'storage', 'user', 'verify']
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module('.' + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError('module {!r} has no attribute {!r}'
+                         .format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
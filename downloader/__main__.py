@@ -1,33 +1,568 @@
 """Entry file for downloader"""
 
+import os
 import sys
+import time
 
 import click
 
-from .aria2c import Aria2c
+# Choices of --settings, other modules are imported where they are used so
+# start of the tool stays fast, see benchmark startup
 from .settings import Settings
-from .secret import team_city_user
 
+SAVE_SESSION_INTERVAL = 10
+DEFAULT_SETTINGS = 'recommended'
 
-@click.command()
-@click.argument('url', nargs=1, type=click.STRING)
-def main(url):
-    """Entry function for downloader
+
+def _match(rules, url):
+    """Rules matching URL, missing credentials end the program"""
+    match = rules.match(url)
+    try:
+        match.user()
+    except LookupError as error:
+        raise click.ClickException('{}: {}'.format(url, error))
+    return match
+
+
+def url_options(url, rules):
+    """aria2c options which apply only to given URL
 
     Arguments:
         url (str): Download URL
+        rules (rules.RuleSet): Compiled URL rules
+
+    Returns:
+        dict: Options e.g. credentials of the host
     """
-    settings = Settings('recommended')
+    return dict(_match(rules, url).aria2c_options())
+
+
+def _job(settings, rules, uri, options):
+    """Download of one URL, used to find its cached copy"""
+    from .aria2c import Aria2c
+    aria2c = Aria2c()
+    aria2c.use_settings(settings)
+    aria2c.uri = uri
+    _match(rules, uri).apply(aria2c)
+    aria2c.http_user = options.get('http-user')
+    aria2c.http_passwd = options.get('http-passwd')
+    return aria2c
+
+
+def _fixed(job, attrs, profile):
+    """Options of job set by its rules or by --settings profile given
+    explicitly, tuning by size keeps them"""
+    values = Settings.PROFILES.get(profile, ())
+    return set(attr for attr in attrs if job.is_set(attr) or attr in values)
+
+
+def _unfinished(session, rules):
+    """Pending jobs of session with credentials of rules"""
+    try:
+        return session.unfinished(rules)
+    except LookupError as error:
+        raise click.ClickException(str(error))
+
+
+def _record(metrics, entries, returncode, duration):
+    """Record jobs run by one aria2c process"""
+    import urllib.parse
+    from .session import completed
+    if returncode is not None:
+        metrics.exit_codes.inc(1, (str(returncode),))
+    for uris, _, job in entries:
+        done = completed(job.path)
+        metrics.finish(urllib.parse.urlsplit(uris[0]).hostname or '',
+                       os.path.getsize(job.path) if done else 0, duration,
+                       not done)
+
+
+def _single(entry):
+    """Download of one entry by its own aria2c process"""
+    # Job has options of rules and preflight, checksum is verified here
+    uris, options, job = entry
+    downloader = job.copy()
+    downloader.checksum = None
+    downloader.uris = uris
+    downloader.uri_selector = options.get('uri-selector')
+    # The same GID as in session journal, so aria2c session file matches it
+    downloader.gid = options.get('gid')
+    return downloader
+
+
+def _learn(tuning, downloader, elapsed):
+    """Record throughput of tuned download which ran on its own"""
+    from .session import completed
+    autotuner, tuned = tuning
+    if downloader.path in tuned and completed(downloader.path):
+        host, size, candidate = tuned[downloader.path]
+        autotuner.record(host, size, candidate, size / max(elapsed, 1e-3))
+
+
+def _download(settings, entries, session=None, metrics=None, tuning=None):
+    """Download entries by one aria2c process
+
+    Built-in engine used without aria2c downloads one URI at a time, every
+    entry is run on its own then. Autotuner of tuning learns throughput of
+    such downloads from their (host, size, candidate) by path.
+    """
+    if not entries:
+        return
+
+    import shutil
+    from .aria2c import Aria2c
+    from .batch import InputFile
+    path = None
+    builtin = shutil.which(Aria2c.COMMAND) is None
+    if len(entries) == 1 or builtin:
+        downloaders = [_single(entry) for entry in entries]
+    else:
+        downloader = Aria2c()
+        downloader.use_settings(settings)
+        batch = InputFile()
+        for uris, options, _ in entries:
+            batch.add(uris, options)
+        path = batch.save()
+        downloader.input_file = path
+        downloaders = [downloader]
+    if session is not None:
+        for downloader in downloaders:
+            downloader.save_session = session.aria2c_session
+            downloader.save_session_interval = SAVE_SESSION_INTERVAL
+
+    errors = ()
+    if builtin:
+        from .engine import EngineError
+        errors = (EngineError, ValueError, OSError)
+    start = time.monotonic()
+    returncode = None
+    failed = []
+    try:
+        for downloader in downloaders:
+            began = time.monotonic()
+            try:
+                code = downloader.run()
+            except errors as error:
+                click.echo('{}: {}'.format(downloader.uri, error), err=True)
+                failed.append(downloader.uri)
+                continue
+            returncode = code or returncode
+            # Downloads of one input file share their time
+            if tuning is not None and path is None and not code:
+                _learn(tuning, downloader, time.monotonic() - began)
+    finally:
+        if path is not None:
+            os.remove(path)
+        if metrics is not None:
+            _record(metrics, entries, returncode, time.monotonic() - start)
+    if failed:
+        raise click.ClickException('Download failed: {}'.format(
+            ', '.join(failed)))
+
+
+def _allocate(entries, sizes, mounts):
+    """Replace file allocation unsafe on filesystem of the job, the one set
+    by its rules stays"""
+    from .storage import volume
+    volumes = {}
+    for _, options, job in entries:
+        if job.is_set('file_allocation'):
+            continue
+        directory = job.dir
+        if directory not in volumes:
+            volumes[directory] = volume(directory, mounts)
+        mode = volumes[directory].allocation(sizes.get(job.path),
+                                             job.file_allocation)
+        if mode != job.file_allocation:
+            job.file_allocation = mode
+            options['file-allocation'] = mode
 
-    if url.startswith('https://'):
-        if url[8:].startswith('teamcity.sencha.com/'):
-            settings.http_user = team_city_user.username
-            settings.http_passwd = team_city_user.password
 
+def _check_space(entries, sizes):
+    """End the program when files of known size don't fit on disk"""
+    if not sizes:
+        return
+    from .storage import check_space
+    try:
+        check_space((job.path, sizes.get(job.path)) for _, _, job in entries)
+    except OSError as error:
+        raise click.ClickException('Not enough free space in {}: {}'
+                                   .format(error.filename, error.strerror))
+
+
+def _to_front(rpc, gids):
+    """Move waiting downloads to the front of daemon queue"""
+    from .rpc import RPCError
+    statuses = rpc.multicall([('aria2.tellStatus', [gid, ['status']])
+                              for gid in gids])
+    # Active downloads are not in the queue, aria2 rejects moving them
+    waiting = [gid for gid, status in zip(gids, statuses)
+               if status['status'] == 'waiting']
+    try:
+        rpc.multicall([('aria2.changePosition', [gid, index, 'POS_SET'])
+                       for index, gid in enumerate(waiting)])
+    except RPCError:
+        # Download started meanwhile, the others were moved anyway
+        pass
+
+
+def _submit(rpc, entries, options, session):
+    """Hand jobs of session to daemon one by one
+
+    Jobs keep GIDs of the journal. Daemon which still has a job from the
+    previous run rejects its GID, the job is skipped then and marked
+    complete when the daemon finished it.
+
+    Returns:
+        list: GIDs of the added downloads
+    """
+    from .rpc import RPCError
+    gids = []
+    for uris, job_options, job in entries:
+        gid = job_options['gid']
+        merged = dict(options)
+        merged.update(job_options)
+        try:
+            gids.append(rpc.add_uri(uris, merged))
+        except RPCError as error:
+            try:
+                status = rpc.tell_status(gid, ['status'])['status']
+            except RPCError:
+                raise click.ClickException('{}: {}'.format(uris[0],
+                                                           error.message))
+            click.echo('{} is already in aria2c daemon with GID {}, {}'
+                       .format(job.path, gid, status))
+            if status == 'complete':
+                session.mark([gid])
+    return gids
+
+
+def _mismatching(entries):
+    """Entries whose file doesn't match its checksum"""
+    checksums = dict((job.path, job.checksum) for _, _, job in entries
+                     if job.checksum is not None)
+    if not checksums:
+        return []
+    from .verify import verify
+    results = verify(checksums)
+    return [entry for entry in entries if results.get(entry[2].path) is False]
+
+
+@click.command()
+@click.option('-i', '--input', 'inputs', multiple=True, type=click.File('r'),
+              help="File with one URL per line, '-' reads stdin")
+@click.option('--rpc-port', default=6800, type=click.INT,
+              help='RPC port of aria2c daemon')
+@click.option('--rpc-secret', default=None, type=click.STRING,
+              envvar='DOWNLOADER_RPC_SECRET', help='RPC secret token')
+@click.option('--daemon', is_flag=True,
+              help='Start aria2c daemon when none is running')
+@click.option('--settings', 'settings_profile', default=None,
+              type=click.Choice(sorted(Settings.PROFILES)),
+              help='Option profile, e.g. huge-file or many-small, {} by '
+                   'default'.format(DEFAULT_SETTINGS))
+@click.option('--cache', 'use_cache', is_flag=True,
+              help='Reuse unchanged files from the artifact cache, not with '
+                   'aria2c daemon')
+@click.option('--checksum', default=None, type=click.STRING,
+              help='TYPE=DIGEST of the file e.g. sha-256=..., one URL only')
+@click.option('--manifest', 'manifests', multiple=True,
+              type=click.File('r'),
+              help='SHA256SUMS or MD5SUMS file with checksums of the files, '
+                   'matching files are skipped, mismatching downloaded again')
+@click.option('--mirrors', default=0, type=click.IntRange(min=0),
+              help='Probe TAB separated mirrors of a file and pass the N '
+                   'fastest to aria2c')
+@click.option('--preflight', is_flag=True,
+              help='Pick split and connections per file from its size and '
+                   'throughput seen from its host, options set by rules or '
+                   '--settings are kept')
+@click.option('--bandwidth-policy', default=None,
+              type=click.Path(exists=True, dir_okay=False),
+              help='JSON policy giving overall download limit by time of '
+                   'day, running daemon gets it by RPC')
+@click.option('--priority', default='normal',
+              type=click.Choice(['interactive', 'normal', 'bulk']),
+              help='Interactive jobs go to the front of daemon queue, '
+                   'needs a daemon')
+@click.option('--rules', 'rules_path', default=None,
+              type=click.Path(exists=True, dir_okay=False),
+              envvar='DOWNLOADER_RULES',
+              help='JSON file with credentials and options per URL')
+@click.option('--session', 'session_path', default=None,
+              type=click.Path(dir_okay=False),
+              help='Journal the batch to this file so it can be resumed')
+@click.option('--resume', default=None,
+              type=click.Path(exists=True, dir_okay=False),
+              help='Download unfinished jobs of journal SESSION')
+@click.option('--metrics-file', default=None,
+              type=click.Path(dir_okay=False),
+              help='Write Prometheus metrics to this .prom file')
+@click.option('--profile', is_flag=True,
+              help='Print timings of wrapper phases to stderr')
+@click.option('--profile-output', default=None,
+              type=click.Path(dir_okay=False),
+              help='Write cProfile statistics readable by pstats')
+@click.argument('urls', nargs=-1, type=click.STRING)
+def main(urls, inputs, rpc_port, rpc_secret, daemon, settings_profile,
+         use_cache, checksum, manifests, mirrors, preflight, bandwidth_policy,
+         priority, rules_path, session_path, resume, metrics_file, profile,
+         profile_output):
+    """Download URLs by aria2c
+
+    URLs go to a running aria2c daemon when one listens on the RPC port,
+    otherwise one aria2c process downloads the batch, the built-in engine
+    when aria2c is not installed. URL '-' reads URLs from stdin, mirrors of
+    one file are separated by TAB.
+    """
+    from .profiling import Profiler, phase, process_start
+    if profile or profile_output is not None:
+        profiler = Profiler(output=profile_output,
+                            origin=process_start()).start()
+        profiler.mark('startup')
+
+        def report():
+            profiler.stop()
+            if profile:
+                profiler.report()
+        click.get_current_context().call_on_close(report)
+
+    from .rules import RuleSet, default_path
+    if rules_path is None and os.path.isfile(default_path()):
+        rules_path = default_path()
+    try:
+        rules = RuleSet.load(rules_path)
+    except (TypeError, ValueError) as error:
+        raise click.BadParameter(str(error), param_hint='--rules')
+
+    from .aria2c import Aria2c, Aria2cDaemon
+    from .batch import InputFile, read_urls
+    batch = InputFile()
+    for url in urls:
+        if url == '-':
+            inputs += (click.open_file('-'),)
+        else:
+            uris = url.split('\t')
+            batch.add(uris, url_options(uris[0], rules))
+    for stream in inputs:
+        for url in read_urls(stream):
+            uris = url.split('\t')
+            batch.add(uris, url_options(uris[0], rules))
+
+    with phase('settings'):
+        settings = Settings(settings_profile or DEFAULT_SETTINGS)
+    from .storage import read_mounts, volume
+    mounts = read_mounts()
+    # File allocation of profile given by --settings is taken as it is
+    if settings_profile is None:
+        settings.file_allocation = volume(settings.dir, mounts).allocation(
+            None, settings.file_allocation)
+    policy = None
+    if bandwidth_policy is not None:
+        from .governor import Policy
+        try:
+            policy = Policy.load(bandwidth_policy)
+        except (TypeError, ValueError) as error:
+            raise click.BadParameter(str(error),
+                                     param_hint='--bandwidth-policy')
+        settings.max_overall_download_limit = policy.overall()
+    entries = [(uris, options, _job(settings, rules, uris[0], options))
+               for uris, options in batch]
+    session = None
+    if resume is not None or session_path is not None:
+        from .session import Session
+        session = Session(resume or session_path)
+        gids = session.add((uris, options, job.path)
+                           for uris, options, job in entries)
+        for entry, gid in zip(entries, gids):
+            entry[1]['gid'] = gid
+        if resume is not None:
+            pending = session.reconcile()
+            click.echo('{} unfinished jobs in session {}'.format(
+                pending, session.path))
+            entries = [(uris, options, _job(settings, rules, uris[0], options))
+                       for uris, options in _unfinished(session, rules)]
+    if len(entries) == 0:
+        if session is not None:
+            session.close()
+            return
+        raise click.UsageError('No URL to download')
+    if mirrors:
+        from .engine import request_headers
+        from .mirrors import MirrorRanker
+        ranker = MirrorRanker(top=mirrors)
+        for index, (uris, options, job) in enumerate(entries):
+            if len(uris) > 1:
+                # Every mirror is probed with credentials of its own rules
+                headers = dict(
+                    (uri, request_headers(_job(settings, rules, uri,
+                                               url_options(uri, rules))))
+                    for uri in uris)
+                uris = ranker.select(uris, headers)
+                options['uri-selector'] = 'adaptive'
+                entries[index] = (uris, options, job)
+    sizes = {}
+    tuning = None
+    if preflight:
+        import urllib.parse
+        from .autotune import Autotuner
+        from .options import BY_ATTR
+        from .preflight import Preflight
+        checks = Preflight()
+        try:
+            heads = checks.run([job for _, _, job in entries])
+        finally:
+            checks.close()
+        tuning = (Autotuner(), {})
+        for (_, options, job), head in zip(entries, heads):
+            if head is None or head.size is None:
+                continue
+            sizes[job.path] = head.size
+            host = urllib.parse.urlsplit(job.uri).hostname
+            chosen = tuning[0].options(host, head.size, head.ranges)
+            fixed = _fixed(job, chosen, settings_profile)
+            for attr, value in chosen.items():
+                if attr in fixed:
+                    continue
+                setattr(job, attr, value)
+                option = BY_ATTR[attr]
+                options[option.name] = option.serialize(value)
+            if not fixed:
+                tuning[1][job.path] = (host, head.size,
+                                       tuple(chosen.values()))
+    if settings_profile is None:
+        _allocate(entries, sizes, mounts)
+    if checksum is not None:
+        if len(entries) != 1:
+            raise click.UsageError('--checksum needs exactly one URL')
+        try:
+            entries[0][2].checksum = checksum
+        except (TypeError, ValueError) as error:
+            raise click.BadParameter(str(error), param_hint='--checksum')
+    for stream in manifests:
+        from .verify import parse_manifest
+        try:
+            manifest = parse_manifest(stream)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint='--manifest')
+        by_name = dict((os.path.basename(name), value)
+                       for name, value in manifest.items())
+        for _, _, job in entries:
+            name = os.path.basename(job.path)
+            if job.checksum is None and name in by_name:
+                job.checksum = by_name[name]
+
+    metrics = None
+    if metrics_file is not None:
+        from .metrics import Metrics
+        metrics = Metrics()
     downloader = Aria2c()
     downloader.use_settings(settings)
-    downloader.uri = url
-    downloader.run()
+
+    aria2c_daemon = Aria2cDaemon(port=rpc_port, secret=rpc_secret)
+    running = aria2c_daemon.is_running()
+    if use_cache and (running or daemon):
+        raise click.UsageError('--cache stores files downloaded by this '
+                               'process, it can\'t be used with aria2c daemon')
+    if priority != 'normal' and not (running or daemon):
+        raise click.UsageError('--priority orders the queue of aria2c '
+                               'daemon, no daemon is running')
+    present = dict((job.path, job.checksum) for _, _, job in entries
+                   if job.checksum is not None and os.path.isfile(job.path))
+    verified = set()
+    if present:
+        from .session import completed
+        from .verify import verify
+        for path, matches in sorted(verify(present).items()):
+            if matches:
+                click.echo('{} already verified'.format(path))
+                verified.add(path)
+            elif completed(path):
+                # Complete file with other content would be renamed by aria2c
+                os.remove(path)
+    entries = [entry for entry in entries if entry[2].path not in verified]
+
+    if not running and daemon:
+        aria2c_daemon.start(downloader)
+        running = True
+    if running:
+        _check_space(entries, sizes)
+        if policy is not None:
+            from .governor import Governor
+            Governor(aria2c_daemon.rpc, policy).step()
+        # aria2c verifies checksum option of the job when it finishes
+        for index, (uris, options, job) in enumerate(entries):
+            if job.checksum is not None:
+                entries[index] = (uris, dict(options, checksum=job.checksum),
+                                  job)
+        if session is None:
+            batch = InputFile()
+            for uris, options, _ in entries:
+                batch.add(uris, options)
+            gids = batch.submit(aria2c_daemon.rpc, downloader.rpc_options)
+        else:
+            gids = _submit(aria2c_daemon.rpc, entries,
+                           downloader.rpc_options, session)
+        if priority == 'interactive':
+            _to_front(aria2c_daemon.rpc, gids)
+        for gid in gids:
+            click.echo('Download added to aria2c daemon with GID {}'
+                       .format(gid))
+        if session is not None:
+            # Daemon keeps downloading, --resume marks the finished jobs
+            session.close()
+        if metrics is not None:
+            metrics.collect(aria2c_daemon.rpc)
+            metrics.write(metrics_file)
+        return
+
+    cache = None
+    misses = entries
+    stored = []
+    if use_cache:
+        from .cache import ArtifactCache
+        from .session import completed
+        cache = ArtifactCache()
+        misses = []
+        for entry in entries:
+            hit, validators = cache.restore(entry[2])
+            if hit:
+                click.echo('{} linked from cache'.format(entry[2].path))
+                continue
+            misses.append(entry)
+            if validators is not None:
+                stored.append((entry[2], validators))
+
+    _check_space(misses, sizes)
+    mismatching = []
+    try:
+        _download(settings, misses, session, metrics, tuning)
+        mismatching = _mismatching(entries)
+        if mismatching:
+            for _, _, job in mismatching:
+                click.echo("{} doesn't match checksum, downloading again"
+                           .format(job.path))
+                if os.path.isfile(job.path):
+                    os.remove(job.path)
+            _download(settings, mismatching, session, metrics)
+            mismatching = _mismatching(mismatching)
+    finally:
+        if cache is not None:
+            failed = set(job.path for _, _, job in mismatching)
+            for job, validators in stored:
+                if completed(job.path) and job.path not in failed:
+                    cache.store(job.uri, job.path, validators)
+            cache.close()
+        if session is not None:
+            click.echo('{} unfinished jobs in session {}'.format(
+                session.reconcile(), session.path))
+            session.close()
+        if metrics is not None:
+            metrics.write(metrics_file)
+    if mismatching:
+        raise click.ClickException('Checksum mismatch: {}'.format(
+            ', '.join(job.path for _, _, job in mismatching)))
+
 
 if __name__ == '__main__':
     sys.exit(main())
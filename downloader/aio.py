@@ -0,0 +1,253 @@
+"""asyncio interface for aria2c downloads"""
+
+import asyncio
+
+from .progress import ProgressParser
+
+__all__ = ['DownloadHandle', 'ProcessHandle', 'RPCHandle', 'DownloadManager']
+
+
+class DownloadHandle(object):
+    """Awaitable handle of one download
+
+    Status uses names of aria2c: 'waiting', 'active', 'complete', 'error'
+    and 'removed' for cancelled download. Awaiting the handle waits for the
+    download to finish and returns the handle itself.
+    """
+    def __init__(self):
+        self._cancelled = False
+
+    @property
+    def status(self):
+        """str: Status of the download"""
+        raise NotImplementedError
+
+    @property
+    def done(self):
+        """bool: True if the download finished in any way"""
+        return self.status in ('complete', 'error', 'removed')
+
+    async def _wait(self):
+        raise NotImplementedError
+
+    async def wait(self, timeout=None):
+        """Wait for the download to finish
+
+        Arguments:
+            timeout (float): Seconds to wait, download is cancelled when
+                it doesn't finish in time
+
+        Returns:
+            DownloadHandle: self
+
+        Raises:
+            asyncio.TimeoutError: When download didn't finish in time
+        """
+        try:
+            await asyncio.wait_for(self._wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.cancel()
+            raise
+        return self
+
+    async def cancel(self):
+        """Cancel the download"""
+        raise NotImplementedError
+
+    def __await__(self):
+        return self.wait().__await__()
+
+
+class ProcessHandle(DownloadHandle):
+    """Download running in its own aria2c process
+
+    Arguments:
+        process (asyncio.subprocess.Process): aria2c process
+        on_event (callable): Called with progress events parsed from stdout
+            of the process
+    """
+    def __init__(self, process, on_event=None):
+        super(ProcessHandle, self).__init__()
+        self._process = process
+        if on_event is None:
+            self._finished = asyncio.ensure_future(process.wait())
+        else:
+            self._finished = asyncio.ensure_future(self._read(on_event))
+
+    async def _read(self, on_event):
+        parser = ProgressParser()
+        while True:
+            data = await self._process.stdout.read(65536)
+            if not data:
+                break
+            for event in parser.feed(data):
+                on_event(event)
+        for event in parser.close():
+            on_event(event)
+        return await self._process.wait()
+
+    @property
+    def process(self):
+        """asyncio.subprocess.Process: aria2c process"""
+        return self._process
+
+    @property
+    def returncode(self):
+        """int: Exit code of aria2c, None while it is running"""
+        return self._process.returncode
+
+    @property
+    def status(self):
+        if self._cancelled:
+            return 'removed'
+        if self._process.returncode is None:
+            return 'active'
+        if self._process.returncode == 0:
+            return 'complete'
+        return 'error'
+
+    async def _wait(self):
+        await asyncio.shield(self._finished)
+
+    async def cancel(self):
+        if self._process.returncode is not None:
+            return
+        self._cancelled = True
+        self._process.terminate()
+        await asyncio.shield(self._finished)
+
+
+class RPCHandle(DownloadHandle):
+    """Download running in aria2c daemon
+
+    Calls of the blocking RPC client run in default executor of the loop.
+
+    Arguments:
+        rpc (rpc.Aria2RPC): Client connected to the daemon
+        gid (str): GID of the download
+        poll_interval (float): Seconds between status checks
+    """
+    def __init__(self, rpc, gid, poll_interval=0.5):
+        super(RPCHandle, self).__init__()
+        self._rpc = rpc
+        self._gid = gid
+        self._poll_interval = poll_interval
+        self._status = 'waiting'
+        self._error_code = None
+
+    @property
+    def gid(self):
+        """str: GID of the download"""
+        return self._gid
+
+    @property
+    def error_code(self):
+        """str: aria2c error code of failed download"""
+        return self._error_code
+
+    @property
+    def status(self):
+        if self._cancelled:
+            return 'removed'
+        return self._status
+
+    async def _call(self, function, *args):
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(None, function, *args)
+        return result
+
+    async def refresh(self):
+        """Update status from the daemon
+
+        Returns:
+            str: Status of the download
+        """
+        status = await self._call(self._rpc.tell_status, self._gid,
+                                  ['status', 'errorCode'])
+        self._status = status['status']
+        self._error_code = status.get('errorCode')
+        return self.status
+
+    async def _wait(self):
+        while True:
+            await self.refresh()
+            if self.done:
+                return
+            await asyncio.sleep(self._poll_interval)
+
+    async def cancel(self):
+        if self.done:
+            return
+        self._cancelled = True
+        await self._call(self._rpc.remove, self._gid)
+
+
+class DownloadManager(object):
+    """Runs many downloads from one event loop
+
+    Arguments:
+        max_in_flight (int): Maximum number of downloads running at once
+        rpc (rpc.Aria2RPC): Client of aria2c daemon, downloads are started
+            as separate aria2c processes when None
+        timeout (float): Seconds after which a download is cancelled
+    """
+    def __init__(self, max_in_flight=16, rpc=None, timeout=None):
+        if type(max_in_flight) is not int:
+            raise TypeError('Max in flight has to be integer')
+        if max_in_flight < 1:
+            raise ValueError('Max in flight has to be equal or larger then 1')
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._rpc = rpc
+        self._timeout = timeout
+        self._in_flight = 0
+
+    @property
+    def in_flight(self):
+        """int: Number of downloads running now"""
+        return self._in_flight
+
+    async def download(self, aria2c):
+        """Run one download when a slot is free and wait for it
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download to run
+
+        Returns:
+            DownloadHandle: Finished download
+
+        Raises:
+            asyncio.TimeoutError: When download didn't finish in time
+        """
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                handle = await aria2c.run_async(rpc=self._rpc)
+                await handle.wait(self._timeout)
+            finally:
+                self._in_flight -= 1
+        return handle
+
+    def submit(self, aria2c):
+        """Schedule download
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download to run
+
+        Returns:
+            asyncio.Future: Future of finished DownloadHandle
+        """
+        return asyncio.ensure_future(self.download(aria2c))
+
+    async def gather(self, downloads):
+        """Run all downloads and wait for them
+
+        Arguments:
+            downloads (iterable): aria2c.Aria2c instances
+
+        Returns:
+            list: DownloadHandle of each download or exception raised by it
+        """
+        results = await asyncio.gather(
+            *[self.submit(aria2c) for aria2c in downloads],
+            return_exceptions=True)
+        return results
@@ -1,1092 +1,468 @@
-"""Aria2c python wrapper"""
+"""Aria2c python wrapper
+
+asyncio, the built-in engine and the JSON-RPC client are imported when they
+are used, so the command line tool doesn't pay for them on start.
+"""
 
 import subprocess
 import os
+import shutil
+import socket
+import time
+from collections import OrderedDict
 
-from .settings import Settings
+from .options import GLOBAL, INPUT, OPTIONS
+from .profiling import mark, phase
+from .progress import ProgressEvent, ProgressParser
 
-__all__ = ['Aria2c']
+__all__ = ['Aria2c', 'Aria2cDaemon']
 
 
 class Aria2c(object):
+    """One download run by aria2c
+
+    Options are descriptors from options.OPTIONS installed on this class.
+    Instance keeps only options set explicitly, so queued downloads which
+    share settings cost a few hundred bytes each.
+    """
     COMMAND = 'aria2c'
+    GLOBAL_OPTIONS = tuple(option.name for option in OPTIONS
+                           if option.scope == GLOBAL)
+    INPUT_OPTIONS = tuple(option.name for option in OPTIONS
+                          if option.scope == INPUT)
+
+    __slots__ = ('_settings', '_overrides', '_compiled', '_uris', '_magnet')
 
     def __init__(self):
-        self._default_settings = Settings()
-        self._using_settings = self._default_settings
-        self._log = None
-        self._dir = None
-        self._out = None
-        self._split = None
-        self._file_allocation = None
-        self._check_integrity = None
-        self._d_continue = None
-        self._input_file = None
-        self._max_concurrent_downloads = None
-        self._force_sequential = None
-        self._max_connection_per_server = None
-        self._min_split_size = None
-        self._ftp_user = None
-        self._ftp_passwd = None
-        self._http_user = None
-        self._http_passwd = None
-        self._load_cookies = None
-        self._show_files = None
-        self._max_overall_upload_limit = None
-        self._max_upload_limit = None
-        self._torrent_file = None
-        self._listen_port = None
-        self._enable_dht = None
-        self._dht_listen_port = None
-        self._enable_dht6 = None
-        self._dht_listen_addr6 = None
-        self._metalink_file = None
-        self._uri = None
+        self._settings = None
+        self._overrides = None
+        self._compiled = None
+        self._uris = ()
         self._magnet = None
 
     def use_settings(self, settings):
         """Change default settings
 
-        Arguments:
-            settings: Class based on settings.Default
-        """
-        self._using_settings = settings
-
-    @property
-    def log(self):
-        """str: The file name of the log file.
-
-        If '-' is specified, log is written to stdout.
-        Set 'None' to use default value
-
-        Possible Values: /path/to/file, -
-        Default: -
-        """
-        if self._log is None:
-            return self._using_settings.log
-
-        if os.path.exists(os.path.dirname(self._log)):
-            return self._log
-
-        self._log = None
-        return self._using_settings.log
-
-    @log.setter
-    def log(self, value):
-        if value is None:
-            self._log = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('Log has to be string')
-
-        if value == '-':
-            self._log = None
-            return
-
-        if not os.path.isdir(os.path.dirname(value)):
-            raise ValueError('Path to log has to be valid system path')
-
-        self._log = os.path.abspath(value)
-
-    @property
-    def dir(self):
-        """str: The directory to store the downloaded file.
-
-        Possible Values: /path/to/directory
-        Default: ~/Downloads (if exists else ~ )
-        """
-        if self._dir is None:
-            return self._using_settings.dir
-
-        if os.path.isdir(self._dir):
-            return self._dir
-
-        self._dir = None
-        return self._using_settings.dir
-
-    @dir.setter
-    def dir(self, value):
-        if value is None:
-            self._dir = None
-
-        if type(value) is not str:
-            raise TypeError('Dir has to be string')
+        Settings are read when the command is compiled, call this method
+        again after changing settings already in use.
 
-        if not os.path.isdir(value):
-            raise ValueError('Dir has to be valid system path')
-
-        self._dir = os.path.abspath(value)
-
-    @property
-    def out(self):
-        """str: The file name of the downloaded file.
-
-        When the force_sequential option is used, this option will be ignored.
-
-        Possible Values: /path/to/file
-        Default: None
-        """
-        if self._out is None:
-            return self._using_settings.out
-
-        if os.path.isdir(os.path.dirname(self._out)):
-            return self._out
-
-        self._out = None
-        return self._using_settings.out
-
-    @out.setter
-    def out(self, value):
-        if value is None:
-            self._out = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('Out has to be string')
-
-        if not os.path.isdir(os.path.dirname(value)):
-            raise ValueError('Out has to be valid system path')
-
-        self._out = os.path.abspath(value)
-
-    @property
-    def split(self):
-        """int: Download a file using N connections.
-
-        If more than N URIs are given, first N URIs are used and remaining URLs
-        are used for backup. If less than N URIs are given, those URLs are used
-        more than once so that N connections total are made simultaneously.
-        The number of connections to the same host is restricted by
-        the max_connection_per_server option. See also the min_split_size
-        option.
-
-        Possible Values: 1-*
-        Default: 5
-        """
-        if self._split is None:
-            return self._using_settings.split
-
-        if type(self._split) is int and self._split >= 1:
-            return self._split
-
-        self._split = None
-        return self._using_settings.split
-
-    @split.setter
-    def split(self, value):
-        if value is None:
-            self._split = None
-            return
-
-        if type(value) is not int:
-            raise TypeError('Split has to be integer')
-
-        if value < 1:
-            raise ValueError('Split has to be equal or larger then 1')
-
-        self._split = value
-
-    @property
-    def file_allocation(self):
-        """str: Specify file allocation method.
-
-        'none':
-            doesn't pre-allocate file space.
-        'prealloc':
-            pre-allocates file space before download begins. This may take some
-            time depending on the size of the file.
-        'falloc':
-            If you are using newer file systems such as ext4 (with extents
-            support), btrfs, xfs or NTFS (MinGW build only), 'falloc' is your
-            best choice. It allocates large (few GiB) files almost instantly.
-            Don't use 'falloc' with legacy file systems such as ext3 and FAT32
-            because it takes almost same time as 'prealloc' and it blocks aria2
-            entirely until allocation finishes. 'falloc' may not be available
-            if your system doesn't have posix_fallocate() function.
-        'trunc':
-            uses ftruncate() system call or platform-specific counterpart to
-            truncate a file to a specified length.
-
-        Possible Values: none, prealloc, trunc, falloc
-        Default: prealloc
-        Recommended: falloc
-        """
-        if self._file_allocation is None:
-            return self._using_settings.file_allocation
-
-        if (self._file_allocation in
-                self._using_settings.file_allocation_values):
-            return self._file_allocation
-
-        self._file_allocation = None
-        return self._using_settings.file_allocation
-
-    @file_allocation.setter
-    def file_allocation(self, value):
-        if value is None:
-            self._file_allocation = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('File allocation type has to be string')
-
-        if value not in self._using_settings.file_allocation_values:
-            raise ValueError(
-                'File allocation type has to be one of these values: {}'
-                .format(', '.join(
-                    self._using_settings.file_allocation_values)))
-
-        self._file_allocation = value
-
-    @property
-    def check_integrity(self):
-        """bool: Check file integrity by validating piece hashes or a hash of
-        entire file.
-
-        This option has effect only in BitTorrent, Metalink downloads with
-        checksums or HTTP(S)/FTP downloads with checksum option enabled. If
-        piece hashes are provided, this option can detect damaged portions of a
-        file and re-download them. If a hash of entire file is provided, hash
-        check is only done when file has been already download. This is
-        determined by file length. If hash check fails, file is re-downloaded
-        from scratch. If both piece hashes and a hash of entire file are
-        provided, only piece hashes are used.
-
-        Possible Values: True, False
-        Default: False
+        Arguments:
+            settings (settings.Settings): Settings, None for option defaults
         """
-        if self._check_integrity is None:
-            return self._using_settings.check_integrity
-
-        if type(self._check_integrity) is bool:
-            return self._check_integrity
-
-        self._check_integrity = None
-        return self._using_settings.check_integrity
-
-    @check_integrity.setter
-    def check_integrity(self, value):
-        if value is None:
-            self._check_integrity = None
-            return
+        self._settings = settings
+        self._compiled = None
 
-        if type(value) is not bool:
-            raise TypeError('Check integrity is bool value')
+    def copy(self):
+        """Download with the same settings, options and URIs
 
-        self._check_integrity = value
-
-    @property
-    def continue_downloading(self):
-        """bool: Continue downloading a partially downloaded file.
-
-        Use this option to resume a download started by a web browser or
-        another program which downloads files sequentially from the beginning.
-        Currently this option is only applicable to http(s)/ftp downloads.
-
-        Possible Values: True, False
-        Default: False
+        Returns:
+            Aria2c: Independent copy, changing it doesn't change this one
         """
-        if self._d_continue is None:
-            return self._using_settings.continue_downloading
-
-        if type(self._d_continue) is bool:
-            return self._d_continue
-
-        self._d_continue = None
-        return self._using_settings.continue_downloading
+        aria2c = Aria2c()
+        aria2c._settings = self._settings
+        if self._overrides is not None:
+            aria2c._overrides = dict(self._overrides)
+        aria2c._uris = self._uris
+        aria2c._magnet = self._magnet
+        return aria2c
 
-    @continue_downloading.setter
-    def continue_downloading(self, value):
-        if value is None:
-            self._d_continue = None
-            return
+    def is_set(self, attr):
+        """True if option was set on this download, not taken from settings
 
-        if type(value) is not bool:
-            raise TypeError('Continue downloading is bool value')
-
-        self._d_continue = value
+        Arguments:
+            attr (str): Attribute name of the option
 
-    @property
-    def input_file(self):
-        """str: Downloads URIs found in FILE.
-
-        You can specify multiple URIs for a single entity: separate URIs on
-        a single line using the TAB character. Reads input from stdin when '-'
-        is specified.
-        Additionally, options can be specified after each line of URI. This
-        optional line must start with one or more white spaces and have one
-        option per single line. See INPUT FILE section of man page for details.
-        See also deferred_input option.
-
-        Possible Values: /path/to/file, -
-        Default: None
+        Returns:
+            bool: Option has explicit value
         """
-        if self._input_file is None or type(self._input_file) is not str:
-            return self._using_settings.input_file
-
-        if self._input_file == '-':
-            return '-'
-
-        if os.path.isfile(self._input_file):
-            return self._input_file
-
-        raise FileNotFoundError('Input file not found')
-
-    @input_file.setter
-    def input_file(self, value):
-        if value is None:
-            self._input_file = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('Input file has to have string value')
-        if value == '-':
-            self._input_file = '-'
-            return
-        if not os.path.isfile(value):
-            raise FileNotFoundError('Input file not found')
-
-        self._input_file = os.path.abspath(value)
+        return self._overrides is not None and attr in self._overrides
 
     @property
-    def max_concurrent_downloads(self):
-        """int: Set maximum number of parallel downloads for every static
-        (HTTP/FTP) URL, torrent and metalink.
-
-        See also split option.
-
-        Possible Values: 1-*
-        Default: 5
-        """
-        if self._max_concurrent_downloads is None:
-            return self._using_settings.max_concurrent_downloads
-
-        if (type(self._max_concurrent_downloads) is int and
-                self._max_concurrent_downloads >= 1):
-            return self._max_concurrent_downloads
-
-        self._max_concurrent_downloads = None
-        return self._using_settings.max_concurrent_downloads
-
-    @max_concurrent_downloads.setter
-    def max_concurrent_downloads(self, value):
-        if value is None:
-            self._max_concurrent_downloads = None
-
-        if type(value) is not int:
-            raise TypeError('Max concurrent downloads has to be integer')
-        if value < 1:
-            raise ValueError('Max concurrent downloads has to be equal or '
-                             'larger the 1')
+    def uri(self):
+        """str: URI of the file, the first of uris"""
+        return self._uris[0] if self._uris else None
 
-        self._max_concurrent_downloads = value
+    @uri.setter
+    def uri(self, value):
+        self._uris = () if value is None else (value,)
+        self._compiled = None
 
     @property
-    def force_sequential(self):
-        """bool: Fetch URIs in the command-line sequentially and download
-        each URI in a separate session, like the usual command-line download
-        utilities.
+    def uris(self):
+        """list: URIs of one file on several mirrors
 
-        Possible Values: True, False
-        Default: False
+        aria2c chooses between them by uri_selector option.
         """
-        if (self._force_sequential is None or
-                type(self._force_sequential) is not bool):
-            return self._using_settings.force_sequential
-
-        self._force_sequential = None
-        return self._force_sequential
-
-    @force_sequential.setter
-    def force_sequential(self, value):
-        if value is None:
-            self._force_sequential = None
+        return list(self._uris)
 
-        if type(value) is not bool:
-            raise TypeError('Force sequential has to be boolean value')
-        self._force_sequential = value
+    @uris.setter
+    def uris(self, value):
+        value = tuple(value or ())
+        for uri in value:
+            if type(uri) is not str:
+                raise TypeError('URI has to be string')
+        self._uris = value
+        self._compiled = None
 
     @property
-    def max_connection_per_server(self):
-        """int: The maximum number of connections to one server for each
-        download.
-
-        Possible Values: 1-16
-        Default: 1
-        Recommended: 16
-        """
-        if self._max_connection_per_server is None:
-            return self._using_settings.max_connection_per_server
-
-        if (type(self._max_connection_per_server) is int and
-                1 <= self._max_connection_per_server <= 16):
-            return self._max_connection_per_server
-
-        self._max_connection_per_server = None
-        return self._using_settings.max_connection_per_server
-
-    @max_connection_per_server.setter
-    def max_connection_per_server(self, value):
-        if value is None:
-            self._max_connection_per_server = None
-            return
-
-        if type(value) is not int:
-            raise TypeError('Max connection per server has to be integer')
-        if value < 1 or value > 16:
-            raise ValueError('Max connection per server has to be in range '
-                             '1 - 16')
-        self._max_connection_per_server = value
+    def magnet(self):
+        return self._magnet
 
-    @property
-    def min_split_size(self):
-        """int: aria2 does not split less than 2*SIZE byte range.
-
-        For example, let's consider downloading 20MiB file. If SIZE is 10M,
-        aria2 can split file into 2 range [0-10MiB) and [10MiB-20MiB) and
-        download it using 2 sources(if --split >= 2, of course). If SIZE is
-        15M, since 2*15M > 20MiB, aria2 does not split file and download it
-        using 1 source. You can append K or M(1K = 1024, 1M = 1024K).
-
-        Possible Values: 1048576-1073741824
-        Default: 20M = 20480K = 20971520
-        Recommended: 1M = 1024K = 1048576
-        """
-        if self._min_split_size is None:
-            return self._using_settings.min_split_size
-
-        if (type(self._min_split_size) is int and
-                1048576 <= self._min_split_size <= 1073741824):
-            return self._min_split_size
-
-        self._min_split_size = None
-        return self._using_settings.min_split_size
-
-    @min_split_size.setter
-    def min_split_size(self, value):
-        if value is None:
-            self._min_split_size = None
-            return
-
-        if not (type(value) is str or type(value) is int):
-            raise TypeError('Min split size has to be integer or string')
-        if type(value) is str:
-            if str(value).isdigit():
-                value = int(value)
-            elif str(value)[:-1].isdigit() and value[-1] == 'K':
-                value = int(value[:-1]) * 1024
-            elif str(value)[:-1].isdigit() and value[-1] == 'M':
-                value = int(value[:-1]) * 1024 * 1024
-            else:
-                raise ValueError('Min split size has to be digit od digit '
-                                 'ends with K or M')
-        if value < 1048576 or value > 1073741824:
-            raise ValueError('Min split size has to be in range 1048576 - '
-                             '1073741824')
-        self._min_split_size = value
+    @magnet.setter
+    def magnet(self, value):
+        self._magnet = value
+        self._compiled = None
 
     @property
-    def ftp_user(self):
-        """str: Set FTP user. This affects all URLs.
+    def path(self):
+        """str: Path where downloaded file of uri is stored.
 
-        Default: None
+        Name is taken from out option or from the last part of URI path,
+        like aria2c does when the server doesn't send other name.
         """
-        if self._ftp_user is None:
-            return self._using_settings.ftp_user
-
-        if type(self._ftp_user) is str:
-            return self._ftp_user
-
-        self._ftp_user = None
-        return self._using_settings.ftp_user
-
-    @ftp_user.setter
-    def ftp_user(self, value):
-        if value is None:
-            self._ftp_user = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('FTP username has to be string')
-        self._ftp_user = value
-
-    @property
-    def ftp_passwd(self):
-        """str: Set FTP password. This affects all URLs.
-
-        Default: None
+        if self.out is not None:
+            return os.path.join(self.dir, self.out)
+        if self.uri is None:
+            return None
+        import urllib.parse
+        name = os.path.basename(
+            urllib.parse.unquote(urllib.parse.urlsplit(self.uri).path))
+        return os.path.join(self.dir, name or 'index.html')
+
+    def _compile(self):
+        """Resolve all options once and cache the result
+
+        Every option, including path checks, is resolved exactly once per
+        build. The cache is dropped by every setter and by use_settings().
+
+        Returns:
+            tuple: Resolved values of all options by attribute name, options
+                which differ from defaults and command line
         """
-        if self._ftp_passwd is None:
-            return self._using_settings.ftp_passwd
-
-        if type(self._ftp_passwd) is str:
-            return self._ftp_passwd
-
-        self._ftp_passwd = None
-        return self._using_settings.ftp_passwd
-
-    @ftp_passwd.setter
-    def ftp_passwd(self, value):
-        if value is None:
-            self._ftp_passwd = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('FTP password has to be string')
-        self._ftp_passwd = value
+        if self._compiled is not None:
+            return self._compiled
+
+        values = {}
+        options = OrderedDict()
+        with phase('options'):
+            for option in OPTIONS:
+                value = values[option.attr] = option.resolve(self, True)
+                if value is not None and value != option.default:
+                    options[option.name] = option.serialize(value)
+
+        with phase('argv'):
+            command = [self.COMMAND]
+            command.extend('--{}={}'.format(name, value)
+                           for name, value in options.items())
+            if self._uris:
+                command.extend(self._uris)
+            elif self.magnet is not None:
+                command.append(self.magnet)
+
+        self._compiled = (values, options, command)
+        return self._compiled
 
     @property
-    def http_user(self):
-        """str: Set HTTP user. This affects all URLs.
+    def options(self):
+        """OrderedDict: aria2c options which differ from default settings.
 
-        Default: None
+        Keys are long option names without leading dashes and values are
+        strings, the form used by both command line and JSON-RPC interface.
         """
-        if self._http_user is None:
-            return self._using_settings.http_user
-
-        if type(self._http_user) is str:
-            return self._http_user
-
-        self._http_user = None
-        return self._using_settings.http_user
-
-    @http_user.setter
-    def http_user(self, value):
-        if value is None:
-            self._http_user = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('HTTP username has to be string')
-        self._http_user = value
+        return OrderedDict(self._compile()[1])
 
     @property
-    def http_passwd(self):
-        """str: Set HTTP password. This affects all URLs.
+    def global_options(self):
+        """dict: Options which aria2c applies to the whole process.
 
-        Default: None
+        These are passed to the daemon on start and can't be set per job.
         """
-        if self._http_passwd is None:
-            return self._using_settings.http_passwd
-
-        if type(self._http_passwd) is str:
-            return self._http_passwd
-
-        self._http_passwd = None
-        return self._using_settings.http_passwd
-
-    @http_passwd.setter
-    def http_passwd(self, value):
-        if value is None:
-            self._http_passwd = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('HTTP password has to be string')
-        self._http_passwd = value
+        return OrderedDict((name, value)
+                           for name, value in self._compile()[1].items()
+                           if name in self.GLOBAL_OPTIONS)
 
     @property
-    def load_cookies(self):
-        """str: Load Cookies from FILE using the Firefox3 format and
-        Mozilla/Firefox(1.x/2.x)/Netscape format.
+    def rpc_options(self):
+        """dict: Per job options for aria2.addUri, addTorrent and addMetalink.
 
-        Possible Values: /path/to/file
-        Default: None
+        Download directory is always present, otherwise the job would be
+        stored to working directory of the daemon.
         """
-        if self._load_cookies is None:
-            return self._using_settings.load_cookies
-
-        if os.path.isfile(self._load_cookies):
-            return self._load_cookies
-
-        self._load_cookies = None
-        return self._using_settings.load_cookies
-
-    @load_cookies.setter
-    def load_cookies(self, value):
-        if value is None:
-            self._load_cookies = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('Load cookies has to be string')
-        if not os.path.isfile(value):
-            raise ValueError('Load cookies has to be valid file')
-
-        self._load_cookies = value
+        values, compiled, _ = self._compile()
+        options = OrderedDict([('dir', values['dir'])])
+        for name, value in compiled.items():
+            if (name not in self.GLOBAL_OPTIONS and
+                    name not in self.INPUT_OPTIONS):
+                options[name] = value
+        return options
 
     @property
-    def show_files(self):
-        """bool: Print file listing of .torrent, .meta4 and .metalink file and
-        exit.
-
-        More detailed information will be listed in case of torrent file.
-
-        Possible Values: true, false
-        Default: false
-        """
-        if self._show_files is None:
-            return self._using_settings.show_files
-
-        if type(self._show_files) is bool:
-            return self._show_files
-
-        self._show_files = None
-        return self._using_settings.show_files
-
-    @show_files.setter
-    def show_files(self, value):
-        if value is None:
-            self._show_files = None
-            return
+    def command(self):
+        return list(self._compile()[2])
 
-        if type(value) is not bool:
-            raise TypeError('Show file is boolean variable')
-        self._show_files = value
+    def submit(self, rpc):
+        """Submit download to running aria2c daemon
 
-    @property
-    def max_overall_upload_limit(self):
-        """int: Set max overall upload speed in bytes/sec.
+        Torrent and metalink files are uploaded with aria2.addTorrent and
+        aria2.addMetalink, URI and magnet link with aria2.addUri.
 
-        0 means unrestricted. You can append K or M(1K = 1024, 1M = 1024K). To
-        limit the upload speed per torrent, use max_upload_limit option.
+        Arguments:
+            rpc (rpc.Aria2RPC): Client connected to the daemon
 
-        Possible Values: 0-*
-        Default: 0
+        Returns:
+            str: GID of the new download
         """
-        if self._max_overall_upload_limit is None:
-            return self._using_settings.max_overall_upload_limit
-
-        if (type(self._max_overall_upload_limit) is int and
-                self._max_overall_upload_limit >= 0):
-            return self._max_overall_upload_limit
-
-        self._max_overall_upload_limit = None
-        return self._using_settings.max_overall_upload_limit
-
-    @max_overall_upload_limit.setter
-    def max_overall_upload_limit(self, value):
-        if value is None:
-            self._max_overall_upload_limit = None
-            return
-
-        if type(value) not in [int, str]:
-            raise TypeError('Max overall upload limit has to be integer or '
-                            'string')
-        if type(value) is str:
-            if str(value).isdigit():
-                value = int(value)
-            elif str(value)[:-1].isdigit() and value[-1] == 'K':
-                value = int(value[:-1]) * 1024
-            elif str(value)[:-1].isdigit() and value[-1] == 'M':
-                value = int(value[:-1]) * 1024 * 1024
-            else:
-                raise ValueError('Illegal string format')
-        if value < 0:
-            raise ValueError('Max overall upload limit has to be larger then '
-                             '0')
-        self._max_overall_upload_limit = value
+        values = self._compile()[0]
+        options = self.rpc_options
+        if values['torrent_file'] is not None:
+            with open(values['torrent_file'], 'rb') as torrent:
+                return rpc.add_torrent(torrent.read(), options=options)
+        if values['metalink_file'] not in (None, '-'):
+            with open(values['metalink_file'], 'rb') as metalink:
+                return rpc.add_metalink(metalink.read(), options=options)
+        if self._uris:
+            return rpc.add_uri(list(self._uris), options)
+        if self.magnet is not None:
+            return rpc.add_uri([self.magnet], options)
+        raise ValueError('Nothing to download, set uri, magnet, torrent file '
+                         'or metalink file')
 
-    @property
-    def max_upload_limit(self):
-        """int: Set max upload speed per each torrent in bytes/sec.
-
-        0 means unrestricted. You can append K or M(1K = 1024, 1M = 1024K). To
-        limit the overall upload speed, use max_overall_upload_limit option.
-
-        Possible Values: 0-*
-        Default: 0
-        """
-        if self._max_upload_limit is None:
-            return self._using_settings.max_upload_limit
-
-        if type(self._max_upload_limit) is int and self._max_upload_limit >= 0:
-            return self._max_upload_limit
-
-        self._max_upload_limit = None
-        return self._using_settings.max_upload_limit
-
-    @max_upload_limit.setter
-    def max_upload_limit(self, value):
-        if value is None:
-            self._max_upload_limit = None
-            return
-
-        if type(value) not in [int, str]:
-            raise TypeError('Max upload limit has to be string or integer')
-        if type(value) is str:
-            if str(value).isdigit():
-                value = int(value)
-            elif str(value)[:-1].isdigit() and value[-1] == 'K':
-                value = int(value[:-1]) * 1024
-            elif str(value)[:-1].isdigit() and value[-1] == 'M':
-                value = int(value[:-1]) * 1024 * 1024
-            else:
-                raise ValueError('Illegal string format')
-        if value < 0:
-            raise ValueError('Max upload limit has to be larger then 0')
-        self._max_upload_limit = value
+    def run(self):
+        """Run download in aria2c process
 
-    @property
-    def torrent_file(self):
-        """str: The path to the .torrent file.
+        When aria2c is not installed HTTP(S) URI is downloaded by built-in
+        engine.HTTPEngine instead.
 
-        Possible Values: /path/to/file
-        Default: None
+        Returns:
+            int: Exit code of aria2c, 0 when built-in engine succeeded
         """
-        if self._torrent_file is None:
-            return self._using_settings.torrent_file
-
-        if os.path.isfile(self._torrent_file):
-            return self._torrent_file
-
-        raise FileNotFoundError('Torrent file not found')
+        if shutil.which(self.COMMAND) is None:
+            from .engine import HTTPEngine
+            engine = HTTPEngine(self)
+            print('{} not found, downloading {} by built-in engine'.format(
+                self.COMMAND, self.uri))
+            print()
+            print(engine.run())
+            if engine.first_byte is not None:
+                mark('first_byte', time.perf_counter() -
+                     (time.monotonic() - engine.first_byte))
+            mark('complete')
+            return 0
+        command = self.command
+        print(' '.join(command))
+        print()
+        with phase('spawn'):
+            process = subprocess.Popen(command)
+        process.communicate()
+        mark('complete')
+        return process.returncode
 
-    @torrent_file.setter
-    def torrent_file(self, value):
-        if value is None:
-            self._torrent_file = None
-            return
+    def stream(self, chunk_size=65536):
+        """Run download and yield progress parsed from aria2c output
 
-        if type(value) is not str:
-            raise TypeError('Torrent file has to be string')
-        if not os.path.isfile(value):
-            raise FileNotFoundError('Torrent file not found')
-        self._torrent_file = os.path.abspath(value)
+        Console readout is printed every summary_interval seconds, set it to
+        1 for progress every second.
 
-    @property
-    def listen_port(self):
-        """list: Set TCP port number for BitTorrent downloads.
+        Arguments:
+            chunk_size (int): Maximum bytes read from aria2c at once
 
-        Multiple ports can be specified by using ',', for example: "6881,6885".
-        You can also use '-' to specify a range: "6881-6999". ',' and '-'
-        cannot be used together.
+        Yields:
+            progress.ProgressEvent, CompleteEvent or ErrorEvent
 
-        Possible Values: 1024-65535
-        Default: 6881-6999
+        Returns:
+            int: Exit code of aria2c
         """
-        if self._listen_port is None:
-            return self._using_settings.listen_port
-
-        if type(self._listen_port) is list:
-            if len([a for a in self._listen_port if type(a) is int]) == 0:
-                if len([a for a in self._listen_port if 0 < 1024]) == 0:
-                    if len([a for a in self._listen_port if a > 65535]) == 0:
-                        return self._listen_port
-
-        self._listen_port = None
-        return self._using_settings.listen_port
-
-    @listen_port.setter
-    def listen_port(self, value):
-        if value is None:
-            self._listen_port = None
-            return
-
-        if type(value) is range:
-            value = list(value)
-
-        if type(value) is str:
-            if str(value).isdigit():
-                value = [int(value)]
-            elif len([a for a in str(value).split(',')
-                      if not a.isdigit()]) == 0:
-                value = [int(a) for a in str(value).split(',')]
-            elif len([a for a in str(value).split('-')]) == 2:
-                value = str(value).split('-')
-                if value[0].isdigit() and value[1].isdigit():
-                    value = list(range(int(value[0]), int(value[1]) + 1))
-
-        if type(value) is not list:
-            raise TypeError('Listen port has to be list')
-        if len([a for a in value if type(a) is not int]) > 0:
-            raise TypeError('Listen port has to be list of integers')
-
-        if len([a for a in value if a < 1024]) > 0:
-            raise ValueError('Listen port cannot be lower then 1024')
-        if len([a for a in value if a > 65535]) > 0:
-            raise ValueError('Listen port cannot be larger then 65535')
-
-        self._listen_port = value
+        parser = ProgressParser()
+        command = self.command
+        with phase('spawn'):
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE)
+        started = False
+        try:
+            fd = process.stdout.fileno()
+            while True:
+                data = os.read(fd, chunk_size)
+                if not data:
+                    break
+                for event in parser.feed(data):
+                    if (not started and type(event) is ProgressEvent and
+                            event.completed):
+                        mark('first_byte')
+                        started = True
+                    yield event
+            yield from parser.close()
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+            mark('complete')
+        return returncode
+
+    async def run_async(self, rpc=None, stdout=subprocess.DEVNULL,
+                        on_event=None):
+        """Start download without blocking event loop
 
-    @property
-    def enable_dht(self):
-        """bool: Enable IPv4 DHT functionality.
-
-        It also enables UDP tracker support. If a private flag is set in a
-        torrent, aria2 doesn't use DHT for that download even if ``true`` is
-        given.
-
-        Possible Values: True, False
-        Default: True
+        Arguments:
+            rpc (rpc.Aria2RPC): Client of aria2c daemon, download is started
+                as separate aria2c process when None
+            stdout: Where output of aria2c process goes
+            on_event (callable): Called with every progress event parsed from
+                output of aria2c process, stdout is ignored then
+
+        Returns:
+            aio.DownloadHandle: Awaitable handle of the started download
         """
-        if self._enable_dht is None:
-            return self._using_settings.enable_dht
-
-        if type(self._enable_dht) is bool:
-            return self._enable_dht
-
-        self._enable_dht = None
-        return self._using_settings.enable_dht
-
-    @enable_dht.setter
-    def enable_dht(self, value):
-        if value is None:
-            self._enable_dht = None
-            return
-
-        if type(value) is not bool:
-            raise TypeError('Enable DHT is bool value')
-        self._enable_dht = value
+        import asyncio
+        from .aio import ProcessHandle, RPCHandle
+        if rpc is not None:
+            loop = asyncio.get_event_loop()
+            gid = await loop.run_in_executor(None, self.submit, rpc)
+            return RPCHandle(rpc, gid)
+        if on_event is not None:
+            stdout = subprocess.PIPE
+        process = await asyncio.create_subprocess_exec(
+            *self.command, stdin=subprocess.DEVNULL, stdout=stdout)
+        return ProcessHandle(process, on_event)
+
+
+for _option in OPTIONS:
+    setattr(Aria2c, _option.attr, _option)
+del _option
+
+
+class Aria2cDaemon(object):
+    """Long-lived aria2c process controlled over JSON-RPC
+
+    RPC secret is passed in a configuration file readable only by the user,
+    not on the command line other users see in ps. The file is removed once
+    the daemon started, aria2c reads it only on start. aria2c reads no
+    other configuration file then, ~/.aria2/aria2.conf is skipped.
+
+    Arguments:
+        host (str): Host where RPC interface listens
+        port (int): RPC listen port
+        secret (str): RPC secret token
+    """
+    START_TIMEOUT = 5
+
+    def __init__(self, host='localhost', port=6800, secret=None):
+        self._host = host
+        self._port = port
+        self._secret = secret
+        self._rpc = None
+        self._process = None
+        self._conf_path = None
 
     @property
-    def dht_listen_port(self):
-        """list: Set UDP listening port used by DHT(IPv4, IPv6) and UDP
-        tracker.
-
-        Multiple ports can be specified by using ',', for example:
-        "6881,6885". You can also use '-' to specify a range: "6881-6999". ','
-        and '-' cannot be used together.
-
-        Possible Values: 1024-65535
-        Default: 6881-6999
-        """
-        if self._dht_listen_port is None:
-            return self._using_settings.dht_listen_port
-
-        if type(self._dht_listen_port) is list:
-            if len([a for a in self._dht_listen_port if type(a) is int]) == 0:
-                if len([a for a in self._dht_listen_port if 0 < 1024]) == 0:
-                    if len([a for a in self._dht_listen_port
-                            if a > 65535]) == 0:
-                        return self._dht_listen_port
-
-        self._dht_listen_port = None
-        return self._using_settings.dht_listen_port
-
-    @dht_listen_port.setter
-    def dht_listen_port(self, value):
-        if value is None:
-            self._dht_listen_port = None
-            return
-
-        if type(value) is range:
-            value = list(value)
-
-        if type(value) is str:
-            if str(value).isdigit():
-                value = [int(value)]
-            elif len([a for a in str(value).split(',')
-                      if not a.isdigit()]) == 0:
-                value = [int(a) for a in str(value).split(',')]
-            elif len([a for a in str(value).split('-')]) == 2:
-                value = str(value).split('-')
-                if value[0].isdigit() and value[1].isdigit():
-                    value = list(range(int(value[0]), int(value[1]) + 1))
-
-        if type(value) is not list:
-            raise TypeError('DHT listen port has to be list')
-        if len([a for a in value if type(a) is not int]) > 0:
-            raise TypeError('DHT listen port has to be list of integers')
-
-        if len([a for a in value if a < 1024]) > 0:
-            raise ValueError('DHT listen port cannot be lower then 1024')
-        if len([a for a in value if a > 65535]) > 0:
-            raise ValueError('DHT listen port cannot be larger then 65535')
-
-        self._dht_listen_port = value
+    def rpc(self):
+        """rpc.Aria2RPC: Client connected to the daemon"""
+        if self._rpc is None:
+            from .rpc import Aria2RPC
+            self._rpc = Aria2RPC(
+                'http://{}:{}/jsonrpc'.format(self._host, self._port),
+                secret=self._secret)
+        return self._rpc
 
     @property
-    def enable_dht6(self):
-        """bool: Enable IPv6 DHT functionality.
+    def process(self):
+        """subprocess.Popen: Daemon process if started by this instance"""
+        return self._process
 
-        Use dht_listen_port option to specify port number to listen on. See
-        also dht_listen_addr6 option.
+    def is_running(self):
+        """Check whether the daemon responds on RPC port
 
-        Possible Values: True, False
-        Default: False
+        Returns:
+            bool: True if daemon responds
         """
-        if self._enable_dht6 is None:
-            return self._using_settings.enable_dht6
-
-        if type(self._enable_dht6) is bool:
-            return self._enable_dht6
+        # Plain connect is enough to find out nobody listens, the RPC client
+        # is loaded only when somebody does
+        try:
+            socket.create_connection((self._host, self._port), 1).close()
+        except OSError:
+            return False
+        from .rpc import RPCError
+        try:
+            self.rpc.get_version()
+        except (OSError, RPCError, ValueError):
+            self.rpc.close()
+            return False
+        return True
+
+    def command(self, aria2c=None):
+        """Command line which starts the daemon
+
+        The configuration file with RPC secret is created here and stays
+        until start() is called.
 
-        self._enable_dht6 = None
-        return self._using_settings.enable_dht6
-
-    @enable_dht6.setter
-    def enable_dht6(self, value):
-        if value is None:
-            self._enable_dht6 = None
-            return
-
-        if type(value) is not bool:
-            raise TypeError('Enable DHT6 is bool value')
-        self._enable_dht6 = value
-
-    @property
-    def dht_listen_addr6(self):
-        """str: Specify address to bind socket for IPv6 DHT.
+        Arguments:
+            aria2c (Aria2c): Job whose global options are used for the daemon
 
-        It should be a global unicast IPv6 address of the host.
+        Returns:
+            list: Command line arguments
 
-        Possible values: valid IPv6 address
-        Default: None
+        Raises:
+            ValueError: When RPC secret contains line break
         """
-        if self._dht_listen_addr6 is None:
-            return self._using_settings.dht_listen_addr6
-
-        if type(self._dht_listen_addr6) is str:
-            # TODO: check regex addr6
-            return self._dht_listen_addr6
-
-        self._dht_listen_addr6 = None
-        return self._using_settings.dht_listen_addr6
-
-    @dht_listen_addr6.setter
-    def dht_listen_addr6(self, value):
-        if value is None:
-            self._dht_listen_addr6 = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('DHT listen addr6 is bool value')
-
-        # TODO: check regex addr6
-
-        self._dht_listen_addr6 = value
+        cmd = [Aria2c.COMMAND, '--enable-rpc',
+               '--rpc-listen-port={}'.format(self._port)]
+        if self._secret is not None:
+            cmd.append('--conf-path={}'.format(self._conf()))
+        if aria2c is not None:
+            cmd.extend('--{}={}'.format(name, value)
+                       for name, value in aria2c.global_options.items())
+        return cmd
 
-    @property
-    def metalink_file(self):
-        """The file path to the .meta4 and .metalink file.
+    def _conf(self):
+        """Configuration file holding RPC secret, created on first use"""
+        if self._conf_path is None:
+            if '\n' in self._secret or '\r' in self._secret:
+                raise ValueError('RPC secret can\'t contain line break')
+            import tempfile
+            # mkstemp creates the file with 0600 permissions
+            descriptor, self._conf_path = tempfile.mkstemp(
+                prefix='aria2c-', suffix='.conf')
+            with os.fdopen(descriptor, 'w') as stream:
+                stream.write('rpc-secret={}\n'.format(self._secret))
+        return self._conf_path
+
+    def _remove_conf(self):
+        if self._conf_path is not None:
+            try:
+                os.remove(self._conf_path)
+            except FileNotFoundError:
+                pass
+            self._conf_path = None
+
+    def start(self, aria2c=None):
+        """Start the daemon and wait until it accepts RPC calls
 
-        Reads input from stdin when '-' is specified.
+        Arguments:
+            aria2c (Aria2c): Job whose global options are used for the daemon
 
-        Possible Values: /path/to/file, -
-        Default: None
+        Raises:
+            RuntimeError: When daemon doesn't respond in START_TIMEOUT
         """
-        if self._metalink_file is None:
-            return self._using_settings.metalink_file
-
-        if (type(self._metalink_file) is str and
-                (self._metalink_file == '-' or
-                 os.path.isfile(self._metalink_file))):
-            return self._metalink_file
-
-        self._metalink_file = None
-        return self._using_settings.metalink_file
-
-    @metalink_file.setter
-    def metalink_file(self, value):
-        if value is None:
-            self._metalink_file = None
-            return
-
-        if type(value) is not str:
-            raise TypeError('Metalink file has to be string')
-        if not (value == '-' or os.path.isfile(value)):
-            raise ValueError('Illegal option for metalink file')
-        if value == '-':
-            self._metalink_file = value
-        else:
-            self._metalink_file = os.path.abspath(value)
-
-    @property
-    def uri(self):
-        return self._uri
-
-    @uri.setter
-    def uri(self, value):
-        self._uri = value
-
-    @property
-    def magnet(self):
-        return self._magnet
-
-    @magnet.setter
-    def magnet(self, value):
-        self._magnet = value
-
-    @property
-    def command(self):
-        cmd = [self.COMMAND]
-        if self.log != self._default_settings.log:
-            cmd.append('--log={}'.format(self.log))
-        if self.dir != self._default_settings.dir:
-            cmd.append('--dir={}'.format(self.dir))
-        if self.out != self._default_settings.out:
-            cmd.append('--out={}'.format(self.out))
-        if self.split != self._default_settings.split:
-            cmd.append('--split={}'.format(self.split))
-        if self.file_allocation != self._default_settings.file_allocation:
-            cmd.append('--file-allocation={}'.format(self.file_allocation))
-        if self.check_integrity != self._default_settings.check_integrity:
-            cmd.append('--check-integrity={}'
-                       .format(str(self.check_integrity).lower()))
-        if (self.continue_downloading !=
-                self._default_settings.continue_downloading):
-            cmd.append('--continue={}'
-                       .format(str(self.continue_downloading).lower()))
-        if self.input_file != self._default_settings.input_file:
-            cmd.append('--input-file={}'.format(self.input_file))
-        if (self.max_concurrent_downloads !=
-                self._default_settings.max_concurrent_downloads):
-            cmd.append('--max-concurrent-downloads={}'
-                       .format(self.max_concurrent_downloads))
-        if self.force_sequential != self._default_settings.force_sequential:
-            cmd.append('--force-sequential={}'
-                       .format(str(self.force_sequential).lower()))
-        if (self.max_connection_per_server !=
-                self._default_settings.max_connection_per_server):
-            cmd.append('--max-connection-per-server={}'
-                       .format(self.max_connection_per_server))
-        if self.min_split_size != self._default_settings.min_split_size:
-            cmd.append('--min-split-size={}'.format(self.min_split_size))
-        if self.ftp_user != self._default_settings.ftp_user:
-            cmd.append('--ftp-user={}'.format(self.ftp_user))
-        if self.ftp_passwd != self._default_settings.ftp_passwd:
-            cmd.append('--ftp-passwd={}'.format(self.ftp_passwd))
-        if self.http_user != self._default_settings.http_user:
-            cmd.append('--http-user={}'.format(self.http_user))
-        if self.http_passwd != self._default_settings.http_passwd:
-            cmd.append('--http-passwd={}'.format(self.http_passwd))
-        if self.load_cookies != self._default_settings.load_cookies:
-            cmd.append('--load-cookies={}'.format(self.load_cookies))
-        if self.show_files != self._default_settings.show_files:
-            cmd.append('--show-files={}'.format(str(self.show_files).lower()))
-        if (self.max_overall_upload_limit !=
-                self._default_settings.max_overall_upload_limit):
-            cmd.append('--max-overall-upload-limit={}'
-                       .format(self.max_overall_upload_limit))
-        if self.max_upload_limit != self._default_settings.max_upload_limit:
-            cmd.append('--max-upload-limit={}'.format(self.max_upload_limit))
-        if self.torrent_file != self._default_settings.torrent_file:
-            cmd.append('--torrent-file={}'.format(self.torrent_file))
-        if self.listen_port != self._default_settings.listen_port:
-            cmd.append('--listen-port={}'.format(','.join(
-                [str(a) for a in self.listen_port])))
-        if self.enable_dht != self._default_settings.enable_dht:
-            cmd.append('--enable-dht={}'.format(str(self.enable_dht).lower()))
-        if self.dht_listen_port != self._default_settings.dht_listen_port:
-            cmd.append('--dht-listen-port={}'.format(','.join(
-                [str(a) for a in self.dht_listen_port])))
-        if self.enable_dht6 != self._default_settings.enable_dht6:
-            cmd.append('--enable-dht6={}'
-                       .format(str(self.enable_dht6).lower()))
-        if self.dht_listen_addr6 != self._default_settings.dht_listen_addr6:
-            cmd.append('--dht-listen-addr6={}'.format(self.dht_listen_addr6))
-        if self.metalink_file != self._default_settings.metalink_file:
-            cmd.append('--metalink-file={}'.format(self.metalink_file))
-        if self.uri is not None:
-            cmd.append(self.uri)
-        elif self.magnet is not None:
-            cmd.append(self.magnet)
-        return cmd
-
-    def run(self):
-        print(' '.join(self.command))
-        print()
-        process = subprocess.Popen(self.command)
-        process.communicate()
+        try:
+            self._process = subprocess.Popen(
+                self.command(aria2c), stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                start_new_session=True)
+            deadline = time.monotonic() + self.START_TIMEOUT
+            while time.monotonic() < deadline:
+                if self.is_running():
+                    return
+                if self._process.poll() is not None:
+                    break
+                time.sleep(0.05)
+        finally:
+            self._remove_conf()
+        raise RuntimeError('aria2c daemon did not start')
+
+    def stop(self):
+        """Shut the daemon down"""
+        try:
+            self.rpc.shutdown()
+        finally:
+            self.rpc.close()
+        if self._process is not None:
+            self._process.wait()
+            self._process = None
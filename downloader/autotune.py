@@ -0,0 +1,266 @@
+"""Adaptive split and connection count from observed throughput"""
+
+import fcntl
+import json
+import os
+import random
+import time
+import urllib.parse
+from collections import OrderedDict
+
+from .progress import CompleteEvent
+from .settings import cache_dir
+
+__all__ = ['Autotuner', 'CANDIDATES', 'TUNED', 'size_bucket']
+
+# Attribute names of candidate values
+TUNED = ('split', 'min_split_size', 'max_connection_per_server')
+# (split, min_split_size, max_connection_per_server) from the least to the
+# most aggressive
+CANDIDATES = (
+    (1, 20971520, 1),
+    (2, 8388608, 2),
+    (4, 4194304, 4),
+    (8, 2097152, 8),
+    (16, 1048576, 16),
+)
+
+
+def size_bucket(size):
+    """Bucket of file size, every bucket is 4 times larger than previous
+
+    Arguments:
+        size (int): File size in bytes, None when not known
+
+    Returns:
+        str: Bucket name, 'unknown' when size is not known
+    """
+    if size is None:
+        return 'unknown'
+    return str(max(0, (size.bit_length() - 20) // 2))
+
+
+def _name(candidate):
+    return '/'.join(str(value) for value in candidate)
+
+
+class Autotuner(object):
+    """Learns which split, min_split_size and connection count give the best
+    throughput for host and file size
+
+    Observations are kept as count and mean throughput of every candidate per
+    host and size bucket in a JSON file shared by all processes. Choice is
+    epsilon-greedy: the best known candidate, sometimes another one so the
+    history doesn't get stuck on the first guess.
+
+    Arguments:
+        path (str): History file, autotune.json in cache directory by default
+        epsilon (float): Probability of trying other than the best candidate
+        seed: Seed of random generator for reproducible choices
+    """
+    SLOW_RATIO = 0.5
+
+    def __init__(self, path=None, epsilon=0.1, seed=None):
+        if path is None:
+            path = os.path.join(cache_dir(), 'autotune.json')
+        self._path = path
+        self._epsilon = epsilon
+        self._random = random.Random(seed)
+        self._history = self._load()
+
+    def _load(self):
+        try:
+            with open(self._path) as stream:
+                return json.load(stream)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def key(host, size):
+        """Key of history entry
+
+        Arguments:
+            host (str): Host name
+            size (int): File size, None when not known
+
+        Returns:
+            str: Key
+        """
+        return '{}|{}'.format(host, size_bucket(size))
+
+    @staticmethod
+    def prior(size):
+        """Candidate used when nothing was observed yet
+
+        Arguments:
+            size (int): File size, None when not known
+
+        Returns:
+            tuple: Most aggressive candidate which can split the file
+        """
+        if size is None:
+            return CANDIDATES[-1]
+        chosen = CANDIDATES[0]
+        for candidate in CANDIDATES:
+            if size >= candidate[0] * candidate[1] // 2:
+                chosen = candidate
+        return chosen
+
+    def expected(self, host, size):
+        """Best known throughput for host and size
+
+        Returns:
+            float: Throughput in bytes/sec, None when nothing was observed
+        """
+        stats = self._history.get(self.key(host, size))
+        if not stats:
+            return None
+        return max(mean for _, mean in stats.values())
+
+    def choose(self, host, size):
+        """Choose candidate for a download
+
+        Arguments:
+            host (str): Host name
+            size (int): File size, None when not known
+
+        Returns:
+            tuple: (split, min_split_size, max_connection_per_server)
+        """
+        stats = self._history.get(self.key(host, size))
+        if not stats:
+            return self.prior(size)
+        if self._random.random() < self._epsilon:
+            untried = [candidate for candidate in CANDIDATES
+                       if _name(candidate) not in stats]
+            return self._random.choice(untried or CANDIDATES)
+        best = max(stats, key=lambda name: stats[name][1])
+        return tuple(int(value) for value in best.split('/'))
+
+    def options(self, host, size, ranges=True):
+        """Options of download chosen for host and size
+
+        Arguments:
+            host (str): Host name
+            size (int): File size, None when not known
+            ranges (bool): False when server doesn't accept byte ranges, the
+                least aggressive candidate is used then
+
+        Returns:
+            OrderedDict: Values of TUNED by attribute name
+        """
+        candidate = self.choose(host, size) if ranges else CANDIDATES[0]
+        return OrderedDict(zip(TUNED, candidate))
+
+    def tune(self, aria2c, size=None):
+        """Set split, min_split_size and max_connection_per_server of download
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download with uri
+            size (int): File size, None when not known
+
+        Returns:
+            tuple: Chosen candidate
+        """
+        candidate = self.choose(urllib.parse.urlsplit(aria2c.uri).hostname,
+                                size)
+        (aria2c.split, aria2c.min_split_size,
+         aria2c.max_connection_per_server) = candidate
+        return candidate
+
+    def record(self, host, size, candidate, throughput):
+        """Store observed throughput
+
+        History file is locked while it is merged with observations of other
+        processes.
+
+        Arguments:
+            host (str): Host name
+            size (int): File size, None when not known
+            candidate (tuple): Candidate used for the download
+            throughput (float): Observed throughput in bytes/sec
+        """
+        with open(self._path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._history = self._load()
+            stats = self._history.setdefault(self.key(host, size), {})
+            count, mean = stats.get(_name(candidate), (0, 0.0))
+            count += 1
+            stats[_name(candidate)] = (count,
+                                       mean + (throughput - mean) / count)
+            with open(self._path + '.tmp', 'w') as stream:
+                json.dump(self._history, stream)
+            os.replace(self._path + '.tmp', self._path)
+
+    def run(self, aria2c, size=None):
+        """Tune download, run it and record its average speed
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download with uri
+            size (int): File size, None when not known
+
+        Returns:
+            bool: True if download completed
+        """
+        candidate = self.tune(aria2c, size)
+        host = urllib.parse.urlsplit(aria2c.uri).hostname
+        completed = False
+        for event in aria2c.stream():
+            if type(event) is CompleteEvent:
+                self.record(host, size, candidate, event.speed)
+                completed = True
+        return completed
+
+    def watch(self, rpc, gid, host, size, candidate, interval=2, warmup=10):
+        """Follow download in daemon and make it more aggressive when slow
+
+        When speed stays under SLOW_RATIO of the best known throughput for
+        warmup seconds of activity, next candidate is applied by
+        aria2.changeOption. Throughput of the whole download over the time
+        it was active is recorded for the last candidate.
+
+        Arguments:
+            rpc (rpc.Aria2RPC): Client connected to the daemon
+            gid (str): GID of the download
+            host (str): Host name
+            size (int): File size, None when not known
+            candidate (tuple): Candidate the download started with
+            interval (float): Seconds between status checks
+            warmup (float): Active seconds before speed is judged
+
+        Returns:
+            str: Final status of the download
+        """
+        expected = self.expected(host, size)
+        # Seconds the download was active, time spent waiting in the queue
+        # or paused doesn't count
+        active = judged = 0.0
+        previous = None
+        last = time.monotonic()
+        keys = ['status', 'downloadSpeed', 'completedLength']
+        while True:
+            status = rpc.tell_status(gid, keys)
+            now = time.monotonic()
+            if previous == 'active':
+                active += now - last
+            last = now
+            previous = status['status']
+            if previous not in ('active', 'waiting', 'paused'):
+                break
+            if (expected and previous == 'active' and
+                    active - judged >= warmup and
+                    int(status['downloadSpeed']) < expected *
+                    self.SLOW_RATIO and candidate != CANDIDATES[-1]):
+                candidate = CANDIDATES[CANDIDATES.index(candidate) + 1
+                                       if candidate in CANDIDATES else -1]
+                rpc.change_option(gid, {
+                    'split': str(candidate[0]),
+                    'min-split-size': str(candidate[1]),
+                    'max-connection-per-server': str(candidate[2])})
+                judged = active
+            time.sleep(interval)
+        # Download finished before it was seen active tells nothing
+        if status['status'] == 'complete' and active > 0:
+            self.record(host, size, candidate,
+                        int(status['completedLength']) / active)
+        return status['status']
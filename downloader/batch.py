@@ -0,0 +1,113 @@
+"""Batch of downloads packed into one aria2c input file"""
+
+import os
+import tempfile
+
+__all__ = ['InputFile', 'read_urls']
+
+
+def read_urls(stream):
+    """Read URLs from text stream
+
+    Empty lines and lines starting with '#' are skipped. Like in aria2c input
+    file, a line may hold TAB separated mirrors of one file.
+
+    Arguments:
+        stream: Text stream with one URL per line
+
+    Yields:
+        str: URL, mirrors are separated by TAB
+    """
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+class InputFile(object):
+    """aria2c input file
+
+    Every entry is one download with one or more URIs of the same file and
+    options which apply only to this download. See INPUT FILE section of
+    aria2c man page.
+    """
+    def __init__(self):
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def add(self, uris, options=None):
+        """Add download
+
+        Arguments:
+            uris (str|list): URI or list of URIs (mirrors) of one file
+            options (dict): aria2c options for this download only
+        """
+        if type(uris) is str:
+            uris = [uris]
+        if len(uris) == 0:
+            raise ValueError('At least one URI has to be specified')
+        for uri in uris:
+            if type(uri) is not str:
+                raise TypeError('URI has to be string')
+            if '\t' in uri or '\n' in uri:
+                raise ValueError('URI cannot contain TAB or new line')
+        options = dict(options or {})
+        for name, value in options.items():
+            if '\n' in str(value):
+                raise ValueError('Option {} cannot contain new line'
+                                 .format(name))
+        self._entries.append((list(uris), options))
+
+    def write(self, stream):
+        """Write input file to text stream
+
+        Arguments:
+            stream: Writable text stream
+        """
+        lines = []
+        for uris, options in self._entries:
+            lines.append('\t'.join(uris))
+            lines.extend(' {}={}'.format(name, value)
+                         for name, value in options.items())
+        stream.write('\n'.join(lines))
+        stream.write('\n')
+
+    def save(self, path=None):
+        """Save input file to disk
+
+        Arguments:
+            path (str): Target path, temporary file is created when None
+
+        Returns:
+            str: Path to saved file
+        """
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='downloader-', suffix='.txt')
+            stream = os.fdopen(fd, 'w')
+        else:
+            stream = open(path, 'w')
+        with stream:
+            self.write(stream)
+        return path
+
+    def submit(self, rpc, options=None):
+        """Submit all downloads to aria2c daemon in one RPC request
+
+        Arguments:
+            rpc (rpc.Aria2RPC): Client connected to the daemon
+            options (dict): Options shared by all downloads
+
+        Returns:
+            list: GIDs of the new downloads
+        """
+        calls = []
+        for uris, entry_options in self._entries:
+            job_options = dict(options or {})
+            job_options.update(entry_options)
+            calls.append(('aria2.addUri', [uris, job_options]))
+        return rpc.multicall(calls)
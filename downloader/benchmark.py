@@ -0,0 +1,535 @@
+"""Throughput benchmark against local range capable HTTP server
+
+Run:
+
+    $ python -m downloader.benchmark run --split 1,4,16 --output report.json
+    $ python -m downloader.benchmark profiles --file-size 1G --count 1
+
+The server runs in its own process and serves generated files of
+configurable size and count, optionally with added latency and per
+connection bandwidth limit. Every trial downloads all files with one
+aria2c process (or one forked process running the built-in engine) and
+records wall time, throughput, CPU time and peak RSS of that process.
+"""
+
+import functools
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+
+from .aria2c import Aria2c
+from .batch import InputFile
+from .engine import HTTPEngine
+from .options import BY_ATTR, parse_size
+from .settings import Settings
+
+__all__ = ['RangeRequestHandler', 'BenchmarkServer', 'Trial', 'sweep',
+           'compare', 'startup', 'environment']
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler with Range support, latency and bandwidth limit
+
+    Attributes:
+        latency (float): Seconds slept before every response
+        bandwidth (int): Bytes/sec per connection, 0 means unlimited
+    """
+    latency = 0
+    bandwidth = 0
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        if self.latency:
+            time.sleep(self.latency)
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404, 'File not found')
+            return None
+        size = os.path.getsize(path)
+        first, last = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match is not None:
+            first = int(match.group(1))
+            if match.group(2):
+                last = min(int(match.group(2)), size - 1)
+            if first > last:
+                self.send_error(416, 'Requested range not satisfiable')
+                return None
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             'bytes {}-{}/{}'.format(first, last, size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(last - first + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        stream = open(path, 'rb')
+        stream.seek(first)
+        self._remaining = last - first + 1
+        return stream
+
+    def copyfile(self, source, outputfile):
+        start = time.monotonic()
+        sent = 0
+        while self._remaining > 0:
+            data = source.read(min(65536, self._remaining))
+            if not data:
+                break
+            outputfile.write(data)
+            sent += len(data)
+            self._remaining -= len(data)
+            if self.bandwidth:
+                delay = sent / self.bandwidth - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+
+class BenchmarkServer(object):
+    """Local HTTP server running in its own process
+
+    Files are generated from a fixed seed so runs are comparable across
+    commits and machines.
+
+    Arguments:
+        file_size (int): Size of every file in bytes
+        count (int): Number of files
+        latency (float): Seconds added before every response
+        bandwidth (int): Bytes/sec per connection, 0 means unlimited
+    """
+    def __init__(self, file_size=64 * 1024 * 1024, count=1, latency=0,
+                 bandwidth=0):
+        self._file_size = file_size
+        self._count = count
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._root = None
+        self._process = None
+        self._port = None
+
+    @property
+    def urls(self):
+        """list: URLs of served files"""
+        return ['http://127.0.0.1:{}/file{}.bin'.format(self._port, index)
+                for index in range(self._count)]
+
+    def _generate(self):
+        block = random.Random(0).getrandbits(8 * 1024 * 1024).to_bytes(
+            1024 * 1024, 'little')
+        for index in range(self._count):
+            path = os.path.join(self._root, 'file{}.bin'.format(index))
+            with open(path, 'wb') as stream:
+                for offset in range(0, self._file_size, len(block)):
+                    stream.write(block[:self._file_size - offset])
+
+    def start(self):
+        self._root = tempfile.mkdtemp(prefix='downloader-bench-')
+        self._generate()
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'downloader.benchmark', 'serve',
+             '--root', self._root, '--latency', str(self._latency),
+             '--bandwidth', str(self._bandwidth)],
+            stdout=subprocess.PIPE, universal_newlines=True)
+        self._port = int(self._process.stdout.readline())
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
+        if self._root is not None:
+            shutil.rmtree(self._root, ignore_errors=True)
+            self._root = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class Trial(object):
+    """One download of all files with one set of options
+
+    Arguments:
+        urls (list): URLs to download
+        options (dict): Option values by attribute name
+        engine (str): 'aria2c' or 'builtin'
+    """
+    def __init__(self, urls, options, engine='aria2c'):
+        self._urls = urls
+        self._options = options
+        self._engine = engine
+
+    def _job(self, directory):
+        aria2c = Aria2c()
+        aria2c.dir = directory
+        aria2c.max_concurrent_downloads = max(1, len(self._urls))
+        for name, value in self._options.items():
+            setattr(aria2c, name, value)
+        return aria2c
+
+    def _spawn_aria2c(self, directory):
+        batch = InputFile()
+        for url in self._urls:
+            batch.add(url)
+        path = batch.save(os.path.join(directory, 'input.txt'))
+        aria2c = self._job(directory)
+        aria2c.input_file = path
+        aria2c.summary_interval = 0
+        return subprocess.Popen(aria2c.command, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL).pid
+
+    def _fork_builtin(self, directory):
+        pid = os.fork()
+        if pid:
+            return pid
+        code = 0
+        try:
+            for url in self._urls:
+                aria2c = self._job(directory)
+                aria2c.uri = url
+                HTTPEngine(aria2c).run()
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def run(self):
+        """Run the trial
+
+        Returns:
+            dict: Measured wall time, throughput, CPU time and peak RSS
+        """
+        directory = tempfile.mkdtemp(prefix='downloader-trial-')
+        try:
+            start = time.monotonic()
+            if self._engine == 'builtin':
+                pid = self._fork_builtin(directory)
+            else:
+                pid = self._spawn_aria2c(directory)
+            _, status, usage = os.wait4(pid, 0)
+            wall = time.monotonic() - start
+            size = sum(os.path.getsize(os.path.join(directory, name))
+                       for name in os.listdir(directory)
+                       if name.endswith('.bin'))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return {
+            'returncode': os.WEXITSTATUS(status),
+            'wall': wall,
+            'bytes': size,
+            'throughput': size / wall if wall else 0,
+            'user_cpu': usage.ru_utime,
+            'system_cpu': usage.ru_stime,
+            'max_rss_kib': usage.ru_maxrss
+        }
+
+
+def _median(results, key):
+    return statistics.median([result[key] for result in results])
+
+
+def sweep(urls, grid, repeat=3, engine='aria2c'):
+    """Run trial for every combination of option values
+
+    Arguments:
+        urls (list): URLs to download
+        grid (dict): List of values by option attribute name
+        repeat (int): Runs of every combination, medians are reported
+        engine (str): 'aria2c' or 'builtin'
+
+    Returns:
+        list: Result of every combination with its runs and medians
+    """
+    names = sorted(grid)
+    return [_summary(urls, dict(zip(names, values)), repeat, engine)
+            for values in itertools.product(*[grid[name] for name in names])]
+
+
+def compare(urls, profiles, repeat=3, engine='aria2c'):
+    """Run trial for every settings profile
+
+    Download directory of the profile is replaced by the trial directory.
+
+    Arguments:
+        urls (list): URLs to download
+        profiles (list): Names from Settings.PROFILES
+        repeat (int): Runs of every profile, medians are reported
+        engine (str): 'aria2c' or 'builtin'
+
+    Returns:
+        list: Result of every profile with its options, runs and medians
+    """
+    results = []
+    for name in profiles:
+        options = dict(Settings.PROFILES[name])
+        options.pop('dir', None)
+        summary = _summary(urls, options, repeat, engine)
+        summary['profile'] = name
+        results.append(summary)
+    return results
+
+
+def _summary(urls, options, repeat, engine):
+    runs = [Trial(urls, options, engine).run() for _ in range(repeat)]
+    summary = {'options': options, 'runs': runs}
+    for key in ('wall', 'throughput', 'user_cpu', 'system_cpu',
+                'max_rss_kib'):
+        summary[key] = _median(runs, key)
+    summary['failed'] = sum(1 for run in runs if run['returncode'])
+    return summary
+
+
+def _walls(commands, repeat, env=None, after=None):
+    """Wall times of commands, run in turns so load of the machine hits all
+    of them alike, after is called when every command ran once"""
+    times = dict((name, []) for name in commands)
+    for _ in range(repeat):
+        for name, command in commands.items():
+            start = time.perf_counter()
+            subprocess.check_call(command, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL, env=env)
+            times[name].append(time.perf_counter() - start)
+        if after is not None:
+            after()
+    return dict((name, {'median': statistics.median(values),
+                        'min': min(values)})
+                for name, values in times.items())
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# The same as the installed download script, -m would add runpy
+_SCRIPT = 'import sys; from downloader.__main__ import main; sys.exit(main())'
+# Help of command without options, the part of start owed to Click
+_EMPTY = 'import click; click.command()(lambda: None)()'
+
+
+def startup(repeat=20, file_size=1024):
+    """Measure cold start of the command line tool
+
+    The tool downloads one small file from local server, by aria2c when it
+    is installed, so everything a download imports and parses is measured.
+    It runs with a temporary home directory, so rules, caches and the
+    download directory of the user are not touched, and with a free RPC
+    port, so no running daemon takes the download. Bare interpreter start
+    and help of a Click command without options are measured too, so the
+    cost of the tool itself can be told apart, Click alone differs a lot
+    between its versions.
+
+    Arguments:
+        repeat (int): Runs of every command
+        file_size (int): Size of the downloaded file in bytes
+
+    Returns:
+        dict: Median and minimum wall time of interpreter, Click and tool
+    """
+    home = tempfile.mkdtemp(prefix='downloader-bench-')
+    env = dict(os.environ, HOME=home,
+               XDG_CACHE_HOME=os.path.join(home, '.cache'))
+    env.pop('DOWNLOADER_RULES', None)
+    env.pop('DOWNLOADER_RPC_SECRET', None)
+    try:
+        with BenchmarkServer(file_size, 1) as server:
+            path = os.path.join(home, 'file0.bin')
+            return _walls({
+                'interpreter': [sys.executable, '-c', 'pass'],
+                'click': [sys.executable, '-c', _EMPTY, '--help'],
+                'download': [sys.executable, '-c', _SCRIPT,
+                             '--settings', 'default',
+                             '--rpc-port', str(_free_port()),
+                             server.urls[0]]
+            }, repeat, env, lambda: os.remove(path))
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+
+def environment():
+    """Describe machine and code so reports can be compared
+
+    Returns:
+        dict: Commit, versions and machine
+    """
+    def output(command):
+        try:
+            return subprocess.check_output(
+                command, stderr=subprocess.DEVNULL,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                universal_newlines=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    aria2c = output([Aria2c.COMMAND, '--version'])
+    return {
+        'commit': output(['git', 'rev-parse', 'HEAD']),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'aria2c': aria2c.splitlines()[0] if aria2c else None,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    }
+
+
+def _values(option):
+    def convert(ctx, param, value):
+        try:
+            return [BY_ATTR[option].convert(int(item) if item.isdigit()
+                                            else item)
+                    for item in value.split(',')]
+        except (TypeError, ValueError) as error:
+            raise click.BadParameter(str(error))
+    return convert
+
+
+@click.group()
+def cli():
+    """Throughput benchmark of downloader"""
+
+
+@cli.command()
+@click.option('--root', required=True, type=click.Path(exists=True))
+@click.option('--latency', default=0.0, type=click.FLOAT)
+@click.option('--bandwidth', default=0, type=click.INT)
+def serve(root, latency, bandwidth):
+    """Serve files from ROOT and print the port"""
+    handler = type('Handler', (RangeRequestHandler,),
+                   {'latency': latency, 'bandwidth': bandwidth})
+    server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                 functools.partial(handler, directory=root))
+    click.echo(server.server_address[1])
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+@cli.command()
+@click.option('--file-size', default='64M', help='Size of every file')
+@click.option('--count', default=1, type=click.INT, help='Number of files')
+@click.option('--latency', default=0.0, type=click.FLOAT,
+              help='Seconds added to every response')
+@click.option('--bandwidth', default='0',
+              help='Bytes/sec per connection, 0 is unlimited')
+@click.option('--split', default='1,4,16', callback=_values('split'))
+@click.option('--max-connection-per-server', default='16',
+              callback=_values('max_connection_per_server'))
+@click.option('--min-split-size', default='1M',
+              callback=_values('min_split_size'))
+@click.option('--file-allocation', default='falloc',
+              callback=_values('file_allocation'))
+@click.option('--repeat', default=3, type=click.INT,
+              help='Runs of every combination')
+@click.option('--engine', default='aria2c',
+              type=click.Choice(['aria2c', 'builtin']))
+@click.option('--output', default='-', type=click.File('w'),
+              help='JSON report, stdout by default')
+def run(file_size, count, latency, bandwidth, split,
+        max_connection_per_server, min_split_size, file_allocation, repeat,
+        engine, output):
+    """Sweep option values and write JSON report"""
+    grid = {'split': split,
+            'max_connection_per_server': max_connection_per_server,
+            'min_split_size': min_split_size,
+            'file_allocation': file_allocation}
+    file_size = parse_size(file_size, 'File size')
+    bandwidth = parse_size(bandwidth, 'Bandwidth')
+    with BenchmarkServer(file_size, count, latency, bandwidth) as server:
+        results = sweep(server.urls, grid, repeat, engine)
+    json.dump({
+        'environment': environment(),
+        'server': {'file_size': file_size, 'count': count,
+                   'latency': latency, 'bandwidth': bandwidth},
+        'engine': engine,
+        'repeat': repeat,
+        'results': results
+    }, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+
+@cli.command()
+@click.option('--file-size', default='64M', help='Size of every file')
+@click.option('--count', default=1, type=click.INT, help='Number of files')
+@click.option('--latency', default=0.0, type=click.FLOAT,
+              help='Seconds added to every response')
+@click.option('--bandwidth', default='0',
+              help='Bytes/sec per connection, 0 is unlimited')
+@click.option('--profile', 'names', multiple=True,
+              type=click.Choice(sorted(Settings.PROFILES)),
+              help='Settings profile, all profiles by default')
+@click.option('--repeat', default=3, type=click.INT,
+              help='Runs of every profile')
+@click.option('--engine', default='aria2c',
+              type=click.Choice(['aria2c', 'builtin']))
+@click.option('--output', default='-', type=click.File('w'),
+              help='JSON report, stdout by default')
+def profiles(file_size, count, latency, bandwidth, names, repeat, engine,
+             output):
+    """Compare settings profiles and write JSON report"""
+    file_size = parse_size(file_size, 'File size')
+    bandwidth = parse_size(bandwidth, 'Bandwidth')
+    with BenchmarkServer(file_size, count, latency, bandwidth) as server:
+        results = compare(server.urls, names or sorted(Settings.PROFILES),
+                          repeat, engine)
+    json.dump({
+        'environment': environment(),
+        'server': {'file_size': file_size, 'count': count,
+                   'latency': latency, 'bandwidth': bandwidth},
+        'engine': engine,
+        'repeat': repeat,
+        'results': results
+    }, output, indent=2, sort_keys=True)
+    output.write('\n')
+    for result in results:
+        click.echo('{:<12} {:8.2f} s {:10.1f} MiB/s {:3} failed'.format(
+            result['profile'], result['wall'],
+            result['throughput'] / 1048576, result['failed']), err=True)
+
+
+@cli.command('startup')
+@click.option('--repeat', default=20, type=click.INT,
+              help='Runs of every command')
+@click.option('--file-size', default='1K',
+              help='Size of the downloaded file')
+@click.option('--budget', default=90.0, type=click.FLOAT,
+              help='Maximum time of the download over empty Click command '
+                   'in milliseconds')
+def startup_command(repeat, file_size, budget):
+    """Measure cold start of download, fail when it is over budget"""
+    result = startup(repeat, parse_size(file_size))
+    for name in ('interpreter', 'click', 'download'):
+        click.echo('{:<12} median {:7.1f} ms  min {:7.1f} ms'.format(
+            name, result[name]['median'] * 1000,
+            result[name]['min'] * 1000))
+    # Noise only adds time, minimums are steadier than medians
+    own = (result['download']['min'] - result['click']['min']) * 1000
+    click.echo('{:<12} min    {:7.1f} ms'.format('own', own))
+    if own > budget:
+        raise click.ClickException('Download takes {:.1f} ms more than '
+                                   'empty Click command, budget is {} ms'
+                                   .format(own, budget))
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
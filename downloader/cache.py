@@ -0,0 +1,327 @@
+"""Content addressed cache of downloaded artifacts"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import urllib.request
+from collections import OrderedDict
+
+from .engine import request_headers
+from .settings import cache_dir
+
+__all__ = ['ArtifactCache', 'Validators', 'link']
+
+FICLONE = 0x40049409
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+CREATE INDEX IF NOT EXISTS objects_accessed ON objects (accessed);
+'''
+
+
+class Validators(object):
+    """Response headers which tell whether cached copy is still current
+
+    Attributes:
+        etag (str): ETag header
+        last_modified (str): Last-Modified header
+        size (int): Content-Length header
+    """
+    __slots__ = ('etag', 'last_modified', 'size')
+
+    def __init__(self, etag=None, last_modified=None, size=None):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+
+    def matches(self, etag, last_modified, size):
+        """Compare with stored values
+
+        Strong ETag decides when both sides have it. Otherwise Last-Modified
+        and size both have to be known and equal.
+
+        Returns:
+            bool: True if stored copy is current
+        """
+        if (self.etag is not None and etag is not None and
+                not self.etag.startswith('W/') and not etag.startswith('W/')):
+            return self.etag == etag
+        return (self.last_modified is not None and
+                self.last_modified == last_modified and
+                self.size is not None and self.size == size)
+
+
+def _hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _reflink(source, target):
+    with open(source, 'rb') as input_stream, open(target, 'wb') as output:
+        fcntl.ioctl(output.fileno(), FICLONE, input_stream.fileno())
+    os.chmod(target, 0o644)
+
+
+def _hardlink(source, target):
+    os.remove(target)
+    os.link(source, target)
+
+
+def _copy(source, target):
+    shutil.copyfile(source, target)
+    os.chmod(target, 0o644)
+
+
+_LINKS = OrderedDict([('reflink', _reflink), ('hardlink', _hardlink),
+                      ('copy', _copy)])
+
+# Hardlink shares inode with the source, writes to one change the other
+_AUTO = ('reflink', 'copy')
+
+
+def link(source, target, mode='auto'):
+    """Make target have content of source without copying when possible
+
+    Target is replaced atomically, so readers never see partial file.
+
+    Arguments:
+        source (str): Existing file
+        target (str): Path to create, replaced when it exists
+        mode (str): 'reflink', 'hardlink', 'copy' or 'auto' which tries
+            reflink and then copy
+
+    Returns:
+        str: Mode which was used
+    """
+    fd, temporary = tempfile.mkstemp(prefix='.downloader-',
+                                     dir=os.path.dirname(target) or '.')
+    os.close(fd)
+    modes = list(_AUTO) if mode == 'auto' else [mode]
+    try:
+        for name in modes:
+            try:
+                _LINKS[name](source, temporary)
+            except OSError:
+                if name == modes[-1]:
+                    raise
+                continue
+            os.replace(temporary, target)
+            return name
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+class ArtifactCache(object):
+    """Cache in front of Aria2c.run()
+
+    Files are stored once per SHA-256 of their content, the SQLite index maps
+    URL to content digest and validators of the response. Before download a
+    HEAD request checks whether the cached copy is current, a hit is
+    reflinked or copied to the target path. Cached files never share inode
+    with downloaded ones, which aria2c or resume may rewrite in place, and
+    they are read only. The least
+    recently used files are evicted when the cache grows over max_size.
+    SQLite locking makes the cache safe for several processes.
+
+    Arguments:
+        path (str): Cache directory, artifacts in cache directory by default
+        max_size (int): Maximum size of stored files in bytes
+        link_mode (str): 'auto', 'reflink' or 'copy'
+    """
+    TIMEOUT = 30
+
+    def __init__(self, path=None, max_size=10 * 1024 ** 3, link_mode='auto'):
+        if link_mode not in ('auto', 'reflink', 'copy'):
+            raise ValueError('Link mode has to be one of these values: auto, '
+                             'reflink, copy')
+        if path is None:
+            path = os.path.join(cache_dir(), 'artifacts')
+        self._path = path
+        self._max_size = max_size
+        self._link_mode = link_mode
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(path, 'index.sqlite'),
+                                   timeout=self.TIMEOUT,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def object_path(self, digest):
+        """Path of stored file
+
+        Arguments:
+            digest (str): SHA-256 of the content
+
+        Returns:
+            str: Path
+        """
+        return os.path.join(self._path, 'objects', digest[:2], digest[2:])
+
+    @staticmethod
+    def validators(aria2c):
+        """Fetch validators of download by HEAD request
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download with uri
+
+        Returns:
+            Validators: Validators, None when server can't be asked
+        """
+        request = urllib.request.Request(aria2c.uri, method='HEAD',
+                                         headers=request_headers(aria2c))
+        try:
+            with urllib.request.urlopen(
+                    request, timeout=ArtifactCache.TIMEOUT) as response:
+                headers = response.headers
+                length = headers.get('Content-Length')
+                return Validators(headers.get('ETag'),
+                                  headers.get('Last-Modified'),
+                                  int(length) if length else None)
+        except (OSError, ValueError):
+            return None
+
+    def lookup(self, url, validators):
+        """Find current cached copy
+
+        Arguments:
+            url (str): URL of the file
+            validators (Validators): Validators of the response
+
+        Returns:
+            str: Digest of cached file, None on miss
+        """
+        row = self._db.execute(
+            'SELECT digest, etag, last_modified, size FROM entries '
+            'WHERE url = ?', (url,)).fetchone()
+        if row is None or not validators.matches(*row[1:]):
+            return None
+        if not os.path.isfile(self.object_path(row[0])):
+            return None
+        return row[0]
+
+    def store(self, url, path, validators):
+        """Add downloaded file to the cache
+
+        Arguments:
+            url (str): URL of the file
+            path (str): Downloaded file
+            validators (Validators): Validators of the response
+
+        Returns:
+            str: Digest of the file
+        """
+        digest = _hash(path)
+        target = self.object_path(digest)
+        if not os.path.isfile(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            link(path, target, 'copy' if self._link_mode == 'copy'
+                 else 'auto')
+            os.chmod(target, 0o444)
+        size = os.path.getsize(target)
+        with self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                (url, digest, validators.etag, validators.last_modified,
+                 validators.size))
+            self._db.execute(
+                'INSERT OR REPLACE INTO objects VALUES (?, ?, ?)',
+                (digest, size, time.time()))
+        self.evict()
+        return digest
+
+    def evict(self):
+        """Remove least recently used files over max_size
+
+        Returns:
+            int: Number of removed files
+        """
+        removed = []
+        with self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            total = self._db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+            for digest, size in self._db.execute(
+                    'SELECT digest, size FROM objects '
+                    'ORDER BY accessed').fetchall():
+                if total <= self._max_size:
+                    break
+                self._db.execute('DELETE FROM objects WHERE digest = ?',
+                                 (digest,))
+                self._db.execute('DELETE FROM entries WHERE digest = ?',
+                                 (digest,))
+                removed.append(digest)
+                total -= size
+        for digest in removed:
+            try:
+                os.remove(self.object_path(digest))
+            except FileNotFoundError:
+                pass
+        return len(removed)
+
+    def restore(self, aria2c):
+        """Place current cached copy at path of download
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download with uri
+
+        Returns:
+            tuple: True on cache hit and validators for store() after
+                download, None when server didn't answer HEAD request
+        """
+        validators = self.validators(aria2c)
+        if validators is None:
+            return False, None
+        digest = self.lookup(aria2c.uri, validators)
+        if digest is None:
+            return False, validators
+        try:
+            link(self.object_path(digest), aria2c.path, self._link_mode)
+        except FileNotFoundError:
+            # Evicted by other process meanwhile
+            return False, validators
+        self._db.execute('UPDATE objects SET accessed = ? WHERE digest = ?',
+                         (time.time(), digest))
+        return True, validators
+
+    def fetch(self, aria2c, run=None):
+        """Place file of download at its path, from cache when current
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download with uri
+            run (callable): Runs the download on miss, Aria2c.run by default
+
+        Returns:
+            bool: True on cache hit, False when the file was downloaded
+        """
+        hit, validators = self.restore(aria2c)
+        if hit:
+            return True
+        returncode = (run or (lambda job: job.run()))(aria2c)
+        if (returncode == 0 and validators is not None and
+                os.path.isfile(aria2c.path)):
+            self.store(aria2c.uri, aria2c.path, validators)
+        return False
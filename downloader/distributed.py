@@ -0,0 +1,292 @@
+"""Download of one file split between several worker processes or hosts
+
+Run:
+
+    $ python -m downloader.distributed run --workers 4 URL
+    $ python -m downloader.distributed run --remote 'ssh node1' \\
+          --remote 'ssh node2' --dir /shared/downloads URL
+
+The coordinator splits the file into byte ranges with the same split and
+min_split_size rules as the built-in engine, preallocates the output file
+and hands the ranges to workers. Every worker is this module run as
+'worker' command, it downloads its range with the built-in engine and
+writes it with positional writes at the same offset into the output file.
+Remote workers are started through a command prefix such as 'ssh node1'
+and need the output file on storage shared with the coordinator. The
+remote shell parses the worker command again, so it is quoted for it.
+Credentials are written to stdin of workers, which ssh forwards, so they
+reach remote workers and never appear on a command line.
+"""
+
+import collections
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+
+import click
+
+from .aria2c import Aria2c
+from .engine import EngineError, HTTPEngine
+from .verify import file_digest, parse_checksum
+
+__all__ = ['Coordinator']
+
+# Credentials of worker started by hand, the coordinator uses stdin
+USER_VARIABLE = 'DOWNLOADER_HTTP_USER'
+PASSWD_VARIABLE = 'DOWNLOADER_HTTP_PASSWD'
+
+
+class Coordinator(object):
+    """Split download between workers and reassign failed ranges
+
+    Each worker runs one range at a time. A range whose worker fails is put
+    back to the queue and taken by another worker, the same worker gets it
+    again only when all others failed on it too. After MAX_TRIES attempts
+    the download fails. Ranges are written directly into
+    the output file, so nothing is merged at the end.
+
+    Arguments:
+        aria2c (aria2c.Aria2c): Download with uri and options, see
+            engine.HTTPEngine for the understood ones
+        workers (int|list): Number of local worker processes or command
+            prefix of every worker, e.g. [[], ['ssh', 'node1']], empty
+            prefix is local process, other prefixes run the worker command
+            by a shell like ssh does
+        python (str): Interpreter of remote workers
+    """
+    MAX_TRIES = 3
+
+    def __init__(self, aria2c, workers=4, python='python3'):
+        if type(workers) is int:
+            if workers < 1:
+                raise ValueError('Workers has to be equal or larger then 1')
+            workers = [[]] * workers
+        if not workers:
+            raise ValueError('At least one worker is required')
+        self._aria2c = aria2c
+        self._engine = HTTPEngine(aria2c)
+        self._workers = [list(prefix) for prefix in workers]
+        self._python = python
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._running = 0
+        self._errors = []
+
+    @property
+    def path(self):
+        """str: Path of the downloaded file"""
+        return self._engine.path
+
+    def command(self, prefix, first, last):
+        """Command line of worker downloading one range
+
+        Arguments:
+            prefix (list): Command prefix of the worker
+            first (int): First byte
+            last (int): Last byte, inclusive
+
+        Returns:
+            list: Command line arguments, the ones after non-empty prefix
+                quoted for shell
+        """
+        python = self._python if prefix else sys.executable
+        command = [python, '-m', 'downloader.distributed', 'worker',
+                   '--output', os.path.abspath(self.path),
+                   '--first', str(first), '--last', str(last)]
+        if self._aria2c.http_user is not None:
+            command.append('--credentials-stdin')
+        command.append(self._aria2c.uri)
+        if prefix:
+            # ssh joins the arguments and the remote shell splits them again
+            command = [shlex.quote(argument) for argument in command]
+        return prefix + command
+
+    def _credentials(self):
+        """bytes: Input of workers with credentials, None without them"""
+        if self._aria2c.http_user is None:
+            return None
+        return json.dumps({'user': self._aria2c.http_user,
+                           'passwd': self._aria2c.http_passwd or ''}
+                          ).encode('utf-8') + b'\n'
+
+    def _take(self, index):
+        """Next range for worker, None when everything is downloaded
+
+        Worker doesn't get range which failed on it while another worker may
+        still take it, it waits for a range instead.
+        """
+        others = set(range(len(self._workers))) - set([index])
+        with self._condition:
+            while True:
+                for item in self._queue:
+                    if index not in item[2]:
+                        break
+                else:
+                    item = None
+                    if self._queue and not any(
+                            others - set(queued[2])
+                            for queued in self._queue):
+                        item = self._queue[0]
+                if item is not None:
+                    self._queue.remove(item)
+                    self._running += 1
+                    return item
+                if not self._queue and not self._running:
+                    return None
+                self._condition.wait()
+
+    def _work(self, index, credentials):
+        prefix = self._workers[index]
+        stdin = {'input': credentials} if credentials is not None else {
+            'stdin': subprocess.DEVNULL}
+        while True:
+            item = self._take(index)
+            if item is None:
+                return
+            first, last, failed = item
+            process = subprocess.run(self.command(prefix, first, last),
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE, **stdin)
+            with self._condition:
+                self._running -= 1
+                if process.returncode != 0:
+                    failed.append(index)
+                    if len(failed) < self.MAX_TRIES:
+                        self._queue.append(item)
+                    else:
+                        self._errors.append('bytes {}-{}: {}'.format(
+                            first, last, process.stderr.decode(
+                                'utf-8', 'replace').strip()))
+                self._condition.notify_all()
+
+    def run(self):
+        """Download the file
+
+        Returns:
+            str: Path of the downloaded file
+
+        Raises:
+            EngineError: When server doesn't support ranges, a range failed
+                MAX_TRIES times or file doesn't match checksum
+        """
+        size, ranges = self._engine.probe()
+        if not ranges:
+            raise EngineError('Server does not support ranges: {}'
+                              .format(self._aria2c.uri))
+        path = self.path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, 0)
+            self._engine._allocate(fd, size)
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+
+        # Range with indexes of workers it failed on, once per attempt
+        self._queue.extend((first, last, [])
+                           for first, last, _ in self._engine.segments(size)
+                           if first <= last)
+        self._errors = []
+        credentials = self._credentials()
+        threads = [threading.Thread(target=self._work,
+                                    args=(index, credentials))
+                   for index in range(len(self._workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise EngineError('Download failed: {}'.format(self._errors[0]))
+
+        if self._aria2c.checksum is not None:
+            algorithm, digest = parse_checksum(self._aria2c.checksum)
+            if file_digest(path, algorithm) != digest:
+                raise EngineError('Checksum mismatch: {}'.format(path))
+        return path
+
+
+@click.group()
+def cli():
+    """Download of one file split between several workers"""
+
+
+@cli.command()
+@click.option('--output', required=True, type=click.Path(dir_okay=False),
+              help='Preallocated output file')
+@click.option('--first', required=True, type=click.INT)
+@click.option('--last', required=True, type=click.INT)
+@click.option('--credentials-stdin', is_flag=True,
+              help='Read {"user", "passwd"} JSON line from stdin')
+@click.argument('url')
+def worker(output, first, last, credentials_stdin, url):
+    """Download bytes FIRST to LAST of URL into OUTPUT at the same offset
+
+    Credentials are read from stdin or from DOWNLOADER_HTTP_USER and
+    DOWNLOADER_HTTP_PASSWD environment variables.
+    """
+    aria2c = Aria2c()
+    aria2c.uri = url
+    if credentials_stdin:
+        try:
+            credentials = json.loads(sys.stdin.readline())
+        except ValueError:
+            raise click.UsageError('Credentials on stdin are not valid JSON')
+        aria2c.http_user = credentials.get('user')
+        aria2c.http_passwd = credentials.get('passwd')
+    else:
+        aria2c.http_user = os.environ.get(USER_VARIABLE)
+        aria2c.http_passwd = os.environ.get(PASSWD_VARIABLE)
+    fd = os.open(output, os.O_WRONLY)
+    try:
+        HTTPEngine(aria2c).fetch(fd, first, last)
+    except EngineError as error:
+        raise click.ClickException(str(error))
+    finally:
+        os.close(fd)
+
+
+@cli.command()
+@click.option('--workers', default=4, type=click.INT,
+              help='Number of local workers')
+@click.option('--remote', multiple=True,
+              help='Command prefix of remote worker, e.g. "ssh node1", '
+                   'replaces local workers')
+@click.option('--python', default='python3',
+              help='Interpreter of remote workers')
+@click.option('--dir', 'directory', type=click.Path(file_okay=False),
+              help='Download directory')
+@click.option('--out', help='File name')
+@click.option('--split', default=16, type=click.INT)
+@click.option('--min-split-size', default='20M')
+@click.option('--checksum', help='Expected checksum, e.g. sha-256=...')
+@click.argument('url')
+def run(workers, remote, python, directory, out, split, min_split_size,
+        checksum, url):
+    """Download URL split between workers"""
+    aria2c = Aria2c()
+    try:
+        aria2c.uri = url
+        aria2c.split = split
+        aria2c.min_split_size = min_split_size
+        if directory is not None:
+            aria2c.dir = directory
+        if out is not None:
+            aria2c.out = out
+        if checksum is not None:
+            aria2c.checksum = checksum
+    except (TypeError, ValueError) as error:
+        raise click.BadParameter(str(error))
+    if remote:
+        workers = [shlex.split(prefix) for prefix in remote]
+    try:
+        click.echo(Coordinator(aria2c, workers, python).run())
+    except (EngineError, ValueError, OSError) as error:
+        raise click.ClickException(str(error))
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -0,0 +1,400 @@
+"""Segmented HTTP engine used when aria2c is not installed"""
+
+import base64
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from .verify import file_digest, parse_checksum
+
+__all__ = ['HTTPEngine', 'EngineError', 'follow_redirects',
+           'request_headers']
+
+MAX_REDIRECTS = 5
+REDIRECTS = (301, 302, 303, 307, 308)
+# Headers which must not follow redirect to another origin
+CREDENTIALS = ('authorization', 'cookie')
+
+
+def request_headers(aria2c):
+    """HTTP headers carrying credentials of download
+
+    Arguments:
+        aria2c (aria2c.Aria2c): Download
+
+    Returns:
+        dict: Headers
+    """
+    headers = {}
+    if aria2c.http_user is not None:
+        credentials = '{}:{}'.format(aria2c.http_user,
+                                     aria2c.http_passwd or '')
+        headers['Authorization'] = 'Basic {}'.format(
+            base64.b64encode(credentials.encode('utf-8')).decode('ascii'))
+    return headers
+
+
+def _origin(url):
+    parts = urllib.parse.urlsplit(url)
+    default = {'http': 80, 'https': 443}.get(parts.scheme)
+    return parts.scheme, parts.hostname, parts.port or default
+
+
+def _redirected(url, location, headers):
+    """Headers of request redirected from url to location, credentials are
+    dropped when scheme, host or port changes"""
+    if _origin(url) == _origin(location):
+        return headers
+    return dict((name, value) for name, value in headers.items()
+                if name.lower() not in CREDENTIALS)
+
+
+def follow_redirects(url, headers, send, limit=MAX_REDIRECTS):
+    """Send request, repeat it at Location of redirect responses
+
+    Authorization and Cookie are dropped once a redirect changes scheme,
+    host or port, like by curl, so credentials of one server never reach
+    another.
+
+    Arguments:
+        url (str): HTTP(S) URL
+        headers (dict): Request headers
+        send (callable): Sends request of URL and headers, returns
+            http.client.HTTPResponse, its body is read when it's redirect
+        limit (int): Redirects followed at most
+
+    Returns:
+        tuple: URL and response of the last request, not a redirect
+
+    Raises:
+        ValueError: When URL is not HTTP(S) or there are too many redirects
+    """
+    headers = dict(headers or {})
+    for _ in range(limit + 1):
+        scheme = urllib.parse.urlsplit(url).scheme
+        if scheme not in ('http', 'https'):
+            raise ValueError('Unsupported scheme: {}'.format(scheme))
+        response = send(url, headers)
+        location = response.getheader('Location')
+        if response.status not in REDIRECTS or not location:
+            return url, response
+        response.read()
+        location = urllib.parse.urljoin(url, location)
+        headers = _redirected(url, location, headers)
+        url = location
+    raise ValueError('Too many redirects')
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        request = super(_RedirectHandler, self).redirect_request(
+            req, fp, code, msg, headers, newurl)
+        if request is not None:
+            request.headers = _redirected(req.full_url, request.full_url,
+                                          request.headers)
+        return request
+
+
+_OPENER = urllib.request.build_opener(_RedirectHandler)
+
+
+class EngineError(Exception):
+    """Download by built-in engine failed"""
+
+
+class HTTPEngine(object):
+    """Download one HTTP(S) URI with parallel Range requests
+
+    Understands the same options as aria2c for this kind of download:
+    split, max_connection_per_server, min_split_size, continue_downloading,
+    file_allocation, max_tries, retry_wait, out, dir, http_user and
+    http_passwd. Segments are written with positional writes into one file,
+    progress is kept in a control file next to it so an interrupted download
+    can be resumed with continue_downloading.
+
+    Arguments:
+        aria2c (aria2c.Aria2c): Download with uri and options
+    """
+    CHUNK_SIZE = 65536
+    CONTROL_SUFFIX = '.aria2py'
+    TIMEOUT = 60
+    SAVE_INTERVAL = 1
+
+    def __init__(self, aria2c):
+        if aria2c.uri is None:
+            raise ValueError('Built-in engine downloads only URI')
+        scheme = urllib.parse.urlsplit(aria2c.uri).scheme
+        if scheme not in ('http', 'https'):
+            raise ValueError('Built-in engine supports only HTTP(S)')
+        self._uri = aria2c.uri
+        self._split = aria2c.split
+        self._connections = min(aria2c.split,
+                                aria2c.max_connection_per_server)
+        self._min_split_size = aria2c.min_split_size
+        self._continue = aria2c.continue_downloading
+        self._file_allocation = aria2c.file_allocation
+        self._checksum = aria2c.checksum
+        self._max_tries = aria2c.max_tries
+        self._retry_wait = aria2c.retry_wait
+        self._path = aria2c.path
+        self._headers = request_headers(aria2c)
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._retries = 0
+        self._first_byte = None
+        self._size = None
+        self._segments = None
+        self._saved = 0
+
+    @property
+    def path(self):
+        """str: Path of the downloaded file"""
+        return self._path
+
+    @property
+    def retries(self):
+        """int: Requests repeated after failure"""
+        return self._retries
+
+    @property
+    def first_byte(self):
+        """float: time.monotonic() when first data arrived, None before"""
+        return self._first_byte
+
+    @property
+    def completed(self):
+        """int: Bytes downloaded so far"""
+        return self._completed
+
+    def _open(self, method='GET', first=None, last=None):
+        headers = dict(self._headers)
+        if first is not None:
+            headers['Range'] = 'bytes={}-{}'.format(first, last)
+        request = urllib.request.Request(self._uri, headers=headers,
+                                         method=method)
+        return _OPENER.open(request, timeout=self.TIMEOUT)
+
+    def probe(self):
+        """Find out size of the file and range support of the server
+
+        Returns:
+            tuple: Size in bytes or None, True if ranges are supported
+        """
+        with self._open('HEAD') as response:
+            length = response.headers.get('Content-Length')
+            ranges = response.headers.get('Accept-Ranges', 'none')
+        size = int(length) if length is not None else None
+        return size, size is not None and ranges.lower() == 'bytes'
+
+    def segments(self, size):
+        """Split file into byte ranges
+
+        Like aria2c, a range is never split to pieces smaller than
+        min_split_size and there are at most split pieces.
+
+        Arguments:
+            size (int): File size in bytes
+
+        Returns:
+            list: [first, last, done] of every segment, last is inclusive
+        """
+        if size == 0:
+            return [[0, -1, 0]]
+        count = max(1, min(self._split, size // self._min_split_size))
+        step = -(-size // count)
+        return [[first, min(first + step, size) - 1, 0]
+                for first in range(0, size, step)]
+
+    def _allocate(self, fd, size):
+        if self._file_allocation == 'none' or size == 0:
+            return
+        if self._file_allocation == 'falloc' and hasattr(os,
+                                                         'posix_fallocate'):
+            os.posix_fallocate(fd, 0, size)
+        elif self._file_allocation == 'prealloc':
+            zeros = bytes(self.CHUNK_SIZE * 16)
+            for offset in range(0, size, len(zeros)):
+                os.pwrite(fd, zeros[:size - offset], offset)
+        else:
+            os.ftruncate(fd, size)
+
+    def _load_control(self, size):
+        path = self.path
+        try:
+            with open(path + self.CONTROL_SUFFIX) as control:
+                state = json.load(control)
+        except (OSError, ValueError):
+            state = None
+        if state is not None:
+            if state.get('uri') == self._uri and state.get('size') == size:
+                return state['segments']
+            return None
+        if os.path.isfile(path) and os.path.getsize(path) <= size:
+            # File downloaded sequentially by another program
+            done = os.path.getsize(path)
+            segments = self.segments(size)
+            for segment in segments:
+                segment[2] = max(0, min(done - segment[0],
+                                        segment[1] - segment[0] + 1))
+            return segments
+        return None
+
+    def _save_control(self):
+        """Write progress to control file, caller holds the lock"""
+        path = self.path + self.CONTROL_SUFFIX
+        with open(path + '.tmp', 'w') as control:
+            json.dump({'uri': self._uri, 'size': self._size,
+                       'segments': self._segments}, control)
+        os.replace(path + '.tmp', path)
+        self._saved = time.monotonic()
+
+    def _fetch(self, fd, segment):
+        first, last, _ = segment
+        tries = 0
+        while first + segment[2] <= last:
+            try:
+                with self._open(first=first + segment[2],
+                                last=last) as response:
+                    if response.status != 206:
+                        raise EngineError('Server ignored range request')
+                    while True:
+                        data = response.read(self.CHUNK_SIZE)
+                        if not data:
+                            break
+                        os.pwrite(fd, data, first + segment[2])
+                        with self._lock:
+                            if self._first_byte is None:
+                                self._first_byte = time.monotonic()
+                            segment[2] += len(data)
+                            self._completed += len(data)
+                            if (self._segments is not None and
+                                    time.monotonic() - self._saved >
+                                    self.SAVE_INTERVAL):
+                                self._save_control()
+            except (OSError, EngineError) as error:
+                tries += 1
+                if self._fatal(error) or self._exhausted(tries):
+                    raise
+            else:
+                if first + segment[2] <= last:
+                    tries += 1
+                    if self._exhausted(tries):
+                        raise EngineError('Connection closed early')
+
+    @staticmethod
+    def _fatal(error):
+        """Whether repeating the request can't help, even with max_tries 0
+
+        Client errors other than timeout and rate limit stay the same, and a
+        server which ignored the range request ignores it again.
+        """
+        if isinstance(error, urllib.error.HTTPError):
+            return 400 <= error.code < 500 and error.code not in (408, 429)
+        return isinstance(error, EngineError)
+
+    def _exhausted(self, tries):
+        """Whether segment failed max_tries times, waits before retry"""
+        if self._max_tries and tries >= self._max_tries:
+            return True
+        with self._lock:
+            self._retries += 1
+        if self._retry_wait:
+            time.sleep(self._retry_wait)
+        return False
+
+    def fetch(self, fd, first, last):
+        """Download one byte range into file at the same offset
+
+        Used by workers of distributed.Coordinator, no control file is
+        written.
+
+        Arguments:
+            fd (int): File descriptor open for writing
+            first (int): First byte
+            last (int): Last byte, inclusive
+
+        Returns:
+            int: Bytes written
+
+        Raises:
+            EngineError: When the range can't be downloaded
+        """
+        segment = [first, last, 0]
+        try:
+            self._fetch(fd, segment)
+        except OSError as error:
+            raise EngineError('Download failed: {}'.format(error))
+        return segment[2]
+
+    def _fetch_whole(self, path):
+        with self._open() as response, open(path, 'wb') as output:
+            while True:
+                data = response.read(self.CHUNK_SIZE)
+                if not data:
+                    break
+                if self._first_byte is None:
+                    self._first_byte = time.monotonic()
+                output.write(data)
+                self._completed += len(data)
+
+    def run(self):
+        """Download the file
+
+        Returns:
+            str: Path of the downloaded file
+
+        Raises:
+            EngineError: When a segment can't be downloaded, progress is kept
+                for continue_downloading, or when file doesn't match checksum
+        """
+        path = self.path
+        size, ranges = self.probe()
+        if not ranges:
+            self._fetch_whole(path)
+            return self._verified(path)
+
+        segments = self._load_control(size) if self._continue else None
+        resume = segments is not None
+        if not resume:
+            segments = self.segments(size)
+        self._size = size
+        self._segments = segments
+        self._completed = sum(segment[2] for segment in segments)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not resume:
+                os.ftruncate(fd, 0)
+                self._allocate(fd, size)
+            with self._lock:
+                self._save_control()
+            pending = [segment for segment in segments
+                       if segment[0] + segment[2] <= segment[1]]
+            with ThreadPoolExecutor(self._connections) as executor:
+                futures = [executor.submit(self._fetch, fd, segment)
+                           for segment in pending]
+                errors = [future.exception() for future in futures]
+            errors = [error for error in errors if error is not None]
+            if errors:
+                with self._lock:
+                    self._save_control()
+                raise EngineError('Download failed: {}'.format(errors[0]))
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+        os.remove(path + self.CONTROL_SUFFIX)
+        return self._verified(path)
+
+    def _verified(self, path):
+        """Check downloaded file against checksum option"""
+        if self._checksum is not None:
+            algorithm, digest = parse_checksum(self._checksum)
+            if file_digest(path, algorithm) != digest:
+                raise EngineError('Checksum mismatch: {}'.format(path))
+        return path
@@ -0,0 +1,390 @@
+"""Download bandwidth governor of aria2c daemon
+
+Run:
+
+    $ python -m downloader.governor run --policy bandwidth.json
+
+Policy is a JSON file, sizes are bytes/sec with optional K or M suffix:
+
+    {
+        "default": "0",
+        "windows": [
+            {"start": "08:00", "end": "18:00", "days": [0, 1, 2, 3, 4],
+             "limit": "2M"}
+        ],
+        "shares": {"mirror.example.com": 0.25},
+        "capacity": "10M",
+        "headroom": "1M",
+        "minimum": "256K",
+        "interface": "eth0"
+    }
+
+The first window containing the current time gives the overall limit,
+default applies outside of all windows, 0 is unrestricted. Days are
+weekdays, 0 is Monday, all days when missing. Window may end past midnight.
+A host with share gets at most that part of the overall limit, split evenly
+between its active downloads. With capacity of the link, traffic of other
+programs seen on interface is subtracted from it, so downloads back off
+while the link is busy, but never under minimum.
+"""
+
+import datetime
+import json
+import sys
+import threading
+import time
+import urllib.parse
+
+import click
+
+from .options import parse_size
+from .rpc import RPCError
+
+__all__ = ['Window', 'Policy', 'InterfaceMonitor', 'Governor']
+
+
+def _minutes(value):
+    """Minutes since midnight of 'HH:MM', '24:00' is the end of day"""
+    try:
+        hours, minutes = (int(part) for part in value.split(':'))
+    except (AttributeError, ValueError):
+        raise ValueError('Time has to be in HH:MM format')
+    if not (0 <= hours < 24 and 0 <= minutes < 60 or
+            hours == 24 and minutes == 0):
+        raise ValueError('Time has to be in HH:MM format')
+    return hours * 60 + minutes
+
+
+def _host(status):
+    """Host of download returned by aria2.tellActive"""
+    for item in status.get('files', ()):
+        for uri in item.get('uris', ()):
+            return urllib.parse.urlsplit(uri['uri']).hostname or ''
+    return ''
+
+
+class Window(object):
+    """Time of day window with its overall download limit
+
+    Arguments:
+        start (str): Start 'HH:MM', inclusive
+        end (str): End 'HH:MM', exclusive, before start for windows over
+            midnight
+        limit (int|str): Overall limit in bytes/sec, 0 is unrestricted
+        days (list): Weekdays the window starts on, 0 is Monday, every day
+            when None
+    """
+    __slots__ = ('start', 'end', 'limit', 'days')
+
+    def __init__(self, start, end, limit, days=None):
+        self.start = _minutes(start)
+        self.end = _minutes(end)
+        self.limit = parse_size(limit, 'Limit')
+        self.days = None if days is None else frozenset(days)
+        if self.days is not None and not self.days <= frozenset(range(7)):
+            raise ValueError('Days have to be between 0 and 6')
+
+    def contains(self, moment):
+        """Whether the window is open
+
+        Arguments:
+            moment (datetime.datetime): Local time
+
+        Returns:
+            bool: True if moment is inside the window
+        """
+        minute = moment.hour * 60 + moment.minute
+        day = moment.weekday()
+        if self.start <= self.end:
+            inside = self.start <= minute < self.end
+        elif minute >= self.start:
+            inside = True
+        else:
+            # Morning part belongs to the window started the day before
+            inside = minute < self.end
+            day = (day - 1) % 7
+        return inside and (self.days is None or day in self.days)
+
+
+class Policy(object):
+    """Rules giving overall and per download limits
+
+    Arguments:
+        default (int|str): Overall limit outside of windows
+        windows (list): Window instances, the first open one applies
+        shares (dict): Part of overall limit, 0 to 1, by host name
+        capacity (int|str): Bandwidth of the link, 0 disables back-off
+        headroom (int|str): Bandwidth left free above traffic of others
+        minimum (int|str): Overall limit never goes under it by back-off
+        interface (str): Network interface watched for traffic of others,
+            all but loopback when None
+    """
+    def __init__(self, default=0, windows=(), shares=None, capacity=0,
+                 headroom=0, minimum=0, interface=None):
+        self.default = parse_size(default, 'Default')
+        self.windows = list(windows)
+        self.shares = dict(shares or {})
+        for host, share in self.shares.items():
+            if not 0 < share <= 1:
+                raise ValueError('Share of {} has to be between 0 and 1'
+                                 .format(host))
+        self.capacity = parse_size(capacity, 'Capacity')
+        self.headroom = parse_size(headroom, 'Headroom')
+        self.minimum = parse_size(minimum, 'Minimum')
+        self.interface = interface
+
+    @classmethod
+    def load(cls, path):
+        """Read policy from JSON file
+
+        Arguments:
+            path (str): Policy file, see module documentation
+
+        Returns:
+            Policy: Loaded policy
+        """
+        with open(path) as stream:
+            data = json.load(stream)
+        windows = [Window(**window) for window in data.pop('windows', ())]
+        return cls(windows=windows, **data)
+
+    def overall(self, moment=None, other=0):
+        """Overall download limit
+
+        Arguments:
+            moment (datetime.datetime): Local time, now by default
+            other (int): Bytes/sec used by other programs on the link
+
+        Returns:
+            int: Limit in bytes/sec, 0 is unrestricted
+        """
+        moment = moment or datetime.datetime.now()
+        limit = self.default
+        for window in self.windows:
+            if window.contains(moment):
+                limit = window.limit
+                break
+        if self.capacity:
+            available = max(self.capacity - other - self.headroom,
+                            self.minimum)
+            limit = min(limit, available) if limit else available
+        return limit
+
+    def job_limits(self, overall, hosts):
+        """Limits of single downloads
+
+        Arguments:
+            overall (int): Overall limit in bytes/sec
+            hosts (dict): Host name by GID of active download
+
+        Returns:
+            dict: Limit in bytes/sec by GID, 0 is unrestricted
+        """
+        counts = {}
+        for host in hosts.values():
+            counts[host] = counts.get(host, 0) + 1
+        limits = {}
+        for gid, host in hosts.items():
+            share = self.shares.get(host)
+            if not overall or share is None:
+                limits[gid] = 0
+            else:
+                limits[gid] = max(1, int(overall * share) // counts[host])
+        return limits
+
+    def apply(self, aria2c, moment=None):
+        """Set overall limit of download run by its own aria2c process
+
+        The limit is fixed for the whole run, use Governor for daemon.
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download
+            moment (datetime.datetime): Local time, now by default
+        """
+        aria2c.max_overall_download_limit = self.overall(moment)
+
+
+class InterfaceMonitor(object):
+    """Receive rate of network interface from /proc/net/dev
+
+    Arguments:
+        interface (str): Interface name, all but loopback when None
+    """
+    def __init__(self, interface=None):
+        self._interface = interface
+        self._previous = None
+
+    def received(self):
+        """int: Bytes received by the interface since boot"""
+        total = 0
+        with open('/proc/net/dev') as stream:
+            for line in stream:
+                name, found, counters = line.partition(':')
+                name = name.strip()
+                if not found or name == 'lo' or (
+                        self._interface is not None and
+                        name != self._interface):
+                    continue
+                total += int(counters.split()[0])
+        return total
+
+    def rate(self):
+        """Receive rate since the previous call
+
+        Returns:
+            int: Bytes/sec, None on the first call or when counters are not
+                available
+        """
+        try:
+            sample = (time.monotonic(), self.received())
+        except (OSError, ValueError, IndexError):
+            return None
+        previous, self._previous = self._previous, sample
+        if previous is None or sample[0] <= previous[0]:
+            return None
+        return max(0, int((sample[1] - previous[1]) /
+                          (sample[0] - previous[0])))
+
+
+class Governor(object):
+    """Applies policy to aria2c daemon while it runs
+
+    Overall limit is changed by aria2.changeGlobalOption and per download
+    limits by aria2.changeOption, both only when the value differs from the
+    one set last time. aria2c applies max-download-limit to active downloads
+    without restarting them, download which finished meanwhile is skipped.
+
+    Arguments:
+        rpc (rpc.Aria2RPC): Client connected to the daemon
+        policy (Policy): Applied policy
+        interval (float): Seconds between steps of run()
+        monitor (InterfaceMonitor): Source of link traffic, created from
+            policy when its capacity is set
+    """
+    def __init__(self, rpc, policy, interval=5, monitor=None):
+        self._rpc = rpc
+        self._policy = policy
+        self._interval = interval
+        if monitor is None and policy.capacity:
+            monitor = InterfaceMonitor(policy.interface)
+        self._monitor = monitor
+        self._overall = None
+        self._jobs = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def overall(self):
+        """int: Overall limit set last time, None before the first step"""
+        return self._overall
+
+    def step(self, moment=None):
+        """Compute limits and apply the changed ones
+
+        Arguments:
+            moment (datetime.datetime): Local time, now by default
+
+        Returns:
+            int: Overall limit in bytes/sec
+        """
+        other = 0
+        if self._monitor is not None:
+            received = self._monitor.rate()
+            if received is not None:
+                speed = int(self._rpc.get_global_stat()['downloadSpeed'])
+                other = max(0, received - speed)
+        overall = self._policy.overall(moment, other)
+        if overall != self._overall:
+            self._rpc.change_global_option(
+                {'max-overall-download-limit': str(overall)})
+            self._overall = overall
+
+        jobs = {}
+        if self._policy.shares:
+            active = self._rpc.tell_active(['gid', 'files'])
+            hosts = dict((status['gid'], _host(status)) for status in active)
+            jobs = self._policy.job_limits(overall, hosts)
+            for gid, limit in list(jobs.items()):
+                if self._jobs.get(gid, 0) == limit:
+                    continue
+                try:
+                    self._rpc.change_option(
+                        gid, {'max-download-limit': str(limit)})
+                except RPCError:
+                    # Download finished since tellActive
+                    del jobs[gid]
+        self._jobs = jobs
+        return overall
+
+    def run(self):
+        """Step every interval until stop() is called
+
+        Daemon which doesn't answer is tried again in the next step.
+        """
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except (OSError, RPCError, ValueError, KeyError):
+                self._rpc.close()
+            self._stop.wait(self._interval)
+
+    def start(self):
+        """Run governor in background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+@click.group()
+def cli():
+    """Bandwidth governor of aria2c daemon"""
+
+
+@cli.command()
+@click.option('--policy', 'policy_path', required=True,
+              type=click.Path(exists=True, dir_okay=False))
+@click.option('--rpc-port', default=6800, type=click.INT,
+              help='RPC port of aria2c daemon')
+@click.option('--rpc-secret', default=None, type=click.STRING,
+              envvar='DOWNLOADER_RPC_SECRET', help='RPC secret token')
+@click.option('--interval', default=5.0, type=click.FLOAT,
+              help='Seconds between adjustments')
+def run(policy_path, rpc_port, rpc_secret, interval):
+    """Keep download limits of aria2c daemon in line with POLICY"""
+    from .aria2c import Aria2cDaemon
+    try:
+        policy = Policy.load(policy_path)
+    except (TypeError, ValueError) as error:
+        raise click.BadParameter(str(error), param_hint='--policy')
+    rpc = Aria2cDaemon(port=rpc_port, secret=rpc_secret).rpc
+    governor = Governor(rpc, policy, interval)
+    while True:
+        previous = governor.overall
+        try:
+            overall = governor.step()
+        except (OSError, RPCError, ValueError, KeyError) as error:
+            click.echo('aria2c daemon did not answer: {}'.format(error),
+                       err=True)
+            rpc.close()
+        else:
+            if overall != previous:
+                click.echo('Overall download limit {} bytes/sec'
+                           .format(overall))
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
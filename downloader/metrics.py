@@ -0,0 +1,397 @@
+"""Prometheus metrics of downloads
+
+Metrics are rendered in Prometheus text exposition format, either served on
+a local HTTP /metrics endpoint or written to a file for the textfile
+collector of node_exporter. Recording a value costs one dict update under
+a lock, so metrics can stay on for thousands of jobs.
+"""
+
+import bisect
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .engine import HTTPEngine
+from .progress import CompleteEvent, ProgressEvent
+from .rpc import RPCError
+
+__all__ = ['Counter', 'Gauge', 'Histogram', 'Metrics', 'MetricsServer']
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800,
+                    3600)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    if type(value) is float and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class _Metric(object):
+    """Metric with values by label values
+
+    Arguments:
+        name (str): Metric name
+        documentation (str): HELP text
+        labels (tuple): Label names
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _series(self, labels, extra=()):
+        pairs = list(zip(self.labels, labels)) + list(extra)
+        if not pairs:
+            return ''
+        return '{{{}}}'.format(','.join('{}="{}"'.format(name, _escape(value))
+                                        for name, value in pairs))
+
+    def samples(self):
+        """Yield (suffix, series, value) of every sample"""
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield '', self._series(labels), value
+
+    def render(self):
+        """Render metric in text exposition format
+
+        Returns:
+            str: HELP, TYPE and sample lines
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.documentation),
+                 '# TYPE {} {}'.format(self.name, self.kind)]
+        lines.extend('{}{}{} {}'.format(self.name, suffix, series,
+                                        _format(value))
+                     for suffix, series, value in self.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    """Value which only grows"""
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        """Add amount
+
+        Arguments:
+            amount (int|float): Non negative amount
+            labels (tuple): Label values in order of label names
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value which goes up and down"""
+    kind = 'gauge'
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets
+
+    Arguments:
+        buckets (tuple): Sorted upper bounds of buckets, +Inf is added
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DURATION_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, labels=()):
+        """Record one value
+
+        Arguments:
+            value (float): Observed value
+            labels (tuple): Label values in order of label names
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets),
+                                                0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, (list(state[0]), state[1], state[2]))
+                           for labels, state in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                series = self._series(labels, [('le', _format(bound))])
+                yield '_bucket', series, cumulative
+            yield '_sum', self._series(labels), total
+            yield '_count', self._series(labels), count
+
+
+class Metrics(object):
+    """Metrics of downloads run by this process or by aria2c daemon
+
+    Jobs run by run() are measured one by one: state, duration, time to
+    first byte, bytes per host and exit code. Time to first byte of aria2c
+    processes is as precise as the progress readout of aria2c, see
+    summary_interval option, retries are known only from the built-in
+    engine. collect() copies aria2.getGlobalStat of a daemon into gauges.
+    Queued and active jobs count only jobs run by this process.
+
+    Arguments:
+        namespace (str): Prefix of metric names
+    """
+    def __init__(self, namespace='downloader'):
+        def name(suffix):
+            return '{}_{}'.format(namespace, suffix)
+
+        self.jobs = Gauge(name('jobs'), 'Jobs queued or running now',
+                          ('state',))
+        self.finished = Counter(name('jobs_finished_total'),
+                                'Jobs finished by result', ('result',))
+        self.bytes = Counter(name('bytes_total'), 'Downloaded bytes by host',
+                             ('host',))
+        self.first_byte = Histogram(
+            name('time_to_first_byte_seconds'),
+            'Seconds from start of job to its first downloaded byte',
+            buckets=LATENCY_BUCKETS)
+        self.duration = Histogram(name('job_duration_seconds'),
+                                  'Seconds from start to end of job')
+        self.retries = Counter(name('retries_total'),
+                               'Requests repeated after failure')
+        self.exit_codes = Counter(name('aria2c_exit_codes_total'),
+                                  'Finished aria2c processes by exit code',
+                                  ('code',))
+        self.daemon = Gauge(name('daemon'),
+                            'aria2.getGlobalStat of the aria2c daemon',
+                            ('stat',))
+        self.metrics = [self.jobs, self.finished, self.bytes,
+                        self.first_byte, self.duration, self.retries,
+                        self.exit_codes, self.daemon]
+        self._collectors = []
+
+    def render(self):
+        """All metrics in text exposition format
+
+        Collectors added by watch_scheduler() and watch_daemon() run first.
+
+        Returns:
+            str: Metrics
+        """
+        for collector in self._collectors:
+            collector()
+        return ''.join(metric.render() for metric in self.metrics)
+
+    def write(self, path):
+        """Write metrics for textfile collector
+
+        File is replaced atomically so the collector never reads partial
+        content.
+
+        Arguments:
+            path (str): File ending with .prom
+        """
+        fd, temporary = tempfile.mkstemp(
+            prefix='.downloader-', dir=os.path.dirname(path) or '.')
+        with os.fdopen(fd, 'w') as stream:
+            stream.write(self.render())
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+
+    def finish(self, host, size, duration, failed=False, first_byte=None):
+        """Record finished job
+
+        Arguments:
+            host (str): Host of the download
+            size (int): Downloaded bytes
+            duration (float): Seconds from start to end
+            failed (bool): True if the job failed
+            first_byte (float): Seconds to the first byte, None when not
+                known
+        """
+        self.finished.inc(1, ('failed' if failed else 'done',))
+        if size:
+            self.bytes.inc(size, (host,))
+        self.duration.observe(duration)
+        if first_byte is not None:
+            self.first_byte.observe(first_byte)
+
+    def _run_engine(self, aria2c, host, start):
+        engine = HTTPEngine(aria2c)
+        failed = True
+        try:
+            engine.run()
+            failed = False
+        finally:
+            self.retries.inc(engine.retries)
+            self.finish(host, engine.completed, time.monotonic() - start,
+                        failed, engine.first_byte and
+                        engine.first_byte - start)
+        return 0
+
+    def _run_aria2c(self, aria2c, host, start):
+        first_byte = None
+        size = 0
+        stream = aria2c.stream()
+        while True:
+            try:
+                event = next(stream)
+            except StopIteration as stop:
+                returncode = stop.value
+                break
+            if (first_byte is None and type(event) is ProgressEvent and
+                    event.completed):
+                first_byte = time.monotonic() - start
+            elif type(event) is CompleteEvent and event.path:
+                try:
+                    size += os.path.getsize(event.path)
+                except OSError:
+                    pass
+        self.exit_codes.inc(1, (str(returncode),))
+        self.finish(host, size, time.monotonic() - start, returncode != 0,
+                    first_byte)
+        return returncode
+
+    def run(self, aria2c):
+        """Run download and record its metrics
+
+        Use as runner of scheduler.HostScheduler to measure its jobs.
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download
+
+        Returns:
+            int: Exit code of aria2c, 0 when built-in engine succeeded
+        """
+        host = urllib.parse.urlsplit(aria2c.uri or '').hostname or ''
+        self.jobs.inc(1, ('active',))
+        start = time.monotonic()
+        try:
+            if shutil.which(aria2c.COMMAND) is None:
+                return self._run_engine(aria2c, host, start)
+            return self._run_aria2c(aria2c, host, start)
+        finally:
+            self.jobs.dec(1, ('active',))
+
+    def watch_scheduler(self, scheduler):
+        """Report queued jobs of scheduler.HostScheduler on every render
+
+        Arguments:
+            scheduler (scheduler.HostScheduler): Scheduler using run() as
+                its runner
+        """
+        def collect():
+            self.jobs.set(sum(scheduler.queue_depth().values()),
+                          ('queued',))
+        self._collectors.append(collect)
+
+    def watch_daemon(self, rpc):
+        """Report aria2.getGlobalStat of aria2c daemon on every render
+
+        Arguments:
+            rpc (rpc.Aria2RPC): Client connected to the daemon
+        """
+        self._collectors.append(lambda: self.collect(rpc))
+
+    def collect(self, rpc):
+        """Copy global statistics of aria2c daemon into daemon gauge
+
+        Arguments:
+            rpc (rpc.Aria2RPC): Client connected to the daemon
+
+        Returns:
+            bool: False when daemon didn't answer
+        """
+        try:
+            stat = rpc.get_global_stat()
+        except (OSError, RPCError, ValueError):
+            return False
+        for name, value in stat.items():
+            self.daemon.set(int(value), (name,))
+        return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    metrics = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404, 'Not found')
+            return
+        body = self.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(object):
+    """HTTP /metrics endpoint served by background thread
+
+    Arguments:
+        metrics (Metrics): Served metrics
+        host (str): Listen address
+        port (int): Listen port, 0 picks free one
+    """
+    def __init__(self, metrics, host='127.0.0.1', port=9464):
+        handler = type('Handler', (_Handler,), {'metrics': metrics})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        """int: Port the endpoint listens on"""
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
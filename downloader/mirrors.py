@@ -0,0 +1,253 @@
+"""Ranking of mirrors by latency and throughput probes
+
+Every mirror is probed by one small Range request which measures connect
+time, time to first byte and throughput. Results are kept per host in a
+JSON file in the cache directory, so a batch of files from the same mirrors
+and the following runs don't probe them again until the results expire.
+"""
+
+import http.client
+import json
+import os
+import tempfile
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from .engine import follow_redirects, request_headers
+from .settings import cache_dir
+
+__all__ = ['Probe', 'MirrorRanker', 'probe']
+
+PROBE_SIZE = 256 * 1024
+TIMEOUT = 5
+
+
+def _host(uri):
+    parts = urllib.parse.urlsplit(uri)
+    return '{}://{}'.format(parts.scheme, parts.netloc.rpartition('@')[2])
+
+
+class Probe(object):
+    """Result of probing one mirror
+
+    Attributes:
+        connect (float): Seconds to open connection, TLS included
+        first_byte (float): Seconds from request to response headers
+        throughput (float): Bytes per second of the response body
+        error (str): Why the probe failed, None on success
+    """
+    __slots__ = ('connect', 'first_byte', 'throughput', 'error')
+
+    def __init__(self, connect=None, first_byte=None, throughput=None,
+                 error=None):
+        self.connect = connect
+        self.first_byte = first_byte
+        self.throughput = throughput
+        self.error = error
+
+    @property
+    def failed(self):
+        """bool: True if the mirror didn't answer"""
+        return self.error is not None or not self.throughput
+
+    def seconds(self, size):
+        """Estimated time to download size bytes from the mirror
+
+        Arguments:
+            size (int): Bytes
+
+        Returns:
+            float: Seconds, infinity for failed probe
+        """
+        if self.failed:
+            return float('inf')
+        return self.connect + self.first_byte + size / self.throughput
+
+    def dump(self):
+        """list: Values in order of arguments, stored in JSON"""
+        return [self.connect, self.first_byte, self.throughput, self.error]
+
+
+def probe(uri, size=PROBE_SIZE, timeout=TIMEOUT, headers=None):
+    """Download the first bytes of uri and measure how fast it went
+
+    Redirects are followed, the measured values are those of the last
+    server. Credentials in headers are not sent to other origins.
+
+    Arguments:
+        uri (str): HTTP(S) URI
+        size (int): Bytes requested by Range header
+        timeout (float): Socket timeout in seconds
+        headers (dict): Request headers e.g. credentials
+
+    Returns:
+        Probe: Measured values, error is set when the request failed
+    """
+    headers = dict(headers or {}, Range='bytes=0-{}'.format(size - 1))
+    connections = []
+    times = {}
+
+    def send(url, headers):
+        parts = urllib.parse.urlsplit(url)
+        factory = (http.client.HTTPSConnection if parts.scheme == 'https'
+                   else http.client.HTTPConnection)
+        connection = factory(parts.hostname, parts.port, timeout=timeout)
+        connections.append(connection)
+        target = parts.path or '/'
+        if parts.query:
+            target = '{}?{}'.format(target, parts.query)
+        times['start'] = time.monotonic()
+        connection.connect()
+        times['connected'] = time.monotonic()
+        connection.request('GET', target, headers=headers)
+        response = connection.getresponse()
+        times['answered'] = time.monotonic()
+        return response
+
+    try:
+        _, response = follow_redirects(uri, headers, send)
+        if response.status >= 400:
+            return Probe(error='HTTP {} {}'.format(response.status,
+                                                   response.reason))
+        received = 0
+        while received < size:
+            data = response.read(min(65536, size - received))
+            if not data:
+                break
+            received += len(data)
+        finished = time.monotonic()
+    except (OSError, ValueError, http.client.HTTPException) as error:
+        return Probe(error=str(error) or type(error).__name__)
+    finally:
+        for connection in connections:
+            connection.close()
+    return Probe(times['connected'] - times['start'],
+                 times['answered'] - times['connected'],
+                 received / max(finished - times['answered'], 1e-6))
+
+
+class MirrorRanker(object):
+    """Orders mirrors of a file from the fastest and remembers the results
+
+    Mirrors are compared by estimated time to download size bytes, so
+    latency decides for small files and throughput for large ones. Results
+    are stored per host and scheme for ttl seconds, failed mirrors included.
+
+    Arguments:
+        path (str): JSON file with probe results, None for
+            cache_dir()/mirrors.json
+        ttl (float): Seconds probe result of host stays valid
+        top (int): Number of mirrors select() returns
+        size (int): Expected file size used to compare mirrors
+        probe_size (int): Bytes downloaded by one probe
+        timeout (float): Socket timeout of probes in seconds
+        workers (int): Mirrors probed at once
+    """
+    def __init__(self, path=None, ttl=600, top=3, size=16 * 1024 * 1024,
+                 probe_size=PROBE_SIZE, timeout=TIMEOUT, workers=8):
+        if type(top) is not int:
+            raise TypeError('Top has to be integer')
+        if top < 1:
+            raise ValueError('Top has to be equal or larger then 1')
+        self._path = path or os.path.join(cache_dir(), 'mirrors.json')
+        self._ttl = ttl
+        self._top = top
+        self._size = size
+        self._probe_size = probe_size
+        self._timeout = timeout
+        self._workers = workers
+        self._results = None
+
+    def _load(self):
+        if self._results is not None:
+            return self._results
+        try:
+            with open(self._path) as stream:
+                self._results = json.load(stream)
+        except (OSError, ValueError):
+            self._results = {}
+        return self._results
+
+    def _save(self):
+        fd, temporary = tempfile.mkstemp(
+            prefix='.mirrors-', dir=os.path.dirname(self._path) or '.')
+        with os.fdopen(fd, 'w') as stream:
+            json.dump(self._results, stream)
+        os.replace(temporary, self._path)
+
+    def probes(self, uris, headers=None):
+        """Probe results of mirrors, hosts without valid result are probed
+
+        Arguments:
+            uris (list): URIs of mirrors
+            headers (dict): Request headers of probes by URI, so credentials
+                of one host are never sent to another
+
+        Returns:
+            dict: Probe by URI
+        """
+        results = self._load()
+        now = time.time()
+        expired = dict((_host(uri), uri) for uri in uris
+                       if now - results.get(_host(uri), [0])[0] > self._ttl)
+        if expired:
+            with ThreadPoolExecutor(min(self._workers,
+                                        len(expired))) as executor:
+                probes = list(executor.map(
+                    lambda uri: probe(uri, self._probe_size, self._timeout,
+                                      (headers or {}).get(uri)),
+                    expired.values()))
+            for host, result in zip(expired, probes):
+                results[host] = [now] + result.dump()
+            try:
+                self._save()
+            except OSError:
+                pass
+        return dict((uri, Probe(*results[_host(uri)][1:])) for uri in uris)
+
+    def rank(self, uris, headers=None):
+        """Order mirrors from the fastest, failed ones last
+
+        Arguments:
+            uris (list): URIs of mirrors of one file
+            headers (dict): Request headers of probes by URI
+
+        Returns:
+            list: URIs, mirrors which performed the same keep their order
+        """
+        probes = self.probes(uris, headers)
+        return sorted(uris, key=lambda uri: probes[uri].seconds(self._size))
+
+    def select(self, uris, headers=None):
+        """The fastest mirrors which answered
+
+        Arguments:
+            uris (list): URIs of mirrors of one file
+            headers (dict): Request headers of probes by URI
+
+        Returns:
+            list: At most top URIs, all failed ones when none answered
+        """
+        probes = self.probes(uris, headers)
+        ranked = self.rank(uris, headers)
+        working = [uri for uri in ranked if not probes[uri].failed]
+        return (working or ranked)[:self._top]
+
+    def apply(self, aria2c):
+        """Replace mirrors of download with the fastest ones
+
+        Credentials of the download are sent only with probes of mirrors on
+        the host of its first URI. uri_selector option is set to 'adaptive',
+        so aria2c keeps measuring the mirrors.
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download with uris
+        """
+        if len(aria2c.uris) < 2:
+            return
+        credentials = request_headers(aria2c)
+        host = _host(aria2c.uri)
+        aria2c.uris = self.select(aria2c.uris, dict(
+            (uri, credentials) for uri in aria2c.uris if _host(uri) == host))
+        aria2c.uri_selector = 'adaptive'
@@ -0,0 +1,863 @@
+"""Declarative table of aria2c options
+
+Every option is a descriptor which validates the value, knows its default,
+and serializes it for the aria2c command line and JSON-RPC interface.
+Instances holding the options store only values which were set explicitly
+(overrides) in their `_overrides` dict, everything else falls back to
+settings in use and then to the default of the option.
+"""
+
+import os
+
+__all__ = ['Option', 'BoolOption', 'IntOption', 'SizeOption', 'ChoiceOption',
+           'PathOption', 'PortsOption', 'ChecksumOption', 'GIDOption',
+           'OPTIONS',
+           'BY_ATTR', 'parse_size']
+
+JOB = 'job'
+GLOBAL = 'global'
+INPUT = 'input'
+
+
+def parse_size(value, label='Size'):
+    """Parse size with optional K or M suffix (1K = 1024, 1M = 1024K)
+
+    Arguments:
+        value (int|str): Size e.g. 1048576, '1024K' or '1M'
+        label (str): Name of the value used in error messages
+
+    Returns:
+        int: Size in bytes
+    """
+    if type(value) is int:
+        return value
+    if type(value) is not str:
+        raise TypeError('{} has to be integer or string'.format(label))
+    if value.isdigit():
+        return int(value)
+    if value[:-1].isdigit() and value[-1:] == 'K':
+        return int(value[:-1]) * 1024
+    if value[:-1].isdigit() and value[-1:] == 'M':
+        return int(value[:-1]) * 1024 * 1024
+    raise ValueError('{} has to be digit or digit ends with K or M'
+                     .format(label))
+
+
+class Option(object):
+    """String option
+
+    Arguments:
+        attr (str): Attribute name in python
+        name (str): aria2c long option name without leading dashes
+        label (str): Name used in error messages
+        default: Value used when neither instance nor settings set it
+        scope (str): JOB for per download options, GLOBAL for options of
+            the whole aria2c process, INPUT for options which say what to
+            download
+        doc (str): Documentation of the option
+    """
+    def __init__(self, attr, name, label, default=None, scope=JOB, doc=None):
+        self.attr = attr
+        self.name = name
+        self.label = label
+        self.default = default
+        self.scope = scope
+        self.__doc__ = doc
+
+    def convert(self, value):
+        """Validate and normalize value without touching filesystem
+
+        Arguments:
+            value: Value set by user, never None
+
+        Returns:
+            Normalized value
+
+        Raises:
+            TypeError: When value has wrong type
+            ValueError: When value is out of allowed values
+        """
+        if type(value) is not str:
+            raise TypeError('{} has to be string'.format(self.label))
+        return value
+
+    def check(self, value):
+        """Validate value set on download, may touch filesystem
+
+        Arguments:
+            value: Value already normalized by convert()
+
+        Returns:
+            Value to store
+        """
+        return value
+
+    def revalidate(self, value):
+        """Validate stored value again when the command is compiled
+
+        Arguments:
+            value: Stored value
+
+        Returns:
+            Value to use or None to drop it and use settings instead
+        """
+        return value
+
+    def serialize(self, value):
+        """Serialize value for command line and JSON-RPC
+
+        Arguments:
+            value: Value of the option, never None
+
+        Returns:
+            str: Serialized value
+        """
+        return str(value)
+
+    def resolve(self, instance, revalidate=False):
+        """Effective value of the option for given download
+
+        Arguments:
+            instance (aria2c.Aria2c): Download
+            revalidate (bool): Validate stored value again, done only when
+                the command is compiled so reading the option is cheap
+
+        Returns:
+            Value from the download, its settings or default
+        """
+        overrides = instance._overrides
+        if overrides is not None and self.attr in overrides:
+            value = overrides[self.attr]
+            if not revalidate:
+                return value
+            value = self.revalidate(value)
+            if value is not None:
+                return value
+            del overrides[self.attr]
+        if instance._settings is not None:
+            return instance._settings.get(self.attr)
+        return self.default
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return self.resolve(instance)
+
+    def __set__(self, instance, value):
+        overrides = instance._overrides
+        if value is None:
+            if overrides is not None:
+                overrides.pop(self.attr, None)
+        else:
+            value = self.check(self.convert(value))
+            if overrides is None:
+                overrides = instance._overrides = {}
+            overrides[self.attr] = value
+        instance._compiled = None
+
+
+class BoolOption(Option):
+    """Boolean option serialized as 'true' or 'false'"""
+    def convert(self, value):
+        if type(value) is not bool:
+            raise TypeError('{} is bool value'.format(self.label))
+        return value
+
+    def serialize(self, value):
+        return 'true' if value else 'false'
+
+
+class IntOption(Option):
+    """Integer option with optional bounds
+
+    Arguments:
+        minimum (int): Lowest allowed value
+        maximum (int): Highest allowed value
+    """
+    def __init__(self, attr, name, label, default=None, scope=JOB, doc=None,
+                 minimum=None, maximum=None):
+        super(IntOption, self).__init__(attr, name, label, default, scope,
+                                        doc)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def convert(self, value):
+        if type(value) is not int:
+            raise TypeError('{} has to be integer'.format(self.label))
+        return self.bounds(value)
+
+    def bounds(self, value):
+        if self.minimum is not None and self.maximum is not None:
+            if not self.minimum <= value <= self.maximum:
+                raise ValueError('{} has to be in range {} - {}'.format(
+                    self.label, self.minimum, self.maximum))
+        elif self.minimum is not None and value < self.minimum:
+            raise ValueError('{} has to be equal or larger then {}'.format(
+                self.label, self.minimum))
+        elif self.maximum is not None and value > self.maximum:
+            raise ValueError('{} has to be equal or lower then {}'.format(
+                self.label, self.maximum))
+        return value
+
+
+class SizeOption(IntOption):
+    """Size in bytes, K or M suffix is accepted (1K = 1024, 1M = 1024K)"""
+    def convert(self, value):
+        return self.bounds(parse_size(value, self.label))
+
+
+class ChoiceOption(Option):
+    """String option with fixed set of values
+
+    Arguments:
+        choices (tuple): Allowed values
+    """
+    def __init__(self, attr, name, label, default=None, scope=JOB, doc=None,
+                 choices=()):
+        super(ChoiceOption, self).__init__(attr, name, label, default, scope,
+                                           doc)
+        self.choices = choices
+
+    def convert(self, value):
+        if type(value) is not str:
+            raise TypeError('{} has to be string'.format(self.label))
+        if value not in self.choices:
+            raise ValueError('{} has to be one of these values: {}'.format(
+                self.label, ', '.join(self.choices)))
+        return value
+
+
+class PathOption(Option):
+    """Path to file or directory
+
+    Arguments:
+        kind (str): 'dir' for directory, 'file' for existing file and
+            'parent' for file in existing directory
+        stdin (bool): '-' (stdin or stdout) is allowed
+        error (type): Exception raised when path doesn't exist
+        missing (str): What happens when path disappears before the command
+            is compiled, 'drop' uses settings, 'raise' raises error
+    """
+    def __init__(self, attr, name, label, default=None, scope=JOB, doc=None,
+                 kind='file', stdin=False, error=ValueError,
+                 missing='drop'):
+        super(PathOption, self).__init__(attr, name, label, default, scope,
+                                         doc)
+        self.kind = kind
+        self.stdin = stdin
+        self.error = error
+        self.missing = missing
+
+    def exists(self, value):
+        if self.kind == 'dir':
+            return os.path.isdir(value)
+        if self.kind == 'parent':
+            return os.path.isdir(os.path.dirname(value))
+        return os.path.isfile(value)
+
+    def check(self, value):
+        if self.stdin and value == '-':
+            return value
+        value = os.path.abspath(value)
+        if not self.exists(value):
+            if self.error is FileNotFoundError:
+                raise FileNotFoundError('{} not found'.format(self.label))
+            raise self.error('{} has to be valid system path'
+                             .format(self.label))
+        return value
+
+    def revalidate(self, value):
+        if (self.stdin and value == '-') or self.exists(value):
+            return value
+        if self.missing == 'raise':
+            raise FileNotFoundError('{} not found'.format(self.label))
+        return None
+
+
+class PortsOption(Option):
+    """Set of TCP or UDP ports
+
+    Ports can be given as list of integers, range, string with one port,
+    ports separated by ',' or range separated by '-'. Contiguous ports are
+    stored as range so the default 6881-6999 costs no memory per instance.
+    """
+    def convert(self, value):
+        if type(value) is str:
+            if value.isdigit():
+                value = [int(value)]
+            elif all(a.isdigit() for a in value.split(',')):
+                value = [int(a) for a in value.split(',')]
+            elif len(value.split('-')) == 2:
+                first, last = value.split('-')
+                if first.isdigit() and last.isdigit():
+                    value = range(int(first), int(last) + 1)
+        if type(value) is range:
+            if value.step != 1 or len(value) == 0:
+                raise ValueError('{} has to be non empty range with step 1'
+                                 .format(self.label))
+            low, high = value[0], value[-1]
+        elif type(value) in (list, tuple):
+            if any(type(a) is not int for a in value):
+                raise TypeError('{} has to be list of integers'
+                                .format(self.label))
+            if len(value) == 0:
+                raise ValueError('{} cannot be empty'.format(self.label))
+            low, high = min(value), max(value)
+            value = tuple(value)
+            if value == tuple(range(low, high + 1)):
+                value = range(low, high + 1)
+        else:
+            raise TypeError('{} has to be list'.format(self.label))
+        if low < 1024:
+            raise ValueError('{} cannot be lower then 1024'
+                             .format(self.label))
+        if high > 65535:
+            raise ValueError('{} cannot be larger then 65535'
+                             .format(self.label))
+        return value
+
+    def serialize(self, value):
+        if type(value) is range:
+            if len(value) == 1:
+                return str(value[0])
+            return '{}-{}'.format(value[0], value[-1])
+        return ','.join([str(a) for a in value])
+
+
+class GIDOption(Option):
+    """GID of download, 16 hex digits"""
+    def convert(self, value):
+        if type(value) is not str:
+            raise TypeError('{} has to be string'.format(self.label))
+        if len(value) != 16 or not all(a in '0123456789abcdefABCDEF'
+                                       for a in value):
+            raise ValueError('{} has to be 16 hex digits'.format(self.label))
+        return value.lower()
+
+
+class ChecksumOption(Option):
+    """Checksum of the whole file as TYPE=DIGEST e.g. 'sha-256=9f86d0...'"""
+    def convert(self, value):
+        from .verify import parse_checksum
+        if type(value) is not str:
+            raise TypeError('{} has to be string'.format(self.label))
+        return '{}={}'.format(*parse_checksum(value))
+
+
+OPTIONS = (
+    PathOption(
+        'log', 'log', 'Log', default='-', scope=GLOBAL, kind='parent',
+        stdin=True, doc="""str: The file name of the log file.
+
+        If '-' is specified, log is written to stdout.
+        Set 'None' to use default value
+
+        Possible Values: /path/to/file, -
+        Default: -
+        """),
+    PathOption(
+        'dir', 'dir', 'Dir', default=os.path.expanduser('~'), kind='dir',
+        doc="""str: The directory to store the downloaded file.
+
+        Possible Values: /path/to/directory
+        Default: ~/Downloads (if exists else ~ )
+        """),
+    PathOption(
+        'out', 'out', 'Out', kind='parent', doc="""str: The file name of the
+        downloaded file.
+
+        When the force_sequential option is used, this option will be ignored.
+
+        Possible Values: /path/to/file
+        Default: None
+        """),
+    IntOption(
+        'split', 'split', 'Split', default=5, minimum=1,
+        doc="""int: Download a file using N connections.
+
+        If more than N URIs are given, first N URIs are used and remaining URLs
+        are used for backup. If less than N URIs are given, those URLs are used
+        more than once so that N connections total are made simultaneously.
+        The number of connections to the same host is restricted by
+        the max_connection_per_server option. See also the min_split_size
+        option.
+
+        Possible Values: 1-*
+        Default: 5
+        """),
+    ChoiceOption(
+        'file_allocation', 'file-allocation', 'File allocation type',
+        default='prealloc', choices=('none', 'prealloc', 'trunc', 'falloc'),
+        doc="""str: Specify file allocation method.
+
+        'none':
+            doesn't pre-allocate file space.
+        'prealloc':
+            pre-allocates file space before download begins. This may take some
+            time depending on the size of the file.
+        'falloc':
+            If you are using newer file systems such as ext4 (with extents
+            support), btrfs, xfs or NTFS (MinGW build only), 'falloc' is your
+            best choice. It allocates large (few GiB) files almost instantly.
+            Don't use 'falloc' with legacy file systems such as ext3 and FAT32
+            because it takes almost same time as 'prealloc' and it blocks aria2
+            entirely until allocation finishes. 'falloc' may not be available
+            if your system doesn't have posix_fallocate() function.
+        'trunc':
+            uses ftruncate() system call or platform-specific counterpart to
+            truncate a file to a specified length.
+
+        Possible Values: none, prealloc, trunc, falloc
+        Default: prealloc
+        Recommended: falloc
+        """),
+    BoolOption(
+        'check_integrity', 'check-integrity', 'Check integrity',
+        default=False, doc="""bool: Check file integrity by validating piece
+        hashes or a hash of entire file.
+
+        This option has effect only in BitTorrent, Metalink downloads with
+        checksums or HTTP(S)/FTP downloads with checksum option enabled. If
+        piece hashes are provided, this option can detect damaged portions of a
+        file and re-download them. If a hash of entire file is provided, hash
+        check is only done when file has been already download. This is
+        determined by file length. If hash check fails, file is re-downloaded
+        from scratch. If both piece hashes and a hash of entire file are
+        provided, only piece hashes are used.
+
+        Possible Values: True, False
+        Default: False
+        """),
+    ChecksumOption(
+        'checksum', 'checksum', 'Checksum',
+        doc="""str: Set checksum of the downloaded file.
+
+        TYPE is hash type: md5, sha-1, sha-224, sha-256, sha-384 or sha-512.
+        DIGEST is hex digest. For example, setting sha-1 digest looks like
+        this: sha-1=0192ba11326fe2298c8cb4de616f4d4140213837. This option
+        applies only to HTTP(S)/FTP downloads. See also check_integrity
+        option.
+
+        Possible Values: TYPE=DIGEST
+        Default: None
+        """),
+    BoolOption(
+        'continue_downloading', 'continue', 'Continue downloading',
+        default=False, doc="""bool: Continue downloading a partially
+        downloaded file.
+
+        Use this option to resume a download started by a web browser or
+        another program which downloads files sequentially from the beginning.
+        Currently this option is only applicable to http(s)/ftp downloads.
+
+        Possible Values: True, False
+        Default: False
+        """),
+    PathOption(
+        'input_file', 'input-file', 'Input file', scope=INPUT, stdin=True,
+        error=FileNotFoundError, missing='raise',
+        doc="""str: Downloads URIs found in FILE.
+
+        You can specify multiple URIs for a single entity: separate URIs on
+        a single line using the TAB character. Reads input from stdin when '-'
+        is specified.
+        Additionally, options can be specified after each line of URI. This
+        optional line must start with one or more white spaces and have one
+        option per single line. See INPUT FILE section of man page for details.
+        See also deferred_input option.
+
+        Possible Values: /path/to/file, -
+        Default: None
+        """),
+    IntOption(
+        'max_concurrent_downloads', 'max-concurrent-downloads',
+        'Max concurrent downloads', default=5, scope=GLOBAL, minimum=1,
+        doc="""int: Set maximum number of parallel downloads for every static
+        (HTTP/FTP) URL, torrent and metalink.
+
+        See also split option.
+
+        Possible Values: 1-*
+        Default: 5
+        """),
+    BoolOption(
+        'optimize_concurrent_downloads', 'optimize-concurrent-downloads',
+        'Optimize concurrent downloads', default=False, scope=GLOBAL,
+        doc="""bool: Optimizes the number of concurrent downloads according
+        to the bandwidth available.
+
+        aria2 uses the download speed observed in the previous downloads to
+        adapt the number of downloads launched in parallel, never more than
+        max_concurrent_downloads.
+
+        Possible Values: True, False
+        Default: False
+        """),
+    SizeOption(
+        'disk_cache', 'disk-cache', 'Disk cache', default=16777216,
+        scope=GLOBAL, minimum=0,
+        doc="""int: Enable disk cache.
+
+        If SIZE is 0, the disk cache is disabled. This feature caches the
+        downloaded data in memory, which grows to at most SIZE bytes. The
+        cache storage is created for aria2 instance and shared by all
+        downloads. The one advantage of the disk cache is reduce the disk
+        I/O because the data are written in larger unit and it is reordered
+        by the offset of the file. You can append K or M(1K = 1024,
+        1M = 1024K).
+
+        Possible Values: 0-*
+        Default: 16M = 16384K = 16777216
+        """),
+    BoolOption(
+        'async_dns', 'async-dns', 'Async DNS', default=True, scope=GLOBAL,
+        doc="""bool: Enable asynchronous DNS.
+
+        Possible Values: True, False
+        Default: True
+        """),
+    BoolOption(
+        'force_sequential', 'force-sequential', 'Force sequential',
+        default=False, doc="""bool: Fetch URIs in the command-line
+        sequentially and download each URI in a separate session, like the
+        usual command-line download utilities.
+
+        Possible Values: True, False
+        Default: False
+        """),
+    IntOption(
+        'max_connection_per_server', 'max-connection-per-server',
+        'Max connection per server', default=1, minimum=1, maximum=16,
+        doc="""int: The maximum number of connections to one server for each
+        download.
+
+        Possible Values: 1-16
+        Default: 1
+        Recommended: 16
+        """),
+    ChoiceOption(
+        'uri_selector', 'uri-selector', 'URI selector', default='feedback',
+        choices=('inorder', 'feedback', 'adaptive'),
+        doc="""str: Specify URI selection algorithm.
+
+        'inorder':
+            URI is tried in the order appeared in the URI list.
+        'feedback':
+            aria2 uses download speed observed in the previous downloads and
+            choose fastest server in the URI list. This also effectively skips
+            dead mirrors.
+        'adaptive':
+            selects one of the best mirrors for the first and reserved
+            connections. For supplementary ones, it returns mirrors which has
+            not been tested yet, and if each of them has already been tested,
+            returns mirrors which has to be tested again. Otherwise, it
+            doesn't select anymore mirrors.
+
+        Possible Values: inorder, feedback, adaptive
+        Default: feedback
+        """),
+    SizeOption(
+        'min_split_size', 'min-split-size', 'Min split size',
+        default=20971520, minimum=1048576, maximum=1073741824,
+        doc="""int: aria2 does not split less than 2*SIZE byte range.
+
+        For example, let's consider downloading 20MiB file. If SIZE is 10M,
+        aria2 can split file into 2 range [0-10MiB) and [10MiB-20MiB) and
+        download it using 2 sources(if --split >= 2, of course). If SIZE is
+        15M, since 2*15M > 20MiB, aria2 does not split file and download it
+        using 1 source. You can append K or M(1K = 1024, 1M = 1024K).
+
+        Possible Values: 1048576-1073741824
+        Default: 20M = 20480K = 20971520
+        Recommended: 1M = 1024K = 1048576
+        """),
+    SizeOption(
+        'piece_length', 'piece-length', 'Piece length', default=1048576,
+        minimum=1048576, maximum=1073741824,
+        doc="""int: Set a piece length for HTTP/FTP downloads.
+
+        This is the boundary when aria2 splits a file. All splits occur at
+        multiple of this length. This option will be ignored in BitTorrent
+        downloads. It will be also ignored if Metalink file contains piece
+        hashes. You can append K or M(1K = 1024, 1M = 1024K).
+
+        Possible Values: 1048576-1073741824
+        Default: 1M = 1024K = 1048576
+        """),
+    ChoiceOption(
+        'stream_piece_selector', 'stream-piece-selector',
+        'Stream piece selector', default='default',
+        choices=('default', 'inorder', 'random', 'geom'),
+        doc="""str: Specify piece selection algorithm used in HTTP/FTP
+        download.
+
+        'default':
+            selects piece so that it reduces the number of establishing
+            connection. This is reasonable default behavior.
+        'inorder':
+            selects piece which has minimum index. This is useful to view
+            movie while downloading it.
+        'random':
+            selects piece randomly. Like 'inorder', min_split_size option is
+            honored.
+        'geom':
+            selects piece which has minimum index like 'inorder' at the
+            beginning, but it exponentially increases space from previously
+            selected piece.
+
+        Possible Values: default, inorder, random, geom
+        Default: default
+        """),
+    BoolOption(
+        'enable_mmap', 'enable-mmap', 'Enable mmap', default=False,
+        doc="""bool: Map files into memory.
+
+        This option may not work if the file space is not pre-allocated. See
+        file_allocation option.
+
+        Possible Values: True, False
+        Default: False
+        """),
+    SizeOption(
+        'lowest_speed_limit', 'lowest-speed-limit', 'Lowest speed limit',
+        default=0, minimum=0,
+        doc="""int: Close connection if download speed is lower than or
+        equal to this value(bytes per sec).
+
+        0 means aria2 does not have a lowest speed limit. You can append K or
+        M(1K = 1024, 1M = 1024K). This option does not affect BitTorrent
+        downloads.
+
+        Possible Values: 0-*
+        Default: 0
+        """),
+    IntOption(
+        'max_tries', 'max-tries', 'Max tries', default=5, minimum=0,
+        doc="""int: Set number of tries.
+
+        0 means unlimited. See also retry_wait option.
+
+        Possible Values: 0-*
+        Default: 5
+        """),
+    IntOption(
+        'retry_wait', 'retry-wait', 'Retry wait', default=0, minimum=0,
+        maximum=600,
+        doc="""int: Set the seconds to wait between retries.
+
+        When SEC > 0, aria2 will retry downloads when the HTTP server returns
+        a 503 response.
+
+        Possible Values: 0-600
+        Default: 0
+        """),
+    Option(
+        'ftp_user', 'ftp-user', 'FTP username',
+        doc="""str: Set FTP user. This affects all URLs.
+
+        Default: None
+        """),
+    Option(
+        'ftp_passwd', 'ftp-passwd', 'FTP password',
+        doc="""str: Set FTP password. This affects all URLs.
+
+        Default: None
+        """),
+    Option(
+        'http_user', 'http-user', 'HTTP username',
+        doc="""str: Set HTTP user. This affects all URLs.
+
+        Default: None
+        """),
+    Option(
+        'http_passwd', 'http-passwd', 'HTTP password',
+        doc="""str: Set HTTP password. This affects all URLs.
+
+        Default: None
+        """),
+    PathOption(
+        'load_cookies', 'load-cookies', 'Load cookies',
+        doc="""str: Load Cookies from FILE using the Firefox3 format and
+        Mozilla/Firefox(1.x/2.x)/Netscape format.
+
+        Possible Values: /path/to/file
+        Default: None
+        """),
+    BoolOption(
+        'show_files', 'show-files', 'Show files', default=False,
+        scope=INPUT, doc="""bool: Print file listing of .torrent, .meta4 and
+        .metalink file and exit.
+
+        More detailed information will be listed in case of torrent file.
+
+        Possible Values: true, false
+        Default: false
+        """),
+    SizeOption(
+        'max_overall_download_limit', 'max-overall-download-limit',
+        'Max overall download limit', default=0, scope=GLOBAL, minimum=0,
+        doc="""int: Set max overall download speed in bytes/sec.
+
+        0 means unrestricted. You can append K or M(1K = 1024, 1M = 1024K). To
+        limit the download speed per download, use max_download_limit option.
+
+        Possible Values: 0-*
+        Default: 0
+        """),
+    SizeOption(
+        'max_download_limit', 'max-download-limit', 'Max download limit',
+        default=0, minimum=0,
+        doc="""int: Set max download speed per each download in bytes/sec.
+
+        0 means unrestricted. You can append K or M(1K = 1024, 1M = 1024K). To
+        limit the overall download speed, use max_overall_download_limit
+        option.
+
+        Possible Values: 0-*
+        Default: 0
+        """),
+    SizeOption(
+        'max_overall_upload_limit', 'max-overall-upload-limit',
+        'Max overall upload limit', default=0, scope=GLOBAL, minimum=0,
+        doc="""int: Set max overall upload speed in bytes/sec.
+
+        0 means unrestricted. You can append K or M(1K = 1024, 1M = 1024K). To
+        limit the upload speed per torrent, use max_upload_limit option.
+
+        Possible Values: 0-*
+        Default: 0
+        """),
+    SizeOption(
+        'max_upload_limit', 'max-upload-limit', 'Max upload limit',
+        default=0, minimum=0,
+        doc="""int: Set max upload speed per each torrent in bytes/sec.
+
+        0 means unrestricted. You can append K or M(1K = 1024, 1M = 1024K). To
+        limit the overall upload speed, use max_overall_upload_limit option.
+
+        Possible Values: 0-*
+        Default: 0
+        """),
+    PathOption(
+        'torrent_file', 'torrent-file', 'Torrent file', scope=INPUT,
+        error=FileNotFoundError, missing='raise',
+        doc="""str: The path to the .torrent file.
+
+        Possible Values: /path/to/file
+        Default: None
+        """),
+    PortsOption(
+        'listen_port', 'listen-port', 'Listen port',
+        default=range(6881, 7000), scope=GLOBAL,
+        doc="""range|tuple: Set TCP port number for BitTorrent downloads.
+
+        Multiple ports can be specified by using ',', for example: "6881,6885".
+        You can also use '-' to specify a range: "6881-6999". ',' and '-'
+        cannot be used together.
+
+        Possible Values: 1024-65535
+        Default: 6881-6999
+        """),
+    BoolOption(
+        'enable_dht', 'enable-dht', 'Enable DHT', default=True, scope=GLOBAL,
+        doc="""bool: Enable IPv4 DHT functionality.
+
+        It also enables UDP tracker support. If a private flag is set in a
+        torrent, aria2 doesn't use DHT for that download even if ``true`` is
+        given.
+
+        Possible Values: True, False
+        Default: True
+        """),
+    PortsOption(
+        'dht_listen_port', 'dht-listen-port', 'DHT listen port',
+        default=range(6881, 7000), scope=GLOBAL,
+        doc="""range|tuple: Set UDP listening port used by DHT(IPv4, IPv6)
+        and UDP tracker.
+
+        Multiple ports can be specified by using ',', for example:
+        "6881,6885". You can also use '-' to specify a range: "6881-6999". ','
+        and '-' cannot be used together.
+
+        Possible Values: 1024-65535
+        Default: 6881-6999
+        """),
+    BoolOption(
+        'enable_dht6', 'enable-dht6', 'Enable DHT6', default=False,
+        scope=GLOBAL, doc="""bool: Enable IPv6 DHT functionality.
+
+        Use dht_listen_port option to specify port number to listen on. See
+        also dht_listen_addr6 option.
+
+        Possible Values: True, False
+        Default: False
+        """),
+    Option(
+        'dht_listen_addr6', 'dht-listen-addr6', 'DHT listen addr6',
+        scope=GLOBAL, doc="""str: Specify address to bind socket for IPv6 DHT.
+
+        It should be a global unicast IPv6 address of the host.
+
+        Possible values: valid IPv6 address
+        Default: None
+        """),
+    PathOption(
+        'metalink_file', 'metalink-file', 'Metalink file', scope=INPUT,
+        stdin=True, doc="""str: The file path to the .meta4 and .metalink
+        file.
+
+        Reads input from stdin when '-' is specified.
+
+        Possible Values: /path/to/file, -
+        Default: None
+        """),
+    IntOption(
+        'summary_interval', 'summary-interval', 'Summary interval',
+        default=60, scope=GLOBAL, minimum=0,
+        doc="""int: Set interval in seconds to output download progress
+        summary.
+
+        Setting 0 suppresses the output.
+
+        Possible Values: 0-*
+        Default: 60
+        """),
+    PathOption(
+        'save_session', 'save-session', 'Save session', scope=GLOBAL,
+        kind='parent', doc="""str: Save error/unfinished downloads to FILE on
+        exit.
+
+        The file has input file format and can be passed to input_file option
+        to restart the downloads. GID of every download is saved with it. See
+        also save_session_interval option.
+
+        Possible Values: /path/to/file
+        Default: None
+        """),
+    GIDOption(
+        'gid', 'gid', 'GID',
+        doc="""str: Set GID manually.
+
+        aria2 identifies each download by the ID called GID. The GID must be
+        hex string of 16 characters, thus [0-9a-fA-F] are allowed and leading
+        zeros must not be stripped. The GID all 0 is reserved and must not be
+        used. The GID must be unique, otherwise error is reported and the
+        download is not added.
+
+        Possible Values: 16 hex digits
+        Default: None
+        """),
+    IntOption(
+        'save_session_interval', 'save-session-interval',
+        'Save session interval', default=0, scope=GLOBAL, minimum=0,
+        doc="""int: Save error/unfinished downloads to the file given by
+        save_session option every SEC seconds.
+
+        If 0 is given, file will be saved only when aria2 exits.
+
+        Possible Values: 0-*
+        Default: 0
+        """),
+)
+
+BY_ATTR = dict((option.attr, option) for option in OPTIONS)
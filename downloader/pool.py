@@ -0,0 +1,183 @@
+"""Pool of aria2c daemons sharing the work of one machine"""
+
+import urllib.parse
+import zlib
+
+from .aria2c import Aria2c, Aria2cDaemon
+from .rpc import RPCError
+
+__all__ = ['DaemonPool', 'slice_ports']
+
+
+def slice_ports(ports, count):
+    """Split ports into contiguous parts of equal size
+
+    Arguments:
+        ports (range|tuple): Ports as stored by listen_port option
+        count (int): Number of parts
+
+    Returns:
+        list: count parts, ranges when ports is a range
+
+    Raises:
+        ValueError: When there are fewer ports than parts
+    """
+    size = len(ports) // count
+    if size < 1:
+        raise ValueError('{} ports cannot be split between {} daemons'
+                         .format(len(ports), count))
+    return [ports[index * size:(index + 1) * size] for index in range(count)]
+
+
+class DaemonPool(object):
+    """N aria2c daemons with their own RPC port and BitTorrent/DHT ports
+
+    One aria2c process handles all its connections on one core, the pool
+    spreads jobs over several processes so throughput scales with cores.
+    Daemon i listens for RPC on base_port + i and gets i-th slice of
+    listen_port and dht_listen_port ranges of the settings. Jobs are sharded
+    by host name, so connection limits per server still hold within one
+    daemon, or by hash of the URI for even spread. Daemons which were
+    already running are used but not shut down by stop().
+
+    Arguments:
+        size (int): Number of daemons
+        settings (settings.Settings): Settings of the daemons and jobs
+        host (str): Host where RPC interfaces listen
+        base_port (int): RPC port of the first daemon
+        secret (str): RPC secret token of all daemons
+        shard (str): 'host' or 'hash'
+    """
+    def __init__(self, size, settings=None, host='localhost',
+                 base_port=6800, secret=None, shard='host'):
+        if type(size) is not int:
+            raise TypeError('Size has to be integer')
+        if size < 1:
+            raise ValueError('Size has to be equal or larger then 1')
+        if shard not in ('host', 'hash'):
+            raise ValueError('Shard has to be one of these values: host, '
+                             'hash')
+        self._settings = settings
+        self._shard = shard
+        template = self._template()
+        listen_ports = slice_ports(template.listen_port, size)
+        dht_ports = slice_ports(template.dht_listen_port, size)
+        self._daemons = []
+        self._templates = []
+        self._started = []
+        for index in range(size):
+            aria2c = self._template()
+            aria2c.listen_port = listen_ports[index]
+            aria2c.dht_listen_port = dht_ports[index]
+            self._templates.append(aria2c)
+            self._daemons.append(Aria2cDaemon(host, base_port + index,
+                                              secret))
+
+    def _template(self):
+        aria2c = Aria2c()
+        aria2c.use_settings(self._settings)
+        return aria2c
+
+    def __len__(self):
+        return len(self._daemons)
+
+    @property
+    def daemons(self):
+        """list: aria2c.Aria2cDaemon of every shard"""
+        return list(self._daemons)
+
+    def command(self, index):
+        """Command line which starts daemon of shard
+
+        Arguments:
+            index (int): Shard
+
+        Returns:
+            list: Command line arguments
+        """
+        return self._daemons[index].command(self._templates[index])
+
+    def start(self):
+        """Start daemons which are not running yet"""
+        for daemon, template in zip(self._daemons, self._templates):
+            if not daemon.is_running():
+                daemon.start(template)
+                self._started.append(daemon)
+
+    def stop(self):
+        """Shut down daemons started by start()"""
+        while self._started:
+            daemon = self._started.pop()
+            if daemon.is_running():
+                daemon.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def shard(self, aria2c):
+        """Shard which runs the download
+
+        CRC32 is used instead of hash(), which differs between processes.
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download
+
+        Returns:
+            int: Index of the daemon
+        """
+        key = aria2c.uri or aria2c.magnet or aria2c.torrent_file or ''
+        if self._shard == 'host' and aria2c.uri is not None:
+            key = urllib.parse.urlsplit(aria2c.uri).hostname or ''
+        return zlib.crc32(key.encode('utf-8')) % len(self._daemons)
+
+    def submit(self, aria2c):
+        """Submit download to its shard
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download
+
+        Returns:
+            tuple: (shard, GID) identifying the download in the pool
+        """
+        index = self.shard(aria2c)
+        return index, aria2c.submit(self._daemons[index].rpc)
+
+    def tell_status(self, handle, keys=None):
+        """Status of download submitted by submit()
+
+        Arguments:
+            handle (tuple): (shard, GID)
+            keys (list): Keys of aria2.tellStatus, all by default
+
+        Returns:
+            dict: Status
+        """
+        index, gid = handle
+        return self._daemons[index].rpc.tell_status(gid, keys)
+
+    def status(self):
+        """aria2.getGlobalStat summed over all daemons
+
+        Returns:
+            dict: Sum of every statistic as integer, 'daemons' holds the
+                statistics of every shard, None for daemon which doesn't
+                respond
+        """
+        total = {}
+        shards = []
+        for daemon in self._daemons:
+            try:
+                stat = daemon.rpc.get_global_stat()
+            except (OSError, RPCError, ValueError):
+                shards.append(None)
+                continue
+            stat = dict((name, int(value)) for name, value in stat.items())
+            for name, value in stat.items():
+                total[name] = total.get(name, 0) + value
+            shards.append(stat)
+        total['daemons'] = shards
+        return total
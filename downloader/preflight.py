@@ -0,0 +1,218 @@
+"""Sizes and range support of downloads from concurrent HEAD requests
+
+The sizes let autotune.Autotuner pick split and connection count per
+download, so a small manifest doesn't open 16 connections and a large image
+isn't downloaded by one, and are checked against free space. HEAD responses
+are cached in the cache directory, repeated runs don't send them again until
+they expire.
+"""
+
+import http.client
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .engine import follow_redirects, request_headers
+from .settings import cache_dir
+
+__all__ = ['Head', 'Preflight', 'head']
+
+TIMEOUT = 10
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS heads (
+    url TEXT PRIMARY KEY,
+    size INTEGER,
+    ranges INTEGER NOT NULL,
+    etag TEXT,
+    checked REAL NOT NULL
+);
+'''
+
+
+class Head(object):
+    """Response headers of HEAD request
+
+    Attributes:
+        size (int): Content-Length, None when not known
+        ranges (bool): True if server accepts byte ranges
+        etag (str): ETag header
+    """
+    __slots__ = ('size', 'ranges', 'etag')
+
+    def __init__(self, size=None, ranges=False, etag=None):
+        self.size = size
+        self.ranges = ranges
+        self.etag = etag
+
+
+class _Connections(threading.local):
+    """Keep-alive connections of one thread by scheme and host"""
+    def __init__(self):
+        self.connections = {}
+
+
+def head(url, headers=None, timeout=TIMEOUT, connections=None):
+    """Send HEAD request, follow redirects
+
+    Credentials in headers are not sent to other origins.
+
+    Arguments:
+        url (str): HTTP(S) URL
+        headers (dict): Request headers e.g. credentials
+        timeout (float): Socket timeout in seconds
+        connections (dict): Open connections by (scheme, host), reused and
+            updated, None closes the connection after the request
+
+    Returns:
+        Head: Headers of the final response
+
+    Raises:
+        OSError: When server doesn't answer
+        http.client.HTTPException: When response is not valid HTTP
+        ValueError: When URL is not HTTP(S), response is error or there are
+            too many redirects
+    """
+    pool = connections if connections is not None else {}
+
+    def send(url, headers):
+        parts = urllib.parse.urlsplit(url)
+        target = parts.path or '/'
+        if parts.query:
+            target = '{}?{}'.format(target, parts.query)
+        key = (parts.scheme, parts.netloc)
+        # Connection closed by server while idle is opened again once
+        for attempt in (0, 1):
+            connection = pool.get(key)
+            if connection is None:
+                factory = (http.client.HTTPSConnection
+                           if parts.scheme == 'https'
+                           else http.client.HTTPConnection)
+                connection = pool[key] = factory(
+                    parts.hostname, parts.port, timeout=timeout)
+            try:
+                connection.request('HEAD', target, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                return response
+            except (http.client.RemoteDisconnected,
+                    ConnectionResetError, BrokenPipeError):
+                connection.close()
+                del pool[key]
+                if attempt:
+                    raise
+
+    try:
+        _, response = follow_redirects(url, headers, send)
+        if response.status >= 400:
+            raise ValueError('HTTP {} {}'.format(response.status,
+                                                 response.reason))
+        length = response.getheader('Content-Length')
+        return Head(int(length) if length is not None else None,
+                    (response.getheader('Accept-Ranges') or '').lower()
+                    == 'bytes',
+                    response.getheader('ETag'))
+    finally:
+        if connections is None:
+            for connection in pool.values():
+                connection.close()
+
+
+class Preflight(object):
+    """HEAD requests of a batch sent concurrently, responses cached
+
+    Every worker thread keeps one keep-alive connection per host, so a batch
+    from a few servers costs a few TCP and TLS handshakes.
+
+    Arguments:
+        path (str): SQLite cache, preflight.sqlite in cache directory by
+            default
+        ttl (float): Seconds cached response stays valid
+        workers (int): Requests at once
+        timeout (float): Socket timeout in seconds
+    """
+    def __init__(self, path=None, ttl=3600, workers=16, timeout=TIMEOUT):
+        if path is None:
+            path = os.path.join(cache_dir(), 'preflight.sqlite')
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        self._ttl = ttl
+        self._workers = workers
+        self._timeout = timeout
+        self._local = _Connections()
+        self._opened = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._db.close()
+
+    def _cached(self, urls):
+        heads = {}
+        oldest = time.time() - self._ttl
+        urls = list(urls)
+        # SQLite limits number of parameters of one statement
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            for url, size, ranges, etag in self._db.execute(
+                    'SELECT url, size, ranges, etag FROM heads '
+                    'WHERE checked >= ? AND url IN ({})'.format(
+                        ', '.join('?' * len(chunk))), [oldest] + chunk):
+                heads[url] = Head(size, bool(ranges), etag)
+        return heads
+
+    def _head(self, url, headers):
+        connections = self._local.connections
+        if not connections:
+            with self._lock:
+                self._opened.append(connections)
+        try:
+            return head(url, headers, self._timeout, connections)
+        except (OSError, ValueError, http.client.HTTPException):
+            return None
+
+    def run(self, jobs):
+        """HEAD of every download, cached or requested
+
+        Arguments:
+            jobs (list): aria2c.Aria2c downloads with uri
+
+        Returns:
+            list: Head of every job in the same order, None when request
+                failed
+        """
+        urls = [job.uri for job in jobs]
+        heads = self._cached(set(urls))
+        missing = OrderedDict()
+        for job in jobs:
+            if job.uri not in heads:
+                missing.setdefault(job.uri, request_headers(job))
+        if missing:
+            with ThreadPoolExecutor(min(self._workers,
+                                        len(missing))) as executor:
+                results = list(executor.map(self._head, missing,
+                                            missing.values()))
+            for connections in self._opened:
+                for connection in connections.values():
+                    connection.close()
+                connections.clear()
+            del self._opened[:]
+            now = time.time()
+            rows = []
+            for url, result in zip(missing, results):
+                heads[url] = result
+                if result is not None:
+                    rows.append((url, result.size, int(result.ranges),
+                                 result.etag, now))
+            with self._db:
+                self._db.execute('BEGIN IMMEDIATE')
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO heads '
+                    '(url, size, ranges, etag, checked) '
+                    'VALUES (?, ?, ?, ?, ?)', rows)
+        return [heads[url] for url in urls]
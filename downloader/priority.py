@@ -0,0 +1,262 @@
+"""Priority classes and preemption of downloads in aria2c daemon"""
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .rpc import RPCError
+
+__all__ = ['PriorityQueue', 'CLASSES']
+
+# From the most urgent
+CLASSES = ('interactive', 'normal', 'bulk')
+
+FINISHED = ('complete', 'error', 'removed')
+
+
+class _Job(object):
+    __slots__ = ('aria2c', 'priority', 'rank', 'key', 'submitted', 'started',
+                 'resumed', 'gid', 'future')
+
+    def __init__(self, aria2c, priority, rank, aging):
+        self.aria2c = aria2c
+        self.priority = priority
+        self.rank = rank
+        self.submitted = time.monotonic()
+        # rank - waited / aging orders jobs the same way at any moment as
+        # rank * aging + submitted, so the heap key changes only when the
+        # job stops waiting
+        self.key = rank * aging + self.submitted
+        self.started = None
+        self.resumed = None
+        self.gid = None
+        self.future = Future()
+
+
+def _percentile(values, percent):
+    """Nearest rank percentile of sorted values"""
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+class PriorityQueue(object):
+    """Hands downloads to aria2c daemon by priority class
+
+    At most slots downloads are in the daemon at once, set
+    max_concurrent_downloads of the daemon to the same value. Waiting
+    downloads are started from the most urgent class, and the longer one
+    waits the more urgent it gets: every aging seconds of waiting count as
+    one class up, so bulk downloads don't starve. When all slots are taken
+    and a waiting download is more urgent than a running one, the least
+    urgent running download is paused by aria2.pause and goes back to the
+    queue, it continues by aria2.unpause later. Running download keeps the
+    urgency it had when it started, so one started by aging isn't paused
+    for a download which waited less. Started downloads which still wait in
+    the daemon queue are moved to its front by aria2.changePosition, so
+    jobs added to the daemon by others don't delay them.
+
+    Arguments:
+        rpc (rpc.Aria2RPC): Client connected to the daemon
+        slots (int): Downloads in the daemon at once
+        aging (float): Seconds of waiting worth one class
+        classes (tuple): Class names from the most urgent
+        preempt (bool): Pause less urgent downloads for more urgent ones
+    """
+    def __init__(self, rpc, slots=5, aging=300, classes=CLASSES,
+                 preempt=True):
+        if type(slots) is not int:
+            raise TypeError('Slots has to be integer')
+        if slots < 1:
+            raise ValueError('Slots has to be equal or larger then 1')
+        if aging <= 0:
+            raise ValueError('Aging has to be larger then 0')
+        self._rpc = rpc
+        self._slots = slots
+        self._aging = aging
+        self._ranks = OrderedDict((name, rank)
+                                  for rank, name in enumerate(classes))
+        self._preempt = preempt
+        self._pending = []
+        self._running = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._latency = OrderedDict((name, ([], [])) for name in classes)
+        self._preempted = 0
+
+    @property
+    def preempted(self):
+        """int: Downloads paused for more urgent ones so far"""
+        return self._preempted
+
+    def _push(self, job):
+        heapq.heappush(self._pending, (job.key, next(self._order), job))
+
+    def submit(self, aria2c, priority='normal'):
+        """Queue download
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download
+            priority (str): Class name
+
+        Returns:
+            concurrent.futures.Future: Final status of the download,
+                'complete', 'error' or 'removed', rpc.RPCError when aria2
+                rejects it
+        """
+        if priority not in self._ranks:
+            raise ValueError('Priority has to be one of these values: {}'
+                             .format(', '.join(self._ranks)))
+        job = _Job(aria2c, priority, self._ranks[priority], self._aging)
+        with self._lock:
+            self._push(job)
+            self._dispatch()
+        return job.future
+
+    def queue_depth(self):
+        """Waiting downloads per class
+
+        Returns:
+            dict: Number of waiting downloads by class name
+        """
+        with self._lock:
+            depth = OrderedDict((name, 0) for name in self._ranks)
+            for _, _, job in self._pending:
+                depth[job.priority] += 1
+            return depth
+
+    def _start(self, job):
+        """Hand job to the daemon, False when the daemon doesn't answer"""
+        try:
+            if job.gid is None:
+                job.gid = job.aria2c.submit(self._rpc)
+            else:
+                self._rpc.unpause(job.gid)
+        except RPCError as error:
+            # Rejected by aria2 or removed from it while paused
+            job.future.set_exception(error)
+            return True
+        except OSError:
+            # Job waits for the next step
+            self._push(job)
+            return False
+        job.resumed = time.monotonic()
+        if job.started is None:
+            job.started = job.resumed
+        self._running.append(job)
+        # aria2 moves only downloads which wait, active ones are rejected
+        if self._rpc.tell_status(job.gid, ['status'])['status'] == 'waiting':
+            try:
+                self._rpc.change_position(job.gid, 0, 'POS_SET')
+            except RPCError:
+                # Started by aria2 in the meantime
+                pass
+        return True
+
+    def _dispatch(self):
+        """Start waiting downloads, caller holds the lock"""
+        while self._pending:
+            job = self._pending[0][2]
+            if len(self._running) >= self._slots:
+                if not self._preempt:
+                    return
+                # The smaller key - now the more urgent, running downloads
+                # stopped aging when they started; the most recently
+                # started of equally urgent ones
+                now = time.monotonic()
+                victim = max(reversed(self._running),
+                             key=lambda running: running.key -
+                             running.resumed)
+                if victim.key - victim.resumed <= job.key - now:
+                    return
+                self._rpc.pause(victim.gid)
+                self._running.remove(victim)
+                # Time it ran doesn't count as waiting
+                victim.key += now - victim.resumed
+                # Job is the top of the heap, it leaves before victim returns
+                heapq.heappop(self._pending)
+                self._push(victim)
+                self._preempted += 1
+            else:
+                heapq.heappop(self._pending)
+            if not self._start(job):
+                return
+
+    def step(self):
+        """Collect finished downloads and start waiting ones
+
+        Returns:
+            int: Downloads waiting or running
+        """
+        with self._lock:
+            running = list(self._running)
+        statuses = self._rpc.multicall([
+            ('aria2.tellStatus', [job.gid, ['status']]) for job in running])
+        now = time.monotonic()
+        with self._lock:
+            for job, status in zip(running, statuses):
+                if status['status'] not in FINISHED:
+                    continue
+                self._running.remove(job)
+                waits, totals = self._latency[job.priority]
+                waits.append(job.started - job.submitted)
+                totals.append(now - job.submitted)
+                job.future.set_result(status['status'])
+            self._dispatch()
+            return len(self._pending) + len(self._running)
+
+    def join(self, interval=1):
+        """Step until all downloads finish
+
+        Arguments:
+            interval (float): Seconds between steps
+        """
+        while self.step():
+            time.sleep(interval)
+
+    def latency(self):
+        """Latency of finished downloads per class
+
+        Wait is time from submit to the first start in the daemon, total
+        ends when the download finished. Precision is the interval of
+        step() calls.
+
+        Returns:
+            dict: {'count', 'wait', 'total'} by class name, wait and total
+                are dicts of 'p50', 'p95' and 'max' seconds, None without
+                finished downloads
+        """
+        result = OrderedDict()
+        with self._lock:
+            for name, (waits, totals) in self._latency.items():
+                entry = {'count': len(waits), 'wait': None, 'total': None}
+                for key, values in (('wait', waits), ('total', totals)):
+                    if values:
+                        values = sorted(values)
+                        entry[key] = {'p50': _percentile(values, 50),
+                                      'p95': _percentile(values, 95),
+                                      'max': values[-1]}
+                result[name] = entry
+        return result
+
+    def report(self, stream=None):
+        """Print latency per class in seconds
+
+        Arguments:
+            stream: Text stream, stderr by default
+        """
+        stream = stream or sys.stderr
+        stream.write('{:<12} {:>6} {:>9} {:>9} {:>9} {:>9}\n'.format(
+            'class', 'count', 'wait p50', 'wait p95', 'total p50',
+            'total p95'))
+        for name, entry in self.latency().items():
+            if not entry['count']:
+                continue
+            stream.write('{:<12} {:>6} {:9.2f} {:9.2f} {:9.2f} {:9.2f}\n'
+                         .format(name, entry['count'],
+                                 entry['wait']['p50'], entry['wait']['p95'],
+                                 entry['total']['p50'],
+                                 entry['total']['p95']))
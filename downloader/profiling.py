@@ -0,0 +1,194 @@
+"""Per phase timings of the wrapper
+
+Instrumented code calls phase() and mark() of this module. They cost one
+global lookup while no Profiler is active, so the hooks stay in place in
+production code.
+
+Phases:
+    startup: from process start to the entry of the CLI
+    settings: construction of Settings
+    options: resolution of all options of a download
+    argv: build of aria2c command line
+    spawn: start of aria2c process
+    first_byte: from start of profiling to the first downloaded byte
+    complete: from start of profiling to the end of download
+"""
+
+import os
+import sys
+import time
+from collections import OrderedDict
+
+__all__ = ['Profiler', 'phase', 'mark', 'process_start']
+
+_active = None
+
+
+def process_start():
+    """time.perf_counter() value of the moment the process started
+
+    Linux reports start time in clock ticks since boot, elsewhere import of
+    this module is used.
+
+    Returns:
+        float: Start of the process on time.perf_counter() clock
+    """
+    try:
+        with open('/proc/self/stat') as stream:
+            # Name in parentheses may contain spaces
+            fields = stream.read().rsplit(')', 1)[1].split()
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - started
+        return time.perf_counter() - max(age, 0.0)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _IMPORTED
+
+
+_IMPORTED = time.perf_counter()
+
+
+class _Phase(object):
+    __slots__ = ('_profiler', '_name', '_start')
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.add(self._name, time.perf_counter() - self._start)
+
+
+class _NullPhase(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL = _NullPhase()
+
+
+class Profiler(object):
+    """Collects timings of phases while it is active
+
+    Durations of a phase entered several times are summed. Marks store time
+    since the profiler started.
+
+    Arguments:
+        callback (callable): Called with phase name and seconds whenever a
+            phase ends or a mark is set
+        output (str): File for cProfile statistics readable by pstats, None
+            disables cProfile
+        origin (float): time.perf_counter() value marks are measured from,
+            start of the profiler by default
+    """
+    def __init__(self, callback=None, output=None, origin=None):
+        self._callback = callback
+        self._output = output
+        self._origin = origin
+        self._profile = None
+        self._previous = None
+        self.timings = OrderedDict()
+
+    def add(self, name, seconds):
+        """Add duration to phase
+
+        Arguments:
+            name (str): Phase name
+            seconds (float): Duration
+        """
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        if self._callback is not None:
+            self._callback(name, seconds)
+
+    def phase(self, name):
+        """Context manager timing one phase
+
+        Arguments:
+            name (str): Phase name
+        """
+        return _Phase(self, name)
+
+    def mark(self, name, at=None):
+        """Record time since start of the profiler, first mark wins
+
+        Arguments:
+            name (str): Mark name
+            at (float): time.perf_counter() of the event, now by default
+        """
+        if name in self.timings:
+            return
+        seconds = (time.perf_counter() if at is None else at) - self._origin
+        self.timings[name] = seconds
+        if self._callback is not None:
+            self._callback(name, seconds)
+
+    def start(self):
+        """Activate the profiler for instrumented code"""
+        global _active
+        if self._origin is None:
+            self._origin = time.perf_counter()
+        self._previous = _active
+        _active = self
+        if self._output is not None:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def stop(self):
+        """Deactivate the profiler and write cProfile statistics"""
+        global _active
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self._output)
+            self._profile = None
+        _active = self._previous
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def report(self, stream=None):
+        """Print timings in milliseconds
+
+        Arguments:
+            stream: Text stream, stderr by default
+        """
+        stream = stream or sys.stderr
+        for name, seconds in self.timings.items():
+            stream.write('{:<12} {:10.3f} ms\n'.format(name, seconds * 1000))
+
+
+def phase(name):
+    """Time a phase when a profiler is active
+
+    Arguments:
+        name (str): Phase name
+
+    Returns:
+        Context manager
+    """
+    if _active is None:
+        return _NULL
+    return _active.phase(name)
+
+
+def mark(name, at=None):
+    """Record time of event when a profiler is active
+
+    Arguments:
+        name (str): Mark name
+        at (float): time.perf_counter() of the event, now by default
+    """
+    if _active is not None:
+        _active.mark(name, at)
@@ -0,0 +1,209 @@
+"""Streaming parser of aria2c console output"""
+
+import re
+
+__all__ = ['ProgressEvent', 'CompleteEvent', 'ErrorEvent', 'ProgressParser',
+           'parse_size', 'parse_eta']
+
+_UNITS = {'B': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3,
+          'TiB': 1024 ** 4}
+_SIZE = re.compile(r'([0-9.]+)([KMGT]?i?B)')
+_ETA = re.compile(r'(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?')
+_READOUT = re.compile(r'\[#([0-9a-f]+) ([^\]]*)\]')
+_RESULT = re.compile(r'^([0-9a-f]+)\|(OK|ERR|RM|INPR)\s*\|\s*([^|]*)\|(.*)$')
+
+
+def parse_size(value):
+    """Parse size printed by aria2c e.g. '1.2MiB'
+
+    Arguments:
+        value (str): Size with unit
+
+    Returns:
+        int: Size in bytes, None when value can't be parsed
+    """
+    match = _SIZE.match(value)
+    if match is None or match.group(2) not in _UNITS:
+        return None
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+
+def parse_eta(value):
+    """Parse ETA printed by aria2c e.g. '1h2m3s'
+
+    Arguments:
+        value (str): ETA
+
+    Returns:
+        int: ETA in seconds, None when value can't be parsed
+    """
+    match = _ETA.fullmatch(value)
+    if match is None or not value:
+        return None
+    hours, minutes, seconds = match.groups()
+    return (int(hours or 0) * 3600 + int(minutes or 0) * 60 +
+            int(seconds or 0))
+
+
+class ProgressEvent(object):
+    """Progress of one download from console readout
+
+    Attributes:
+        gid (str): GID prefix printed by aria2c
+        completed (int): Downloaded bytes
+        total (int): File size in bytes, 0 when not known yet
+        connections (int): Number of connections
+        speed (int): Download speed in bytes/sec
+        eta (int): Estimated seconds to finish, None when not known
+    """
+    __slots__ = ('gid', 'completed', 'total', 'connections', 'speed', 'eta')
+
+    def __init__(self, gid, completed=0, total=0, connections=0, speed=0,
+                 eta=None):
+        self.gid = gid
+        self.completed = completed
+        self.total = total
+        self.connections = connections
+        self.speed = speed
+        self.eta = eta
+
+    @property
+    def percent(self):
+        """int: Downloaded percent, None when size is not known"""
+        if not self.total:
+            return None
+        return self.completed * 100 // self.total
+
+    def __repr__(self):
+        return ('ProgressEvent(gid={!r}, completed={}, total={}, '
+                'connections={}, speed={}, eta={})'
+                .format(self.gid, self.completed, self.total,
+                        self.connections, self.speed, self.eta))
+
+
+class CompleteEvent(object):
+    """Download finished successfully
+
+    Attributes:
+        gid (str): GID prefix printed by aria2c
+        speed (int): Average speed in bytes/sec
+        path (str): Path of the downloaded file
+    """
+    __slots__ = ('gid', 'speed', 'path')
+
+    def __init__(self, gid, speed, path):
+        self.gid = gid
+        self.speed = speed
+        self.path = path
+
+    def __repr__(self):
+        return 'CompleteEvent(gid={!r}, speed={}, path={!r})'.format(
+            self.gid, self.speed, self.path)
+
+
+class ErrorEvent(object):
+    """Download failed, was removed or is still in progress at exit
+
+    Attributes:
+        gid (str): GID prefix printed by aria2c
+        status (str): Status from download results: ERR, RM or INPR
+        path (str): Path of the file or URI
+    """
+    __slots__ = ('gid', 'status', 'path')
+
+    def __init__(self, gid, status, path):
+        self.gid = gid
+        self.status = status
+        self.path = path
+
+    def __repr__(self):
+        return 'ErrorEvent(gid={!r}, status={!r}, path={!r})'.format(
+            self.gid, self.status, self.path)
+
+
+class ProgressParser(object):
+    """Incremental parser of aria2c output
+
+    Output can be fed in chunks of any size, lines split by either carriage
+    return (console readout on terminal) or new line are recognized. Lines
+    which don't carry progress or results are dropped without decoding
+    into more than one string.
+    """
+    __slots__ = ('_buffer',)
+
+    def __init__(self):
+        self._buffer = b''
+
+    def feed(self, data):
+        """Parse next chunk of output
+
+        Arguments:
+            data (bytes): Output of aria2c
+
+        Returns:
+            list: Events found in complete lines of the chunk
+        """
+        buffer = self._buffer + data if self._buffer else data
+        events = []
+        start = 0
+        length = len(buffer)
+        while start < length:
+            end_n = buffer.find(b'\n', start)
+            end_r = buffer.find(b'\r', start, end_n if end_n >= 0 else length)
+            end = end_r if end_r >= 0 else end_n
+            if end < 0:
+                break
+            if end > start:
+                self._parse_line(buffer[start:end], events)
+            start = end + 1
+        self._buffer = buffer[start:]
+        return events
+
+    def close(self):
+        """Parse rest of output without line end
+
+        Returns:
+            list: Events found in the rest
+        """
+        events = []
+        if self._buffer:
+            self._parse_line(self._buffer, events)
+            self._buffer = b''
+        return events
+
+    @staticmethod
+    def _parse_line(line, events):
+        if line[:1] == b'[':
+            if b'[#' in line:
+                for match in _READOUT.finditer(line.decode('utf-8',
+                                                           'replace')):
+                    events.append(ProgressParser._readout(match.group(1),
+                                                          match.group(2)))
+            return
+        if b'|' not in line:
+            return
+        match = _RESULT.match(line.decode('utf-8', 'replace'))
+        if match is None:
+            return
+        gid, status, speed, path = match.groups()
+        if status == 'OK':
+            events.append(CompleteEvent(gid, parse_size(speed.strip()) or 0,
+                                        path))
+        else:
+            events.append(ErrorEvent(gid, status, path))
+
+    @staticmethod
+    def _readout(gid, body):
+        event = ProgressEvent(gid)
+        for token in body.split(' '):
+            if token.startswith('CN:'):
+                event.connections = int(token[3:])
+            elif token.startswith('DL:'):
+                event.speed = parse_size(token[3:]) or 0
+            elif token.startswith('ETA:'):
+                event.eta = parse_eta(token[4:])
+            elif '/' in token:
+                completed, _, total = token.partition('/')
+                event.completed = parse_size(completed) or 0
+                event.total = parse_size(total) or 0
+        return event
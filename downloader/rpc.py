@@ -0,0 +1,177 @@
+"""JSON-RPC client for aria2c daemon"""
+
+import base64
+import http.client
+import itertools
+import json
+import threading
+import urllib.parse
+
+__all__ = ['Aria2RPC', 'RPCError']
+
+
+class RPCError(Exception):
+    """Error returned by aria2c JSON-RPC interface"""
+    def __init__(self, code, message):
+        super(RPCError, self).__init__('{} (code {})'.format(message, code))
+        self.code = code
+        self.message = message
+
+
+class Aria2RPC(object):
+    """Client for aria2c JSON-RPC interface
+
+    One HTTP connection is kept open and reused for all calls, so submitting
+    many jobs doesn't pay for TCP handshake on every call.
+    """
+    def __init__(self, url='http://localhost:6800/jsonrpc', secret=None,
+                 timeout=10):
+        parsed = urllib.parse.urlsplit(url)
+        self._url = url
+        self._host = parsed.hostname
+        self._port = parsed.port or 6800
+        self._path = parsed.path or '/jsonrpc'
+        self._secret = secret
+        self._timeout = timeout
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def url(self):
+        """str: URL of the JSON-RPC endpoint"""
+        return self._url
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(
+                self._host, self._port, timeout=self._timeout)
+        return self._connection
+
+    def close(self):
+        """Close connection to the daemon"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _params(self, params):
+        if self._secret is None:
+            return list(params)
+        return ['token:{}'.format(self._secret)] + list(params)
+
+    def _post(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        with self._lock:
+            for attempt in range(2):
+                connection = self._connect()
+                try:
+                    connection.request('POST', self._path, body, headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.HTTPException, ConnectionError):
+                    # Daemon closed the kept-alive connection, reconnect once
+                    connection.close()
+                    self._connection = None
+                    if attempt:
+                        raise
+        return json.loads(data.decode('utf-8'))
+
+    @staticmethod
+    def _result(response):
+        if 'error' in response:
+            raise RPCError(response['error'].get('code'),
+                           response['error'].get('message'))
+        return response['result']
+
+    def call(self, method, *params):
+        """Call RPC method
+
+        Arguments:
+            method (str): Method name e.g. 'aria2.addUri'
+            *params: Method parameters without secret token
+
+        Returns:
+            Result of the call
+
+        Raises:
+            RPCError: When aria2c returns error
+            OSError: When daemon is not reachable
+        """
+        return self._result(self._post({
+            'jsonrpc': '2.0',
+            'id': next(self._ids),
+            'method': method,
+            'params': self._params(params)
+        }))
+
+    def multicall(self, calls):
+        """Call several RPC methods in one request
+
+        Arguments:
+            calls (list): List of (method, params) tuples
+
+        Returns:
+            list: Results of the calls in the same order
+        """
+        payload = [{
+            'jsonrpc': '2.0',
+            'id': next(self._ids),
+            'method': method,
+            'params': self._params(params)
+        } for method, params in calls]
+        if not payload:
+            return []
+        return [self._result(response) for response in self._post(payload)]
+
+    def get_version(self):
+        return self.call('aria2.getVersion')
+
+    def add_uri(self, uris, options=None):
+        return self.call('aria2.addUri', list(uris), options or {})
+
+    def add_torrent(self, torrent, uris=None, options=None):
+        return self.call('aria2.addTorrent',
+                         base64.b64encode(torrent).decode('ascii'),
+                         list(uris or []), options or {})
+
+    def add_metalink(self, metalink, options=None):
+        return self.call('aria2.addMetalink',
+                         base64.b64encode(metalink).decode('ascii'),
+                         options or {})
+
+    def tell_status(self, gid, keys=None):
+        if keys is None:
+            return self.call('aria2.tellStatus', gid)
+        return self.call('aria2.tellStatus', gid, list(keys))
+
+    def tell_active(self, keys=None):
+        if keys is None:
+            return self.call('aria2.tellActive')
+        return self.call('aria2.tellActive', list(keys))
+
+    def remove(self, gid):
+        return self.call('aria2.remove', gid)
+
+    def pause(self, gid):
+        return self.call('aria2.pause', gid)
+
+    def unpause(self, gid):
+        return self.call('aria2.unpause', gid)
+
+    def change_position(self, gid, pos, how='POS_SET'):
+        return self.call('aria2.changePosition', gid, pos, how)
+
+    def shutdown(self):
+        return self.call('aria2.shutdown')
+
+    def change_option(self, gid, options):
+        return self.call('aria2.changeOption', gid, options)
+
+    def change_global_option(self, options):
+        return self.call('aria2.changeGlobalOption', options)
+
+    def get_global_stat(self):
+        return self.call('aria2.getGlobalStat')
@@ -0,0 +1,313 @@
+"""Per URL credentials and options from a rule file
+
+Rule file is a JSON list, every rule has one of host, prefix or glob:
+
+    [
+        {"host": "*.cdn.example.com",
+         "options": {"split": 4, "max_connection_per_server": 4}},
+        {"host": "artifacts.example.com",
+         "options": {"load_cookies": "/home/me/cookies.txt"}},
+        {"prefix": "https://teamcity.example.com/guestAuth/",
+         "credentials": "team_city_user"},
+        {"glob": "https://*.example.org/releases/*.iso",
+         "options": {"split": 16}}
+    ]
+
+Host is exact name or '*.' followed by domain, which matches its subdomains.
+Prefix matches URLs in the same or deeper path, glob uses fnmatch syntax
+against the whole URL. Options are per download options of Aria2c by
+attribute name. Credentials name a User in downloader/secret.py, so rule
+files don't hold passwords.
+
+Rules are compiled into a trie of reversed host labels and a trie of URL
+path segments, host and prefix rules cost one step per label and segment
+whatever their number. Glob is stored under its literal leading segments
+and its pattern is checked against every URL reaching them, so a glob with
+a wildcard in scheme or host is checked against every URL, keep such globs
+few. All matching rules apply, the more specific over the less
+specific: wildcard host, exact host, then prefix and glob by number of
+literal path segments, rules of the same kind in file order.
+"""
+
+import fnmatch
+import json
+import os
+import re
+from collections import OrderedDict
+
+from .options import BY_ATTR, JOB
+from .settings import Settings
+
+__all__ = ['Rule', 'RuleSet', 'Match', 'BUILTIN', 'default_path']
+
+_WILDCARD = re.compile(r'[*?[]')
+
+# Credentials of the TeamCity server used before rule files existed
+BUILTIN = ({'prefix': 'https://teamcity.sencha.com/',
+            'credentials': 'team_city_user'},)
+
+
+def default_path():
+    """str: $XDG_CONFIG_HOME/downloader/rules.json or
+    ~/.config/downloader/rules.json
+    """
+    return os.path.join(os.environ.get('XDG_CONFIG_HOME') or
+                        os.path.join(os.path.expanduser('~'), '.config'),
+                        'downloader', 'rules.json')
+
+
+def _segments(url):
+    """URL split by '/' with scheme and host in lower case"""
+    scheme, separator, rest = url.partition('://')
+    if not separator:
+        return url.split('/')
+    netloc, _, path = rest.partition('/')
+    segments = [scheme.lower() + ':', '', netloc.lower()]
+    if path:
+        segments.extend(path.split('/'))
+    return segments
+
+
+def _hostname(url):
+    netloc = url.partition('://')[2].partition('/')[0]
+    host = netloc.rpartition('@')[2]
+    if host.startswith('['):
+        return host.partition(']')[0] + ']'
+    return host.partition(':')[0].lower()
+
+
+class Rule(object):
+    """Options and credentials for matching URLs
+
+    Arguments:
+        host (str): Host name or '*.domain'
+        prefix (str): URL prefix
+        glob (str): fnmatch pattern of the whole URL
+        options (dict): Per download options by attribute name
+        credentials (str): Name of User in downloader/secret.py
+
+    Raises:
+        ValueError: When rule doesn't have exactly one pattern, option is
+            not a per download option or its file doesn't exist
+        TypeError: When option value has wrong type
+    """
+    __slots__ = ('host', 'prefix', 'glob', 'options', 'credentials',
+                 '_regex')
+
+    def __init__(self, host=None, prefix=None, glob=None, options=None,
+                 credentials=None):
+        if sum(pattern is not None for pattern in (host, prefix, glob)) != 1:
+            raise ValueError('Rule has to have one of host, prefix or glob')
+        self.host = host.lower() if host is not None else None
+        self.prefix = prefix
+        self.glob = glob
+        self.options = OrderedDict()
+        for attr, value in (options or {}).items():
+            option = BY_ATTR.get(attr)
+            if option is None:
+                raise ValueError('Unknown option {}'.format(attr))
+            if option.scope != JOB:
+                raise ValueError('{} is not per download option'
+                                 .format(option.label))
+            self.options[attr] = option.check(option.convert(value))
+        self.credentials = credentials
+        self._regex = (re.compile(fnmatch.translate(glob))
+                       if glob is not None else None)
+
+    def matches(self, url):
+        """Whether glob matches URL, other patterns are matched by RuleSet
+
+        Arguments:
+            url (str): URL
+
+        Returns:
+            bool: True if URL matches
+        """
+        return self._regex is None or self._regex.match(url) is not None
+
+
+class Match(object):
+    """Options and credentials merged from all rules matching a URL
+
+    Arguments:
+        rules (list): Matching rules from the least specific
+    """
+    __slots__ = ('options', 'credentials', '_settings')
+
+    def __init__(self, rules):
+        self.options = OrderedDict()
+        self.credentials = None
+        for rule in rules:
+            self.options.update(rule.options)
+            if rule.credentials is not None:
+                self.credentials = rule.credentials
+        self._settings = {}
+
+    def user(self):
+        """Credentials from downloader/secret.py
+
+        Returns:
+            user.User: Credentials, None when no rule names them
+
+        Raises:
+            LookupError: When secret.py or the named User is missing
+        """
+        if self.credentials is None:
+            return None
+        try:
+            from . import secret
+            return getattr(secret, self.credentials)
+        except (ImportError, AttributeError):
+            raise LookupError('Credentials {} are missing, create '
+                              'downloader/secret.py as described in README'
+                              .format(self.credentials))
+
+    def aria2c_options(self):
+        """Options for aria2c input file and RPC
+
+        Returns:
+            OrderedDict: Serialized values by aria2c option name
+        """
+        options = OrderedDict((BY_ATTR[attr].name,
+                               BY_ATTR[attr].serialize(value))
+                              for attr, value in self.options.items())
+        user = self.user()
+        if user is not None:
+            options['http-user'] = user.username
+            options['http-passwd'] = user.password
+        return options
+
+    def apply(self, aria2c):
+        """Set options and credentials on download
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download
+        """
+        for attr, value in self.options.items():
+            setattr(aria2c, attr, value)
+        user = self.user()
+        if user is not None:
+            aria2c.http_user = user.username
+            aria2c.http_passwd = user.password
+
+    def settings(self, base='default'):
+        """Settings profile with options of the rules
+
+        Settings are built once per profile and shared by all URLs matching
+        the same rules.
+
+        Arguments:
+            base (str): Name of profile from Settings.PROFILES
+
+        Returns:
+            settings.Settings: Merged settings
+        """
+        settings = self._settings.get(base)
+        if settings is None:
+            settings = self._settings[base] = Settings(base)
+            for attr, value in self.options.items():
+                setattr(settings, attr, value)
+        return settings
+
+
+class RuleSet(object):
+    """Rules compiled for matching many URLs
+
+    Arguments:
+        rules (iterable): Rule instances in file order
+    """
+    def __init__(self, rules=()):
+        self._rules = []
+        self._hosts = {}
+        self._domains = {}
+        self._paths = {}
+        self._matches = {}
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def load(cls, path=None, builtin=True):
+        """Read rule file
+
+        Arguments:
+            path (str): JSON rule file, None for no file
+            builtin (bool): Start with BUILTIN rules
+
+        Returns:
+            RuleSet: Compiled rules
+        """
+        rules = [Rule(**rule) for rule in BUILTIN] if builtin else []
+        if path is not None:
+            with open(path) as stream:
+                rules.extend(Rule(**rule) for rule in json.load(stream))
+        return cls(rules)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def add(self, rule):
+        """Compile rule into the index
+
+        Arguments:
+            rule (Rule): Rule, more specific than earlier rules of its kind
+        """
+        index = len(self._rules)
+        self._rules.append(rule)
+        self._matches.clear()
+        if rule.host is not None:
+            if rule.host.startswith('*.'):
+                node = self._domains
+                for label in reversed(rule.host[2:].split('.')):
+                    node = node.setdefault(label, {})
+                node.setdefault(None, []).append(index)
+            else:
+                self._hosts.setdefault(rule.host, []).append(index)
+            return
+        if rule.prefix is not None:
+            segments = _segments(rule.prefix.rstrip('/'))
+        else:
+            segments = []
+            for segment in _segments(rule.glob):
+                if _WILDCARD.search(segment):
+                    break
+                segments.append(segment)
+        node = self._paths
+        for segment in segments:
+            node = node.setdefault(segment, {})
+        node.setdefault(None, []).append(index)
+
+    def match(self, url):
+        """Merge all rules matching URL
+
+        Arguments:
+            url (str): URL
+
+        Returns:
+            Match: Options and credentials, shared by URLs matching the same
+                rules
+        """
+        found = []
+        host = _hostname(url)
+        labels = host.split('.')
+        node = self._domains
+        # '*.domain' needs at least one more label than the domain
+        for depth, label in enumerate(reversed(labels[1:])):
+            node = node.get(label)
+            if node is None:
+                break
+            found.extend((0, depth, index) for index in node.get(None, ()))
+        found.extend((1, 0, index) for index in self._hosts.get(host, ()))
+        node = self._paths
+        for depth, segment in enumerate([None] + _segments(url)):
+            if depth:
+                node = node.get(segment)
+                if node is None:
+                    break
+            found.extend((2, depth, index) for index in node.get(None, ())
+                         if self._rules[index].matches(url))
+        key = tuple(index for _, _, index in sorted(found))
+        match = self._matches.get(key)
+        if match is None:
+            match = self._matches[key] = Match(self._rules[index]
+                                               for index in key)
+        return match
@@ -0,0 +1,169 @@
+"""Host aware scheduler of downloads"""
+
+import threading
+import urllib.parse
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+__all__ = ['HostScheduler']
+
+
+class _Host(object):
+    __slots__ = ('queue', 'jobs', 'connections', 'max_jobs',
+                 'max_connections')
+
+    def __init__(self, max_jobs, max_connections):
+        self.queue = deque()
+        self.jobs = 0
+        self.connections = 0
+        self.max_jobs = max_jobs
+        self.max_connections = max_connections
+
+
+class HostScheduler(object):
+    """Runs downloads within connection and request budgets of every host
+
+    max_connection_per_server of aria2c limits connections of one download
+    only. This scheduler counts connections (min of split and
+    max_connection_per_server) and running downloads per host over all
+    downloads it runs, and starts queued downloads round-robin across hosts
+    so one busy host doesn't hold the others back.
+
+    Arguments:
+        max_jobs (int): Downloads running at once over all hosts
+        max_jobs_per_host (int): Downloads running at once per host
+        max_connections_per_host (int): Connections at once per host
+        runner (callable): Runs one download and returns its result,
+            Aria2c.run by default
+    """
+    def __init__(self, max_jobs=16, max_jobs_per_host=4,
+                 max_connections_per_host=16, runner=None):
+        for label, value in (('Max jobs', max_jobs),
+                             ('Max jobs per host', max_jobs_per_host),
+                             ('Max connections per host',
+                              max_connections_per_host)):
+            if type(value) is not int:
+                raise TypeError('{} has to be integer'.format(label))
+            if value < 1:
+                raise ValueError('{} has to be equal or larger then 1'
+                                 .format(label))
+        self._max_jobs = max_jobs
+        self._max_jobs_per_host = max_jobs_per_host
+        self._max_connections_per_host = max_connections_per_host
+        self._runner = runner or (lambda aria2c: aria2c.run())
+        self._hosts = OrderedDict()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_jobs)
+
+    def _host(self, name):
+        host = self._hosts.get(name)
+        if host is None:
+            host = self._hosts[name] = _Host(self._max_jobs_per_host,
+                                             self._max_connections_per_host)
+        return host
+
+    def set_budget(self, host, max_jobs=None, max_connections=None):
+        """Change budget of one host
+
+        Arguments:
+            host (str): Host name
+            max_jobs (int): Downloads running at once
+            max_connections (int): Connections at once
+        """
+        with self._lock:
+            budget = self._host(host)
+            if max_jobs is not None:
+                budget.max_jobs = max_jobs
+            if max_connections is not None:
+                budget.max_connections = max_connections
+            self._dispatch()
+
+    def submit(self, aria2c):
+        """Queue download
+
+        Arguments:
+            aria2c (aria2c.Aria2c): Download with uri
+
+        Returns:
+            concurrent.futures.Future: Result of the runner
+        """
+        future = Future()
+        name = urllib.parse.urlsplit(aria2c.uri or '').hostname or ''
+        with self._lock:
+            self._host(name).queue.append((aria2c, future))
+            self._dispatch()
+        return future
+
+    def queue_depth(self):
+        """Queued downloads per host
+
+        Returns:
+            dict: Number of queued downloads by host name
+        """
+        with self._lock:
+            return dict((name, len(host.queue))
+                        for name, host in self._hosts.items())
+
+    def in_flight(self):
+        """Running downloads and their connections per host
+
+        Returns:
+            dict: (downloads, connections) by host name
+        """
+        with self._lock:
+            return dict((name, (host.jobs, host.connections))
+                        for name, host in self._hosts.items() if host.jobs)
+
+    @staticmethod
+    def _cost(aria2c, host):
+        return min(aria2c.split, aria2c.max_connection_per_server,
+                   host.max_connections)
+
+    def _dispatch(self):
+        """Start queued downloads while budgets allow, caller holds the lock"""
+        started = True
+        while started and self._running < self._max_jobs:
+            started = False
+            for name, host in list(self._hosts.items()):
+                if not host.queue or host.jobs >= host.max_jobs:
+                    continue
+                aria2c, future = host.queue[0]
+                cost = self._cost(aria2c, host)
+                if host.connections + cost > host.max_connections:
+                    continue
+                host.queue.popleft()
+                host.jobs += 1
+                host.connections += cost
+                self._running += 1
+                self._hosts.move_to_end(name)
+                self._executor.submit(self._run, host, aria2c, future, cost)
+                started = True
+                break
+
+    def _run(self, host, aria2c, future, cost):
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(self._runner(aria2c))
+            except BaseException as error:
+                future.set_exception(error)
+        with self._lock:
+            host.jobs -= 1
+            host.connections -= cost
+            self._running -= 1
+            self._dispatch()
+            if self._running == 0:
+                self._idle.notify_all()
+
+    def join(self):
+        """Wait until all queued downloads finish"""
+        with self._lock:
+            while self._running or any(host.queue
+                                       for host in self._hosts.values()):
+                self._idle.wait()
+
+    def shutdown(self):
+        """Wait for queued downloads and stop worker threads"""
+        self.join()
+        self._executor.shutdown()
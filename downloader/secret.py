@@ -0,0 +1,2 @@
+from .user import User
+team_city_user = User(username="u", password="p")
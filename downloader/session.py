@@ -0,0 +1,191 @@
+"""Crash safe journal of a batch of downloads"""
+
+import binascii
+import json
+import os
+import re
+import sqlite3
+
+from .engine import HTTPEngine
+
+__all__ = ['Session', 'completed', 'read_gids']
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    gid TEXT NOT NULL UNIQUE,
+    uris TEXT NOT NULL,
+    options TEXT,
+    path TEXT,
+    status TEXT NOT NULL DEFAULT 'pending'
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+'''
+_GID = re.compile(r'^\s+gid=([0-9a-fA-F]{16})\s*$')
+
+# Options never written to the journal, rules give them again on resume
+CREDENTIALS = ('http-user', 'http-passwd', 'ftp-user', 'ftp-passwd')
+
+PENDING = 'pending'
+COMPLETE = 'complete'
+
+
+def completed(path):
+    """Whether file exists and no control file marks it incomplete
+
+    Arguments:
+        path (str): Downloaded file
+
+    Returns:
+        bool: True if file is complete
+    """
+    return os.path.isfile(path) and not any(
+        os.path.exists(path + suffix)
+        for suffix in ('.aria2', HTTPEngine.CONTROL_SUFFIX))
+
+
+def read_gids(path):
+    """Read GIDs of downloads listed in aria2c session file
+
+    aria2c writes unfinished and failed downloads to the file given by
+    save_session option, in input file format with gid option lines.
+
+    Arguments:
+        path (str): aria2c session file
+
+    Returns:
+        set: GIDs, empty when file doesn't exist
+    """
+    gids = set()
+    try:
+        with open(path) as stream:
+            for line in stream:
+                match = _GID.match(line)
+                if match is not None:
+                    gids.add(match.group(1).lower())
+    except FileNotFoundError:
+        pass
+    return gids
+
+
+class Session(object):
+    """Journal of jobs, their GIDs and completion status in SQLite file
+
+    Every job gets its GID before it is handed to aria2c, so the jobs can be
+    matched with the session file aria2c saves (see save_session and
+    save_session_interval options) even after crash of aria2c or this
+    process. Job is complete when aria2c doesn't list it as unfinished and
+    its file is complete.
+
+    Arguments:
+        path (str): Journal file, created when it doesn't exist
+    """
+    def __init__(self, path):
+        self._path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+    @property
+    def path(self):
+        """str: Journal file"""
+        return self._path
+
+    @property
+    def aria2c_session(self):
+        """str: File used for save_session option of aria2c"""
+        return self._path + '.aria2c'
+
+    def close(self):
+        self._db.close()
+
+    def add(self, jobs):
+        """Record new jobs
+
+        Credentials are left out of stored options.
+
+        Arguments:
+            jobs (iterable): (uris, options, path) tuples, path is where the
+                file is stored, None when not known
+
+        Returns:
+            list: GID of every job, in the same order
+        """
+        rows = []
+        for uris, options, path in jobs:
+            gid = binascii.hexlify(os.urandom(8)).decode('ascii')
+            options = dict((name, value) for name, value in
+                           (options or {}).items() if name not in CREDENTIALS)
+            rows.append((gid, '\t'.join(uris),
+                         json.dumps(options) if options else None, path))
+        with self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.executemany(
+                'INSERT INTO jobs (gid, uris, options, path) '
+                'VALUES (?, ?, ?, ?)', rows)
+        return [row[0] for row in rows]
+
+    def mark(self, gids, status=COMPLETE):
+        """Change status of jobs
+
+        Arguments:
+            gids (iterable): GIDs of the jobs
+            status (str): 'pending' or 'complete'
+        """
+        with self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.executemany('UPDATE jobs SET status = ? WHERE gid = ?',
+                                 ((status, gid) for gid in gids))
+
+    def reconcile(self):
+        """Mark pending jobs which finished as complete
+
+        Returns:
+            int: Number of jobs which are still pending
+        """
+        unfinished = read_gids(self.aria2c_session)
+        pending = self._db.execute(
+            'SELECT gid, path FROM jobs WHERE status = ?',
+            (PENDING,)).fetchall()
+        done = [gid for gid, path in pending if gid not in unfinished and
+                path is not None and completed(path)]
+        self.mark(done)
+        return len(pending) - len(done)
+
+    def unfinished(self, rules=None):
+        """Pending jobs in the order they were added
+
+        GID is included in options, so aria2c keeps it.
+
+        Arguments:
+            rules (rules.RuleSet): Rules giving credentials and options of
+                the first URI of every job again
+
+        Returns:
+            list: (uris, options) tuples
+
+        Raises:
+            LookupError: When credentials named by rules are missing
+        """
+        jobs = []
+        loads = json.loads
+        for gid, uris, options in self._db.execute(
+                'SELECT gid, uris, options FROM jobs WHERE status = ? '
+                'ORDER BY id', (PENDING,)):
+            options = loads(options) if options else {}
+            uris = uris.split('\t')
+            if rules is not None:
+                options.update(rules.match(uris[0]).aria2c_options())
+            options['gid'] = gid
+            jobs.append((uris, options))
+        return jobs
+
+    def counts(self):
+        """Number of jobs by status
+
+        Returns:
+            dict: Count by status
+        """
+        return dict(self._db.execute(
+            'SELECT status, COUNT(*) FROM jobs GROUP BY status'))
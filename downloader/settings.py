@@ -2,46 +2,134 @@
 
 import os
 
-__all__ = ['Settings']
+from .options import BY_ATTR
+
+__all__ = ['Settings', 'cache_dir']
+
+
+def cache_dir():
+    """Directory for state kept between runs, created when missing
+
+    Returns:
+        str: $XDG_CACHE_HOME/downloader or ~/.cache/downloader
+    """
+    path = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                        os.path.join(os.path.expanduser('~'), '.cache'),
+                        'downloader')
+    os.makedirs(path, exist_ok=True)
+    return path
 
 
 class Settings(object):
+    """Named set of option values shared by many downloads
+
+    Only values which differ from option defaults are stored, reading any
+    other option returns its default.
+
+    Arguments:
+        use (str): Name of profile from PROFILES
+    """
+    __slots__ = ('_values',)
+
+    file_allocation_values = BY_ATTR['file_allocation'].choices
+
+    # Workload profiles start from the aria2c manual, compare them by
+    # benchmark profiles on their workload before changing a value
+    PROFILES = {
+        'default': {},
+        'recommended': {
+            'dir': os.path.join(os.path.expanduser('~'), 'Downloads'),
+            'split': 16,
+            'file_allocation': 'falloc',
+            'max_concurrent_downloads': 16,
+            'max_connection_per_server': 16,
+            'min_split_size': 1048576,
+            'enable_dht6': True
+        },
+        # Few large files from a server on the local network: per connection
+        # throughput is high, so the disk is the bottleneck. Larger disk
+        # cache and pieces write in bigger units, async DNS and retry waits
+        # buy nothing at LAN latency.
+        'bulk-lan': {
+            'dir': os.path.join(os.path.expanduser('~'), 'Downloads'),
+            'split': 4,
+            'file_allocation': 'falloc',
+            'max_concurrent_downloads': 4,
+            'max_connection_per_server': 4,
+            'min_split_size': 16777216,
+            'piece_length': 4194304,
+            'disk_cache': 67108864,
+            'enable_mmap': True,
+            'async_dns': False,
+            'max_tries': 3
+        },
+        # Many files of a few MiB or less: connection setup dominates, so
+        # every file gets one connection and many files run at once. No
+        # preallocation, aria2c adapts the number of parallel downloads to
+        # the bandwidth and a stalled server is retried a bit later.
+        'many-small': {
+            'dir': os.path.join(os.path.expanduser('~'), 'Downloads'),
+            'split': 1,
+            'file_allocation': 'none',
+            'max_concurrent_downloads': 64,
+            'max_connection_per_server': 2,
+            'optimize_concurrent_downloads': True,
+            'retry_wait': 2
+        },
+        # One file of many GiB over the internet: all connections to the
+        # server, large pieces keep the control file and seeking small, slow
+        # connections are dropped and retried without limit.
+        'huge-file': {
+            'dir': os.path.join(os.path.expanduser('~'), 'Downloads'),
+            'split': 16,
+            'file_allocation': 'falloc',
+            'max_concurrent_downloads': 1,
+            'max_connection_per_server': 16,
+            'min_split_size': 67108864,
+            'piece_length': 16777216,
+            'disk_cache': 134217728,
+            'lowest_speed_limit': 10240,
+            'max_tries': 0,
+            'retry_wait': 5,
+            'enable_dht6': True
+        }
+    }
+
     def __init__(self, use='default'):
-        self.log = '-'
-        self.dir = os.path.expanduser('~')
-        self.out = None
-        self.split = 5
-        self.file_allocation = 'prealloc'
-        self.file_allocation_values = ['none', 'prealloc', 'trunc',
-                                       'falloc']
-        self.check_integrity = False
-        self.continue_downloading = False
-        self.input_file = None
-        self.max_concurrent_downloads = 5
-        self.force_sequential = False
-        self.max_connection_per_server = 1
-        self.min_split_size = 20971520
-        self.ftp_user = None
-        self.ftp_passwd = None
-        self.http_user = None
-        self.http_passwd = None
-        self.load_cookies = None
-        self.show_files = False
-        self.max_overall_upload_limit = 0
-        self.max_upload_limit = 0
-        self.torrent_file = None
-        self.listen_port = list(range(6881, 7000))
-        self.enable_dht = True
-        self.dht_listen_port = list(range(6881, 7000))
-        self.enable_dht6 = False
-        self.dht_listen_addr6 = None
-        self.metalink_file = None
-
-        if use == 'recommended':
-            self.dir = os.path.join(os.path.expanduser('~'), 'Downloads')
-            self.split = 16
-            self.file_allocation = 'falloc'
-            self.max_concurrent_downloads = 16
-            self.max_connection_per_server = 16
-            self.min_split_size = 1048576
-            self.enable_dht6 = True
+        if use not in self.PROFILES:
+            raise ValueError('Settings has to be one of these profiles: {}'
+                             .format(', '.join(sorted(self.PROFILES))))
+        object.__setattr__(self, '_values', dict(self.PROFILES[use]))
+
+    def __getstate__(self):
+        return self._values
+
+    def __setstate__(self, state):
+        object.__setattr__(self, '_values', dict(state))
+
+    def get(self, name):
+        """Value of option, faster than attribute access
+
+        Arguments:
+            name (str): Attribute name of the option
+
+        Returns:
+            Value from settings or default of the option
+        """
+        values = self._values
+        if name in values:
+            return values[name]
+        return BY_ATTR[name].default
+
+    def __getattr__(self, name):
+        if name not in BY_ATTR:
+            raise AttributeError(name)
+        return self.get(name)
+
+    def __setattr__(self, name, value):
+        if name not in BY_ATTR:
+            raise AttributeError('Unknown option {}'.format(name))
+        if value is None:
+            self._values.pop(name, None)
+        else:
+            self._values[name] = BY_ATTR[name].convert(value)
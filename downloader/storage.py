@@ -0,0 +1,184 @@
+"""Filesystem of download directory, allocation mode and free space
+
+file_allocation 'falloc' fails on filesystems without fallocate() and
+'prealloc' writes the whole file before the download starts, both stall
+aria2c on the wrong filesystem. The filesystem is found in /proc/mounts and
+the fastest mode it handles is picked. Expected sizes of a batch are checked
+against free space before it starts, so it fails at once instead of by
+ENOSPC half way through.
+"""
+
+import errno
+import os
+
+__all__ = ['Volume', 'volume', 'read_mounts', 'check_space', 'FALLOCATE',
+           'NETWORK']
+
+# Filesystems with fallocate() which reserves blocks without writing them,
+# overlay passes it to the upper filesystem (containers), zfs has it since
+# OpenZFS 2.2
+FALLOCATE = frozenset(('ext4', 'xfs', 'btrfs', 'f2fs', 'ocfs2', 'gfs2',
+                       'bcachefs', 'tmpfs', 'overlay', 'zfs'))
+
+# Writes go over network, any preallocation only costs time
+NETWORK = frozenset(('nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ceph',
+                     'glusterfs', 'lustre', 'afs', '9p', 'fuse.sshfs',
+                     'fuse.s3fs', 'fuse.rclone'))
+
+# Larger files are not written with zeros by 'prealloc' before download
+PREALLOC_LIMIT = 64 * 1024 * 1024
+
+
+def _existing(path):
+    """The path or its nearest parent which exists"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def _unescape(field):
+    """Mount point with octal escapes of /proc/mounts decoded"""
+    if '\\' not in field:
+        return field
+    return field.encode().decode('unicode_escape').encode(
+        'latin-1').decode(errors='surrogateescape')
+
+
+def read_mounts(path='/proc/mounts'):
+    """Mounted filesystems
+
+    Arguments:
+        path (str): Mount table
+
+    Returns:
+        list: (mount point, filesystem type, device) in mount order, empty
+            when the table can't be read
+    """
+    mounts = []
+    try:
+        with open(path) as stream:
+            for line in stream:
+                fields = line.split()
+                if len(fields) >= 3:
+                    mounts.append((_unescape(fields[1]), fields[2],
+                                   fields[0]))
+    except OSError:
+        pass
+    return mounts
+
+
+class Volume(object):
+    """Mounted filesystem holding a directory
+
+    Arguments:
+        path (str): Existing path on the filesystem
+        mount_point (str): Where the filesystem is mounted
+        fstype (str): Type from /proc/mounts, None when not known
+        device (str): Mounted device
+    """
+    __slots__ = ('path', 'mount_point', 'fstype', 'device')
+
+    def __init__(self, path, mount_point=None, fstype=None, device=None):
+        self.path = path
+        self.mount_point = mount_point
+        self.fstype = fstype
+        self.device = device
+
+    @property
+    def free(self):
+        """int: Bytes available to unprivileged user"""
+        stat = os.statvfs(self.path)
+        return stat.f_bavail * stat.f_frsize
+
+    @property
+    def network(self):
+        """bool: True for network filesystem"""
+        return self.fstype is not None and (
+            self.fstype in NETWORK or self.fstype.partition('.')[0] in NETWORK)
+
+    def allocation(self, size=None, preferred='falloc'):
+        """The fastest file_allocation mode which is safe on the filesystem
+
+        'none' stays, network filesystems get 'none'. 'falloc' is used
+        wherever fallocate() works, in place of 'prealloc' as well. Elsewhere
+        'prealloc' is kept only for files of known size up to
+        PREALLOC_LIMIT, other files get 'trunc'.
+
+        Arguments:
+            size (int): Size of the file, None when not known
+            preferred (str): Mode from settings or options
+
+        Returns:
+            str: Value of file_allocation option
+        """
+        if preferred == 'none' or self.network:
+            return 'none'
+        if self.fstype in FALLOCATE:
+            return 'falloc' if preferred == 'prealloc' else preferred
+        if preferred == 'prealloc' and size is not None and \
+                size <= PREALLOC_LIMIT:
+            return 'prealloc'
+        return 'trunc'
+
+
+def volume(path, mounts=None):
+    """Filesystem which holds path
+
+    Arguments:
+        path (str): File or directory, doesn't have to exist yet
+        mounts (list): Result of read_mounts(), read when None
+
+    Returns:
+        Volume: Filesystem, with unknown type when /proc/mounts is missing
+    """
+    existing = os.path.realpath(_existing(path))
+    found = Volume(existing)
+    for mount_point, fstype, device in (read_mounts() if mounts is None
+                                        else mounts):
+        inside = (existing == mount_point or mount_point == '/' or
+                  existing.startswith(mount_point.rstrip('/') + '/'))
+        # The last mount of the longest mount point covers the others
+        if inside and (found.mount_point is None or
+                       len(mount_point) >= len(found.mount_point)):
+            found = Volume(existing, mount_point, fstype, device)
+    return found
+
+
+def check_space(files, reserve=0):
+    """Check that expected files fit on their filesystems
+
+    Bytes already on disk of partly downloaded files are subtracted.
+
+    Arguments:
+        files (iterable): (path, size) of every file, size None when not
+            known
+        reserve (int): Bytes which have to stay free on every filesystem
+
+    Returns:
+        dict: Bytes needed by device number of the filesystem
+
+    Raises:
+        OSError: ENOSPC when files don't fit on some filesystem
+    """
+    needed = {}
+    paths = {}
+    for path, size in files:
+        if size is None:
+            continue
+        if os.path.isfile(path):
+            size = max(0, size - os.path.getsize(path))
+        existing = _existing(path)
+        device = os.stat(existing).st_dev
+        needed[device] = needed.get(device, 0) + size
+        paths.setdefault(device, existing)
+    for device, size in needed.items():
+        free = Volume(paths[device]).free
+        if size + reserve > free:
+            raise OSError(errno.ENOSPC,
+                          '{} bytes are needed but only {} bytes are free'
+                          .format(size + reserve, free), paths[device])
+    return needed
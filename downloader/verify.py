@@ -0,0 +1,153 @@
+"""Integrity verification of downloaded files"""
+
+import hashlib
+import mmap
+import os
+import re
+from collections import OrderedDict
+
+__all__ = ['ALGORITHMS', 'parse_checksum', 'parse_manifest', 'file_digest',
+           'verify']
+
+# aria2c checksum type: hashlib name
+ALGORITHMS = OrderedDict([
+    ('md5', 'md5'),
+    ('sha-1', 'sha1'),
+    ('sha-224', 'sha224'),
+    ('sha-256', 'sha256'),
+    ('sha-384', 'sha384'),
+    ('sha-512', 'sha512'),
+])
+
+# Length of hex digest: aria2c checksum type
+_BY_LENGTH = dict((hashlib.new(name).digest_size * 2, algorithm)
+                  for algorithm, name in ALGORITHMS.items())
+_BSD_NAMES = dict((name.upper(), algorithm)
+                  for algorithm, name in ALGORITHMS.items())
+_GNU_LINE = re.compile(r'^\\?([0-9a-fA-F]+) [ *](.+)$')
+_BSD_LINE = re.compile(r'^([A-Z0-9]+) \((.+)\) = ([0-9a-fA-F]+)$')
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def parse_checksum(value):
+    """Split checksum in aria2c format
+
+    Arguments:
+        value (str): Checksum e.g. 'sha-256=9f86d0...'
+
+    Returns:
+        tuple: (type, hex digest in lower case)
+
+    Raises:
+        ValueError: When type is not known or digest has wrong length
+    """
+    algorithm, _, digest = value.partition('=')
+    if algorithm not in ALGORITHMS:
+        raise ValueError('Checksum type has to be one of these values: {}'
+                         .format(', '.join(ALGORITHMS)))
+    if (_BY_LENGTH.get(len(digest)) != algorithm or
+            not re.match(r'^[0-9a-fA-F]+$', digest)):
+        raise ValueError('Checksum has to be hex digest of {}'
+                         .format(algorithm))
+    return algorithm, digest.lower()
+
+
+def parse_manifest(stream):
+    """Read checksum manifest e.g. SHA256SUMS or MD5SUMS
+
+    Both the GNU coreutils format ('<digest>  <name>', '*' before the name
+    in binary mode) and the BSD format ('SHA256 (<name>) = <digest>') are
+    read. Type of GNU lines is told by digest length.
+
+    Arguments:
+        stream: Text stream of the manifest
+
+    Returns:
+        OrderedDict: Checksum in aria2c format by file name
+    """
+    checksums = OrderedDict()
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = _BSD_LINE.match(line)
+        if match is not None and match.group(1) in _BSD_NAMES:
+            name, algorithm, digest = (match.group(2),
+                                       _BSD_NAMES[match.group(1)],
+                                       match.group(3))
+        else:
+            match = _GNU_LINE.match(line)
+            if match is None or len(match.group(1)) not in _BY_LENGTH:
+                raise ValueError('Invalid manifest line: {}'.format(line))
+            digest, name = match.groups()
+            algorithm = _BY_LENGTH[len(digest)]
+        checksums[name] = '{}={}'.format(algorithm, digest.lower())
+    return checksums
+
+
+def file_digest(path, algorithm, chunk_size=CHUNK_SIZE):
+    """Hash file by memory mapped chunks
+
+    The file is mapped instead of read, so its pages go from page cache to
+    the hash without copying through a buffer.
+
+    Arguments:
+        path (str): File
+        algorithm (str): aria2c checksum type e.g. 'sha-256'
+        chunk_size (int): Bytes passed to the hash at once
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.new(ALGORITHMS[algorithm])
+    with open(path, 'rb') as stream:
+        size = os.fstat(stream.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mapped) as view:
+                for offset in range(0, size, chunk_size):
+                    digest.update(view[offset:offset + chunk_size])
+    return digest.hexdigest()
+
+
+def _matches(path, checksum, chunk_size):
+    algorithm, digest = parse_checksum(checksum)
+    return file_digest(path, algorithm, chunk_size) == digest
+
+
+def verify(checksums, workers=None, chunk_size=CHUNK_SIZE):
+    """Check files against their checksums
+
+    Files are hashed in parallel by a pool of processes, the largest first so
+    one big file doesn't finish last. A missing file doesn't match.
+
+    Arguments:
+        checksums (dict): Checksum in aria2c format by file path
+        workers (int): Processes, number of CPUs by default
+        chunk_size (int): Bytes passed to the hash at once
+
+    Returns:
+        dict: True by path of matching file, False otherwise
+    """
+    results = dict((path, False) for path in checksums
+                   if not os.path.isfile(path))
+    paths = sorted((path for path in checksums if path not in results),
+                   key=os.path.getsize, reverse=True)
+    if len(paths) == 1 or workers == 1:
+        for path in paths:
+            results[path] = _matches(path, checksums[path], chunk_size)
+        return results
+    if paths:
+        # multiprocessing costs a download without checksum 8 ms of start
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(min(workers or os.cpu_count() or 1,
+                                     len(paths))) as executor:
+            for path, matches in zip(paths, executor.map(
+                    _matches, paths, [checksums[path] for path in paths],
+                    [chunk_size] * len(paths))):
+                results[path] = matches
+    return results
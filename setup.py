@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='downloader',
@@ -18,7 +18,12 @@ setup(
         'Operating System :: Unix',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Topic :: Home Automation',
         'Topic :: Utilities'
     ],
@@ -27,6 +32,7 @@ setup(
     packages=['downloader'],
     package_dir={'downloader': 'downloader'},
     scripts=[],
+    python_requires='>=3.7',
     install_requires=['Click==6.3'],
     entry_points={
         'console_scripts': [
@@ -0,0 +1,118 @@
+"""Local range capable HTTP server for tests"""
+
+import base64
+import functools
+import os
+import random
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+from downloader.benchmark import RangeRequestHandler
+
+USER = 'user'
+PASSWD = 'pa55-w0rd'
+
+
+class FaultHandler(RangeRequestHandler):
+    """Range handler with faults set on the server
+
+    GET of files with 'secret' in the name needs USER and PASSWD, HEAD is
+    answered without them like by some artifact servers. The first
+    server.failures responses are cut in the middle and server.ranges
+    'ignored' answers range requests by the whole file. ETag changes with
+    size and modification time of the file. Names in server.redirects are
+    answered by 302 to the URL, headers of every request are recorded in
+    server.requests.
+    """
+    def end_headers(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            self.send_header('ETag', '"{:x}-{:x}"'.format(stat.st_mtime_ns,
+                                                          stat.st_size))
+        super(FaultHandler, self).end_headers()
+
+    def send_head(self):
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path,
+                                         dict(self.headers)))
+        location = self.server.redirects.get(self.path.lstrip('/'))
+        if location is not None:
+            self.send_response(302)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        if 'secret' in self.path and self.command == 'GET':
+            expected = 'Basic {}'.format(base64.b64encode(
+                '{}:{}'.format(USER, PASSWD).encode('utf-8')).decode('ascii'))
+            if self.headers.get('Authorization') != expected:
+                self.send_error(401, 'Unauthorized')
+                return None
+        if self.server.ranges == 'ignored':
+            del self.headers['Range']
+        return super(FaultHandler, self).send_head()
+
+    def copyfile(self, source, outputfile):
+        with self.server.lock:
+            cut = self.server.failures > 0
+            if cut:
+                self.server.failures -= 1
+        if cut:
+            self._remaining //= 2
+            self.close_connection = True
+        sent = self._remaining
+        super(FaultHandler, self).copyfile(source, outputfile)
+        with self.server.lock:
+            self.server.sent += sent - self._remaining
+
+
+class RangeServer(ThreadingHTTPServer):
+    """Serves files of a temporary directory on a free port
+
+    Attributes:
+        root (str): Served directory
+        failures (int): Responses still to be cut in the middle
+        ranges (str): 'bytes' or 'ignored'
+        sent (int): Bytes of bodies sent so far
+        redirects (dict): Location of redirected names
+        requests (list): (method, path, headers) of every request
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix='downloader-test-')
+        super(RangeServer, self).__init__(
+            ('127.0.0.1', 0), functools.partial(FaultHandler,
+                                                directory=self.root))
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.ranges = 'bytes'
+        self.sent = 0
+        self.redirects = {}
+        self.requests = []
+        thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+
+    def add(self, name, size):
+        """Create served file of random bytes
+
+        Returns:
+            bytes: Content of the file
+        """
+        data = random.Random(size).getrandbits(8 * size).to_bytes(
+            size, 'little') if size else b''
+        with open(os.path.join(self.root, name), 'wb') as stream:
+            stream.write(data)
+        return data
+
+    def url(self, name):
+        return 'http://127.0.0.1:{}/{}'.format(self.server_address[1], name)
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,81 @@
+"""Autotuner choices and throughput of downloads followed in daemon"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from downloader.autotune import CANDIDATES, Autotuner, size_bucket
+
+from .test_priority import FakeClock
+
+MIB = 1024 * 1024
+
+
+class StatusRPC(object):
+    """Daemon answering tellStatus from a list of statuses"""
+    def __init__(self, statuses, length):
+        self.statuses = list(statuses)
+        self.length = length
+        self.changed = []
+
+    def tell_status(self, gid, keys=None):
+        return {'status': self.statuses.pop(0), 'downloadSpeed': '0',
+                'completedLength': str(self.length)}
+
+    def change_option(self, gid, options):
+        self.changed.append(options)
+
+
+class AutotunerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+        self.tuner = Autotuner(os.path.join(self.dir, 'autotune.json'),
+                               epsilon=0, seed=0)
+        self.clock = FakeClock()
+        patcher = mock.patch('downloader.autotune.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_prior(self):
+        self.assertEqual(size_bucket(None), 'unknown')
+        self.assertEqual(self.tuner.choose('host', 100), CANDIDATES[0])
+        self.assertEqual(self.tuner.choose('host', 64 * MIB),
+                         CANDIDATES[-1])
+        options = self.tuner.options('host', 64 * MIB, ranges=False)
+        self.assertEqual(tuple(options.values()), CANDIDATES[0])
+
+    def test_best_known(self):
+        self.tuner.record('host', 64 * MIB, CANDIDATES[2], 100.0)
+        self.tuner.record('host', 64 * MIB, CANDIDATES[4], 50.0)
+        self.assertEqual(self.tuner.choose('host', 64 * MIB), CANDIDATES[2])
+        # History is shared through the file
+        other = Autotuner(os.path.join(self.dir, 'autotune.json'),
+                          epsilon=0)
+        self.assertEqual(other.expected('host', 64 * MIB), 100.0)
+
+    def test_watch_counts_active_time(self):
+        rpc = StatusRPC(['waiting', 'active', 'paused', 'active',
+                         'complete'], 4000)
+        self.assertEqual(self.tuner.watch(rpc, 'gid', 'host', 4000,
+                                          CANDIDATES[0], interval=2),
+                         'complete')
+        # 8 seconds passed, the download was active for 4 of them
+        self.assertEqual(self.tuner.expected('host', 4000), 1000.0)
+
+    def test_watch_escalates_slow_download(self):
+        self.tuner.record('host', 64 * MIB, CANDIDATES[0], 1000.0)
+        rpc = StatusRPC(['active'] * 4 + ['complete'], 64)
+        self.tuner.watch(rpc, 'gid', 'host', 64 * MIB, CANDIDATES[0],
+                         interval=2, warmup=4)
+        self.assertEqual(rpc.changed, [{
+            'split': '2', 'min-split-size': '8388608',
+            'max-connection-per-server': '2'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Artifact cache against local range server"""
+
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from downloader.aria2c import Aria2c
+from downloader.cache import ArtifactCache, Validators
+from downloader.engine import HTTPEngine
+
+from .server import RangeServer
+
+MIB = 1024 * 1024
+
+
+def run(aria2c):
+    HTTPEngine(aria2c).run()
+    return 0
+
+
+class ValidatorsTest(unittest.TestCase):
+    def test_strong_etag(self):
+        self.assertTrue(Validators('"a"').matches('"a"', None, None))
+        self.assertFalse(Validators('"a"', 'Mon', 1).matches('"b"', 'Mon', 1))
+
+    def test_weak_etag(self):
+        self.assertFalse(Validators('W/"a"').matches('W/"a"', None, None))
+        self.assertTrue(Validators('W/"a"', 'Mon', 1).matches('W/"b"', 'Mon',
+                                                               1))
+        self.assertFalse(Validators(None, 'Mon', 1).matches(None, 'Mon', 2))
+
+
+class ArtifactCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = RangeServer()
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+        self.cache = ArtifactCache(os.path.join(self.dir, 'cache'))
+        self.data = self.server.add('file.bin', 2 * MIB)
+
+    def tearDown(self):
+        self.cache.close()
+        self.server.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def job(self, out):
+        aria2c = Aria2c()
+        aria2c.uri = self.server.url('file.bin')
+        aria2c.dir = self.dir
+        aria2c.out = os.path.join(self.dir, out)
+        return aria2c
+
+    def digest(self):
+        return hashlib.sha256(self.data).hexdigest()
+
+    def verifies(self):
+        with open(self.cache.object_path(self.digest()), 'rb') as stream:
+            return hashlib.sha256(stream.read()).hexdigest() == self.digest()
+
+    def test_miss_then_hit(self):
+        self.assertFalse(self.cache.fetch(self.job('first.bin'), run))
+        self.server.sent = 0
+        self.assertTrue(self.cache.fetch(self.job('second.bin'), run))
+        self.assertEqual(self.server.sent, 0)
+        with open(os.path.join(self.dir, 'second.bin'), 'rb') as stream:
+            self.assertEqual(stream.read(), self.data)
+
+    def test_changed_file(self):
+        self.cache.fetch(self.job('first.bin'), run)
+        self.data = self.server.add('file.bin', 2 * MIB + 1)
+        self.assertFalse(self.cache.fetch(self.job('second.bin'), run))
+
+    def test_downloads_stay_writable(self):
+        job = self.job('first.bin')
+        self.cache.fetch(job, run)
+        restored = self.job('second.bin')
+        self.assertTrue(self.cache.fetch(restored, run))
+        for path in (job.path, restored.path):
+            info = os.stat(path)
+            self.assertEqual(info.st_nlink, 1)
+            self.assertTrue(info.st_mode & stat.S_IWUSR)
+            # Rewritten in place like by aria2c --allow-overwrite
+            with open(path, 'r+b') as stream:
+                stream.write(b'changed')
+        self.assertTrue(self.verifies())
+
+    def test_hardlink_rejected(self):
+        with self.assertRaises(ValueError):
+            ArtifactCache(os.path.join(self.dir, 'other'),
+                          link_mode='hardlink')
+
+    def test_evict(self):
+        cache = ArtifactCache(os.path.join(self.dir, 'small'),
+                              max_size=MIB)
+        try:
+            cache.fetch(self.job('first.bin'), run)
+            self.assertFalse(os.path.exists(cache.object_path(
+                self.digest())))
+        finally:
+            cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Coordinator with local worker processes"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from downloader.aria2c import Aria2c
+from downloader.distributed import Coordinator
+from downloader.engine import EngineError
+
+from .server import PASSWD, USER, RangeServer
+
+MIB = 1024 * 1024
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Joins the arguments and runs them by shell without environment, like ssh
+SSH = [sys.executable, '-c',
+       'import subprocess, sys; sys.exit(subprocess.call('
+       '" ".join(sys.argv[2:]), shell=True, env={"PYTHONPATH": sys.argv[1]}))',
+       ROOT]
+
+
+class CoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        self.server = RangeServer()
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+        # Workers import the package from the checkout
+        self.path = os.environ.get('PYTHONPATH')
+        os.environ['PYTHONPATH'] = os.pathsep.join(
+            [ROOT] + ([self.path] if self.path else []))
+
+    def tearDown(self):
+        if self.path is None:
+            del os.environ['PYTHONPATH']
+        else:
+            os.environ['PYTHONPATH'] = self.path
+        self.server.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def job(self, name, **options):
+        aria2c = Aria2c()
+        aria2c.uri = self.server.url(name)
+        aria2c.dir = self.dir
+        aria2c.split = 4
+        aria2c.min_split_size = MIB
+        for attr, value in options.items():
+            setattr(aria2c, attr, value)
+        return aria2c
+
+    def read(self, name):
+        with open(os.path.join(self.dir, name), 'rb') as stream:
+            return stream.read()
+
+    def test_download(self):
+        data = self.server.add('file.bin', 4 * MIB + 5)
+        digest = hashlib.sha256(data).hexdigest()
+        coordinator = Coordinator(self.job(
+            'file.bin', checksum='sha-256={}'.format(digest)), workers=2)
+        self.assertEqual(coordinator.run(),
+                         os.path.join(self.dir, 'file.bin'))
+        self.assertEqual(self.read('file.bin'), data)
+
+    def test_failed_range_reassigned(self):
+        data = self.server.add('file.bin', 4 * MIB)
+        # The first worker fails on every range, the other one takes them
+        Coordinator(self.job('file.bin'), workers=[['false'], []]).run()
+        self.assertEqual(self.read('file.bin'), data)
+
+    def test_range_fails_max_tries(self):
+        self.server.add('file.bin', 2 * MIB)
+        with self.assertRaises(EngineError):
+            Coordinator(self.job('file.bin'),
+                        workers=[['false'], ['false']]).run()
+
+    def test_credentials(self):
+        data = self.server.add('secret.bin', 2 * MIB)
+        coordinator = Coordinator(
+            self.job('secret.bin', http_user=USER, http_passwd=PASSWD),
+            workers=[SSH, SSH], python=sys.executable)
+        command = coordinator.command(SSH, 0, MIB - 1)
+        self.assertNotIn(PASSWD, ' '.join(command))
+        self.assertIn('--credentials-stdin', command)
+        coordinator.run()
+        self.assertEqual(self.read('secret.bin'), data)
+
+    def test_remote_quoting(self):
+        data = self.server.add('file.bin', 2 * MIB)
+        marker = os.path.join(self.dir, 'injected')
+        # No spaces in URL, ${IFS} splits the command for the shell
+        url = '{}?a=1&b=$(touch${{IFS}}{});c=1'.format(
+            self.server.url('file.bin'), marker)
+        job = self.job('file.bin', out=os.path.join(self.dir, 'my file.bin'))
+        job.uri = url
+        Coordinator(job, workers=[SSH, SSH], python=sys.executable).run()
+        self.assertEqual(self.read('my file.bin'), data)
+        self.assertFalse(os.path.exists(marker))
+
+    def test_workers(self):
+        with self.assertRaises(ValueError):
+            Coordinator(self.job('file.bin'), workers=0)
+        with self.assertRaises(ValueError):
+            Coordinator(self.job('file.bin'), workers=[])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+"""Built-in segmented engine against local range server"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from downloader.aria2c import Aria2c
+from downloader.engine import (EngineError, HTTPEngine, follow_redirects,
+                               request_headers)
+from downloader.mirrors import probe
+from downloader.preflight import head
+
+from .server import PASSWD, USER, RangeServer
+
+MIB = 1024 * 1024
+
+
+class EngineTest(unittest.TestCase):
+    def setUp(self):
+        self.server = RangeServer()
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def job(self, name, **options):
+        aria2c = Aria2c()
+        aria2c.uri = self.server.url(name)
+        aria2c.dir = self.dir
+        aria2c.split = 4
+        aria2c.max_connection_per_server = 4
+        aria2c.min_split_size = MIB
+        for attr, value in options.items():
+            setattr(aria2c, attr, value)
+        return aria2c
+
+    def read(self, name):
+        with open(os.path.join(self.dir, name), 'rb') as stream:
+            return stream.read()
+
+    def control(self, name):
+        return os.path.join(self.dir, name + HTTPEngine.CONTROL_SUFFIX)
+
+    def test_segments(self):
+        engine = HTTPEngine(self.job('file.bin'))
+        self.assertEqual(engine.segments(0), [[0, -1, 0]])
+        self.assertEqual(engine.segments(MIB // 2), [[0, MIB // 2 - 1, 0]])
+        self.assertEqual(engine.segments(4 * MIB),
+                         [[first, first + MIB - 1, 0]
+                          for first in range(0, 4 * MIB, MIB)])
+        self.assertEqual(len(engine.segments(100 * MIB)), 4)
+
+    def test_download(self):
+        data = self.server.add('file.bin', 4 * MIB + 3)
+        engine = HTTPEngine(self.job('file.bin'))
+        self.assertEqual(engine.run(), os.path.join(self.dir, 'file.bin'))
+        self.assertEqual(self.read('file.bin'), data)
+        self.assertEqual(engine.completed, len(data))
+        self.assertFalse(os.path.exists(self.control('file.bin')))
+
+    def test_empty_file(self):
+        self.server.add('empty.bin', 0)
+        HTTPEngine(self.job('empty.bin')).run()
+        self.assertEqual(self.read('empty.bin'), b'')
+        self.assertFalse(os.path.exists(self.control('empty.bin')))
+
+    def test_ignored_ranges(self):
+        self.server.add('file.bin', 2 * MIB)
+        self.server.ranges = 'ignored'
+        # Server sends Accept-Ranges but answers ranges by 200, repeating
+        # the request doesn't help even with unlimited tries
+        with self.assertRaises(EngineError):
+            HTTPEngine(self.job('file.bin', max_tries=0)).run()
+
+    def test_retry(self):
+        data = self.server.add('file.bin', 4 * MIB)
+        self.server.failures = 2
+        engine = HTTPEngine(self.job('file.bin', max_tries=0))
+        engine.run()
+        self.assertEqual(self.read('file.bin'), data)
+        self.assertEqual(engine.retries, 2)
+
+    def test_resume(self):
+        data = self.server.add('file.bin', 4 * MIB)
+        self.server.failures = 1
+        with self.assertRaises(EngineError):
+            HTTPEngine(self.job('file.bin', max_tries=1)).run()
+        self.assertTrue(os.path.exists(self.control('file.bin')))
+
+        self.server.sent = 0
+        engine = HTTPEngine(self.job('file.bin', continue_downloading=True))
+        engine.run()
+        self.assertEqual(self.read('file.bin'), data)
+        # Only the missing half of the cut segment is downloaded again
+        self.assertEqual(self.server.sent, MIB // 2)
+        self.assertFalse(os.path.exists(self.control('file.bin')))
+
+    def test_resume_sequential_file(self):
+        data = self.server.add('file.bin', 4 * MIB)
+        with open(os.path.join(self.dir, 'file.bin'), 'wb') as stream:
+            stream.write(data[:3 * MIB])
+        HTTPEngine(self.job('file.bin', continue_downloading=True)).run()
+        self.assertEqual(self.read('file.bin'), data)
+        self.assertEqual(self.server.sent, MIB)
+
+    def test_credentials(self):
+        data = self.server.add('secret.bin', 2 * MIB)
+        # 401 isn't repeated even with unlimited tries
+        with self.assertRaises(EngineError):
+            HTTPEngine(self.job('secret.bin', max_tries=0)).run()
+        HTTPEngine(self.job('secret.bin', http_user=USER,
+                            http_passwd=PASSWD)).run()
+        self.assertEqual(self.read('secret.bin'), data)
+
+    def test_checksum(self):
+        data = self.server.add('file.bin', MIB)
+        digest = hashlib.sha256(data).hexdigest()
+        HTTPEngine(self.job('file.bin',
+                            checksum='sha-256={}'.format(digest))).run()
+        with self.assertRaises(EngineError):
+            HTTPEngine(self.job('file.bin',
+                                checksum='sha-256={}'.format('0' * 64))).run()
+
+    def test_fetch_range(self):
+        data = self.server.add('file.bin', 2 * MIB)
+        path = os.path.join(self.dir, 'part.bin')
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, len(data))
+            written = HTTPEngine(self.job('file.bin')).fetch(fd, MIB,
+                                                             MIB + 99)
+        finally:
+            os.close(fd)
+        self.assertEqual(written, 100)
+        self.assertEqual(self.read('part.bin')[MIB:MIB + 100],
+                         data[MIB:MIB + 100])
+
+
+class RedirectTest(unittest.TestCase):
+    """Credentials follow redirects only within the same origin"""
+    def setUp(self):
+        self.server = RangeServer()
+        self.other = RangeServer()
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+        self.data = self.server.add('secret.bin', MIB)
+        self.other.add('mirror.bin', MIB)
+        self.server.redirects['secret-link'] = self.server.url('secret.bin')
+        self.server.redirects['moved'] = self.other.url('mirror.bin')
+        aria2c = Aria2c()
+        aria2c.http_user = USER
+        aria2c.http_passwd = PASSWD
+        self.headers = dict(request_headers(aria2c), Cookie='session=1')
+
+    def tearDown(self):
+        self.server.close()
+        self.other.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def leaked(self):
+        return [headers for _, _, headers in self.other.requests
+                if 'Authorization' in headers or 'Cookie' in headers]
+
+    def test_engine(self):
+        for name in ('secret-link', 'moved'):
+            aria2c = Aria2c()
+            aria2c.uri = self.server.url(name)
+            aria2c.dir = self.dir
+            aria2c.out = os.path.join(self.dir, name)
+            aria2c.http_user = USER
+            aria2c.http_passwd = PASSWD
+            HTTPEngine(aria2c).run()
+        with open(os.path.join(self.dir, 'secret-link'), 'rb') as stream:
+            self.assertEqual(stream.read(), self.data)
+        self.assertTrue(self.other.requests)
+        self.assertEqual(self.leaked(), [])
+
+    def test_head(self):
+        self.assertEqual(head(self.server.url('secret-link'),
+                              self.headers).size, MIB)
+        self.assertEqual(head(self.server.url('moved'), self.headers).size,
+                         MIB)
+        self.assertEqual(self.leaked(), [])
+        self.assertIn('Cookie', self.server.requests[-2][2])
+
+    def test_probe(self):
+        self.assertFalse(probe(self.server.url('secret-link'), 1024,
+                               headers=self.headers).failed)
+        self.assertFalse(probe(self.server.url('moved'), 1024,
+                               headers=self.headers).failed)
+        self.assertEqual(self.leaked(), [])
+
+    def test_too_many_redirects(self):
+        self.server.redirects['loop'] = self.server.url('loop')
+        with self.assertRaises(ValueError):
+            head(self.server.url('loop'))
+        self.assertEqual(probe(self.server.url('loop')).error,
+                         'Too many redirects')
+
+    def test_send(self):
+        class Response(object):
+            status = 302
+
+            def __init__(self, location):
+                self.location = location
+
+            def getheader(self, name):
+                return self.location
+
+            def read(self):
+                pass
+
+        sent = []
+        locations = iter(['/same', 'https://example.com:443/port',
+                          'http://example.com/scheme', '/back', None])
+
+        def send(url, headers):
+            sent.append((url, sorted(headers)))
+            return Response(next(locations))
+
+        url, _ = follow_redirects('https://example.com/first',
+                                  self.headers, send)
+        self.assertEqual(url, 'http://example.com/back')
+        # Default port is the same origin, once dropped they stay dropped
+        self.assertEqual(sent, [
+            ('https://example.com/first', ['Authorization', 'Cookie']),
+            ('https://example.com/same', ['Authorization', 'Cookie']),
+            ('https://example.com:443/port', ['Authorization', 'Cookie']),
+            ('http://example.com/scheme', []),
+            ('http://example.com/back', [])])
+        with self.assertRaises(ValueError):
+            follow_redirects('ftp://example.com/file', {}, send)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Bandwidth policy and governor of aria2c daemon"""
+
+import datetime
+import unittest
+
+from downloader.governor import Governor, Policy, Window
+from downloader.rpc import RPCError
+
+# Monday
+MONDAY = datetime.date(2024, 1, 1)
+
+
+def at(time, day=0):
+    hours, minutes = (int(part) for part in time.split(':'))
+    return datetime.datetime.combine(
+        MONDAY + datetime.timedelta(days=day),
+        datetime.time(hours, minutes))
+
+
+class FakeRPC(object):
+    """Records calls of the governor"""
+    def __init__(self, active=()):
+        self.active = list(active)
+        self.finished = set()
+        self.calls = []
+
+    def change_global_option(self, options):
+        self.calls.append(('changeGlobalOption', options))
+
+    def tell_active(self, keys=None):
+        return self.active
+
+    def change_option(self, gid, options):
+        if gid in self.finished:
+            raise RPCError(1, 'Active Download not found for GID#' + gid)
+        self.calls.append(('changeOption', [gid, options]))
+        return 'OK'
+
+
+def status(gid, uri):
+    return {'gid': gid, 'files': [{'uris': [{'uri': uri}]}]}
+
+
+class WindowTest(unittest.TestCase):
+    def test_times(self):
+        # End of day is 24:00
+        Window('22:00', '24:00', '1M')
+        for value in ('24:30', '25:00', '12:60', '-1:00', '12', None):
+            with self.assertRaises(ValueError):
+                Window(value, '24:00', '1M')
+        with self.assertRaises(ValueError):
+            Window('08:00', '18:00', '1M', days=[7])
+
+    def test_end_of_day(self):
+        window = Window('22:00', '24:00', '1M')
+        self.assertTrue(window.contains(at('22:00')))
+        self.assertTrue(window.contains(at('23:59')))
+        self.assertFalse(window.contains(at('00:00')))
+        self.assertFalse(window.contains(at('21:59')))
+
+    def test_overnight(self):
+        # Friday night until Saturday morning
+        window = Window('22:00', '06:00', '1M', days=[4])
+        self.assertTrue(window.contains(at('23:00', 4)))
+        self.assertTrue(window.contains(at('05:59', 5)))
+        self.assertFalse(window.contains(at('06:00', 5)))
+        self.assertFalse(window.contains(at('05:00', 4)))
+        self.assertFalse(window.contains(at('23:00', 5)))
+
+
+class PolicyTest(unittest.TestCase):
+    def test_overall(self):
+        policy = Policy(default='10M', windows=[
+            Window('08:00', '18:00', '2M', days=range(5)),
+            Window('00:00', '24:00', '5M')])
+        self.assertEqual(policy.overall(at('12:00')), 2 * 1024 * 1024)
+        self.assertEqual(policy.overall(at('12:00', 5)), 5 * 1024 * 1024)
+        self.assertEqual(Policy(default='1K').overall(at('12:00')), 1024)
+
+    def test_back_off(self):
+        policy = Policy(capacity=1000, headroom=100, minimum=200)
+        self.assertEqual(policy.overall(at('12:00')), 900)
+        self.assertEqual(policy.overall(at('12:00'), other=500), 400)
+        self.assertEqual(policy.overall(at('12:00'), other=1000), 200)
+        limited = Policy(default=300, capacity=1000)
+        self.assertEqual(limited.overall(at('12:00')), 300)
+        self.assertEqual(limited.overall(at('12:00'), other=800), 200)
+
+    def test_job_limits(self):
+        policy = Policy(shares={'mirror.example.com': 0.5})
+        hosts = {'a': 'mirror.example.com', 'b': 'mirror.example.com',
+                 'c': 'example.com'}
+        self.assertEqual(policy.job_limits(1000, hosts),
+                         {'a': 250, 'b': 250, 'c': 0})
+        self.assertEqual(policy.job_limits(0, hosts),
+                         {'a': 0, 'b': 0, 'c': 0})
+        with self.assertRaises(ValueError):
+            Policy(shares={'example.com': 1.5})
+
+
+class GovernorTest(unittest.TestCase):
+    def test_step(self):
+        rpc = FakeRPC([status('a', 'http://mirror.example.com/a'),
+                       status('b', 'http://example.com/b')])
+        policy = Policy(default=1000, shares={'mirror.example.com': 0.5},
+                        windows=[Window('08:00', '18:00', 400)])
+        governor = Governor(rpc, policy)
+        self.assertEqual(governor.step(at('07:00')), 1000)
+        self.assertEqual(rpc.calls, [
+            ('changeGlobalOption', {'max-overall-download-limit': '1000'}),
+            ('changeOption', ['a', {'max-download-limit': '500'}])])
+        # Nothing changed, nothing is sent
+        del rpc.calls[:]
+        governor.step(at('07:30'))
+        self.assertEqual(rpc.calls, [])
+        governor.step(at('08:00'))
+        self.assertEqual(rpc.calls, [
+            ('changeGlobalOption', {'max-overall-download-limit': '400'}),
+            ('changeOption', ['a', {'max-download-limit': '200'}])])
+        self.assertEqual(governor.overall, 400)
+
+    def test_finished_meanwhile(self):
+        rpc = FakeRPC([status(gid, 'http://mirror.example.com/' + gid)
+                       for gid in 'abc'])
+        rpc.finished.add('b')
+        governor = Governor(rpc, Policy(default=900,
+                                        shares={'mirror.example.com': 1}))
+        self.assertEqual(governor.step(at('12:00')), 900)
+        self.assertEqual([call[1][0] for call in rpc.calls[1:]], ['a', 'c'])
+        # Limit of finished download is not remembered as set
+        del rpc.calls[:]
+        rpc.finished.clear()
+        governor.step(at('12:00'))
+        self.assertEqual(rpc.calls, [
+            ('changeOption', ['b', {'max-download-limit': '300'}])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""Command line tool against fake aria2c daemon and local range server"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+from click.testing import CliRunner
+
+from downloader.__main__ import main
+
+from .server import RangeServer
+from .test_rpc import GID, SECRET, FakeDaemonHandler
+
+MIB = 1024 * 1024
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          FakeDaemonHandler)
+        self.server.daemon_threads = True
+        self.server.calls = []
+        self.server.connections = set()
+        self.server.close = False
+        self.server.results = {
+            'aria2.getVersion': {'version': '1.37.0'},
+            'aria2.addUri': GID,
+            'aria2.tellStatus': {'gid': GID, 'status': 'complete'}
+        }
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+        self.journal = os.path.join(self.dir, 'session.sqlite')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def invoke(self, *args):
+        return CliRunner().invoke(main, [
+            '--rpc-port', str(self.server.server_address[1]),
+            '--rpc-secret', SECRET, '--settings', 'default'] + list(args))
+
+    def test_resume_known_gid(self):
+        result = self.invoke('--session', self.journal,
+                             'http://example.com/file.bin')
+        self.assertEqual(result.exit_code, 0, result.output)
+        # Daemon rejects GID it already has
+        del self.server.results['aria2.addUri']
+        result = self.invoke('--resume', self.journal)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('already in aria2c daemon', result.output)
+        result = self.invoke('--resume', self.journal)
+        self.assertIn('0 unfinished jobs', result.output)
+
+    def test_rule_allocation(self):
+        rules = os.path.join(self.dir, 'rules.json')
+        with open(rules, 'w') as stream:
+            json.dump([{'host': 'example.com',
+                        'options': {'file_allocation': 'prealloc'}}], stream)
+        with mock.patch('downloader.storage.read_mounts',
+                        return_value=[('/', 'vfat', '/dev/sda1')]):
+            result = CliRunner().invoke(main, [
+                '--rpc-port', str(self.server.server_address[1]),
+                '--rpc-secret', SECRET, '--rules', rules,
+                'http://example.com/file.bin', 'http://example.org/file.bin'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        options = [params[-1] for name, params in self.server.calls
+                   if name == 'aria2.addUri']
+        # prealloc of unknown size is unsafe on vfat, but the rule wins
+        self.assertEqual([option.get('file-allocation')
+                          for option in options], ['prealloc', 'trunc'])
+        # So does profile given by --settings
+        del self.server.calls[:]
+        with mock.patch('downloader.storage.read_mounts',
+                        return_value=[('/', 'vfat', '/dev/sda1')]):
+            result = self.invoke('http://example.org/file.bin')
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertNotIn('file-allocation', [
+            params[-1] for name, params in self.server.calls
+            if name == 'aria2.addUri'][0])
+
+    def test_cache_rejected(self):
+        result = self.invoke('--cache', 'http://example.com/file.bin')
+        self.assertEqual(result.exit_code, 2)
+        self.assertEqual(self.server.calls, [('aria2.getVersion', [])])
+
+    def test_priority_without_daemon(self):
+        result = CliRunner().invoke(main, [
+            '--rpc-port', '1', '--priority', 'interactive',
+            'http://example.com/file.bin'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('--priority', result.output)
+
+
+class PreflightTest(unittest.TestCase):
+    def setUp(self):
+        self.server = RangeServer()
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+        self.cache = os.path.join(self.dir, 'cache')
+        environ = mock.patch.dict(os.environ, {
+            'XDG_CACHE_HOME': self.cache,
+            'XDG_CONFIG_HOME': os.path.join(self.dir, 'config')})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.rules = os.path.join(self.dir, 'rules.json')
+        with open(self.rules, 'w') as stream:
+            json.dump([{'host': '127.0.0.1', 'options': {'dir': self.dir}},
+                       {'prefix': self.server.url('fixed'),
+                        'options': {'split': 2}}], stream)
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_autotuned(self):
+        data = self.server.add('tuned.bin', 32 * MIB)
+        self.server.add('fixed.bin', 32 * MIB)
+        result = CliRunner().invoke(main, [
+            '--rpc-port', '1', '--settings', 'default', '--rules',
+            self.rules, '--preflight', self.server.url('tuned.bin'),
+            self.server.url('fixed.bin')])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with open(os.path.join(self.dir, 'tuned.bin'), 'rb') as stream:
+            self.assertEqual(stream.read(), data)
+        # Only the download tuned by size is learned from, split of the
+        # other one comes from its rule
+        with open(os.path.join(self.cache, 'downloader',
+                               'autotune.json')) as stream:
+            history = json.load(stream)
+        self.assertEqual(list(history), ['127.0.0.1|3'])
+        self.assertEqual(list(history['127.0.0.1|3']), ['16/1048576/16'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Option descriptors of Aria2c"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from downloader.aria2c import Aria2c
+from downloader.settings import Settings
+
+
+class PathOptionTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_checked_when_set(self):
+        aria2c = Aria2c()
+        with self.assertRaises(ValueError):
+            aria2c.dir = os.path.join(self.dir, 'missing')
+        aria2c.dir = self.dir
+        # Reading the option serves the stored value
+        with mock.patch('os.path.isdir') as isdir:
+            self.assertEqual(aria2c.dir, self.dir)
+            self.assertEqual(aria2c.path, None)
+        isdir.assert_not_called()
+
+    def test_revalidated_when_compiled(self):
+        settings = Settings()
+        aria2c = Aria2c()
+        aria2c.use_settings(settings)
+        aria2c.uri = 'http://example.com/file.bin'
+        aria2c.dir = self.dir
+        self.assertIn('--dir={}'.format(self.dir), aria2c.command)
+        os.rmdir(self.dir)
+        aria2c.split = 2
+        # Directory removed meanwhile falls back to settings
+        self.assertNotIn('--dir={}'.format(self.dir), aria2c.command)
+        self.assertEqual(aria2c.dir, settings.dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
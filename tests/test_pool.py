@@ -0,0 +1,38 @@
+"""Pool of aria2c daemons"""
+
+import unittest
+from unittest import mock
+
+from downloader.aria2c import Aria2cDaemon
+from downloader.pool import DaemonPool
+
+
+class DaemonPoolTest(unittest.TestCase):
+    def test_stop_started(self):
+        pool = DaemonPool(3, base_port=6800)
+        running = set([6801])
+        started = []
+        stopped = []
+
+        def start(daemon, template):
+            started.append(daemon._port)
+            running.add(daemon._port)
+
+        def stop(daemon):
+            stopped.append(daemon._port)
+            running.discard(daemon._port)
+
+        with mock.patch.multiple(
+                Aria2cDaemon, start=start, stop=stop,
+                is_running=lambda daemon: daemon._port in running):
+            with pool:
+                self.assertEqual(started, [6800, 6802])
+            # Daemon running before the pool keeps running
+            self.assertEqual(sorted(stopped), [6800, 6802])
+            self.assertEqual(running, set([6801]))
+            pool.stop()
+            self.assertEqual(len(stopped), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Concurrent HEAD requests and their cache"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from downloader.aria2c import Aria2c
+from downloader.preflight import Preflight
+
+from .server import RangeServer
+
+
+class PreflightTest(unittest.TestCase):
+    def setUp(self):
+        self.server = RangeServer()
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+        self.preflight = Preflight(os.path.join(self.dir, 'preflight.sqlite'))
+
+    def tearDown(self):
+        self.preflight.close()
+        self.server.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def job(self, name):
+        aria2c = Aria2c()
+        aria2c.uri = self.server.url(name)
+        return aria2c
+
+    def test_run(self):
+        self.server.add('a.bin', 1000)
+        self.server.add('b.bin', 0)
+        heads = self.preflight.run([self.job('a.bin'), self.job('b.bin'),
+                                    self.job('a.bin'),
+                                    self.job('missing.bin')])
+        self.assertEqual([head.size if head else None for head in heads],
+                         [1000, 0, 1000, None])
+        self.assertIs(heads[0], heads[2])
+        self.assertTrue(heads[0].ranges)
+        self.assertTrue(heads[0].etag)
+        # Every URL is requested once
+        self.assertEqual(sorted(path for method, path, headers in
+                                self.server.requests),
+                         ['/a.bin', '/b.bin', '/missing.bin'])
+        self.assertEqual(set(method for method, path, headers in
+                             self.server.requests), {'HEAD'})
+
+    def test_cache(self):
+        self.server.add('a.bin', 1000)
+        self.preflight.run([self.job('a.bin'), self.job('missing.bin')])
+        del self.server.requests[:]
+        head, failed = self.preflight.run([self.job('a.bin'),
+                                           self.job('missing.bin')])
+        self.assertEqual((head.size, head.ranges), (1000, True))
+        self.assertIsNone(failed)
+        # Failed request is not cached
+        self.assertEqual([path for method, path, headers in
+                          self.server.requests], ['/missing.bin'])
+
+    def test_expired(self):
+        self.preflight.close()
+        self.preflight = Preflight(os.path.join(self.dir, 'preflight.sqlite'),
+                                   ttl=-1)
+        self.server.add('a.bin', 1000)
+        self.preflight.run([self.job('a.bin')])
+        self.preflight.run([self.job('a.bin')])
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_redirect(self):
+        self.server.add('a.bin', 1000)
+        self.server.redirects['latest.bin'] = self.server.url('a.bin')
+        head, = self.preflight.run([self.job('latest.bin')])
+        self.assertEqual(head.size, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+"""PriorityQueue preemption and aging against fake daemon"""
+
+import io
+import itertools
+import unittest
+from unittest import mock
+
+from downloader.aria2c import Aria2c
+from downloader.priority import PriorityQueue
+from downloader.rpc import RPCError
+
+
+class FakeClock(object):
+    """Replaces time module of priority, time moves only when set"""
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeRPC(object):
+    """Daemon keeping status of downloads, calls recorded by name
+
+    Attributes:
+        added (str): Status of new downloads, 'active' or 'waiting'
+        rejected (set): Names of downloads aria2 rejects
+        down (bool): Daemon doesn't answer
+    """
+    def __init__(self):
+        self.added = 'active'
+        self.rejected = set()
+        self.down = False
+        self.status = {}
+        self.names = {}
+        self.calls = []
+        self._gids = itertools.count(1)
+
+    def gid(self, name):
+        return next(gid for gid, known in self.names.items() if known == name)
+
+    def running(self):
+        return sorted(self.names[gid] for gid, status in self.status.items()
+                      if status in ('active', 'waiting'))
+
+    def finish(self, name):
+        self.status[self.gid(name)] = 'complete'
+
+    def add_uri(self, uris, options=None):
+        if self.down:
+            raise ConnectionRefusedError(111, 'Connection refused')
+        if uris[0].rsplit('/', 1)[1] in self.rejected:
+            raise RPCError(1, 'Invalid URI')
+        gid = '{:016x}'.format(next(self._gids))
+        self.names[gid] = uris[0].rsplit('/', 1)[1]
+        self.status[gid] = self.added
+        self.calls.append(('add', self.names[gid]))
+        return gid
+
+    def pause(self, gid):
+        self.status[gid] = 'paused'
+        self.calls.append(('pause', self.names[gid]))
+
+    def unpause(self, gid):
+        self.status[gid] = 'active'
+        self.calls.append(('unpause', self.names[gid]))
+
+    def tell_status(self, gid, keys=None):
+        return {'gid': gid, 'status': self.status[gid]}
+
+    def change_position(self, gid, pos, how='POS_SET'):
+        if self.status[gid] != 'waiting':
+            raise RPCError(1, 'GID#{} not found in the waiting queue.'
+                           .format(gid))
+        self.calls.append(('front', self.names[gid]))
+
+    def multicall(self, calls):
+        return [self.tell_status(*params) for _, params in calls]
+
+
+def job(name):
+    aria2c = Aria2c()
+    aria2c.uri = 'http://example.com/{}'.format(name)
+    return aria2c
+
+
+class PriorityQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('downloader.priority.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rpc = FakeRPC()
+
+    def test_preempt_aged_bulk(self):
+        queue = PriorityQueue(self.rpc, slots=1, aging=300)
+        bulk = queue.submit(job('bulk'), 'bulk')
+        self.clock.now = 700
+        # Aged bulk has smaller key than the interactive job, 600 < 700, it
+        # still has to give way to it
+        interactive = queue.submit(job('interactive'), 'interactive')
+        self.assertEqual(self.rpc.running(), ['interactive'])
+        self.assertEqual(self.rpc.status[self.rpc.gid('bulk')], 'paused')
+        self.assertEqual(queue.preempted, 1)
+        self.assertEqual(queue.queue_depth()['bulk'], 1)
+
+        self.clock.now = 710
+        self.rpc.finish('interactive')
+        self.assertEqual(queue.step(), 1)
+        self.assertEqual(interactive.result(0), 'complete')
+        self.assertEqual(self.rpc.running(), ['bulk'])
+        # Paused download continues, it isn't added again
+        self.assertEqual(self.rpc.calls, [
+            ('add', 'bulk'), ('pause', 'bulk'), ('add', 'interactive'),
+            ('unpause', 'bulk')])
+
+        self.clock.now = 800
+        self.rpc.finish('bulk')
+        self.assertEqual(queue.step(), 0)
+        self.assertEqual(bulk.result(0), 'complete')
+        latency = queue.latency()
+        self.assertEqual(latency['bulk']['wait']['max'], 0)
+        self.assertEqual(latency['bulk']['total']['max'], 800)
+        self.assertEqual(latency['interactive']['total']['max'], 10)
+
+    def test_aging(self):
+        queue = PriorityQueue(self.rpc, slots=1, aging=300)
+        queue.submit(job('first'), 'interactive')
+        queue.submit(job('bulk'), 'bulk')
+        self.clock.now = 400
+        queue.submit(job('normal'), 'normal')
+        # bulk waits for 600 - 0, normal for 300 + 400
+        self.clock.now = 500
+        self.rpc.finish('first')
+        queue.step()
+        self.assertEqual(self.rpc.running(), ['bulk'])
+        self.assertEqual(queue.queue_depth()['normal'], 1)
+        self.assertEqual(queue.preempted, 0)
+
+    def test_no_preemption_of_urgent(self):
+        queue = PriorityQueue(self.rpc, slots=1)
+        queue.submit(job('normal'), 'normal')
+        queue.submit(job('other'), 'normal')
+        queue.submit(job('bulk'), 'bulk')
+        self.assertEqual(self.rpc.running(), ['normal'])
+        self.assertEqual(queue.preempted, 0)
+
+    def test_preempt_disabled(self):
+        queue = PriorityQueue(self.rpc, slots=1, preempt=False)
+        queue.submit(job('bulk'), 'bulk')
+        queue.submit(job('interactive'), 'interactive')
+        self.assertEqual(self.rpc.running(), ['bulk'])
+        self.assertNotIn(('pause', 'bulk'), self.rpc.calls)
+
+    def test_waiting_moved_to_front(self):
+        queue = PriorityQueue(self.rpc, slots=2)
+        queue.submit(job('active'), 'normal')
+        self.rpc.added = 'waiting'
+        queue.submit(job('waiting'), 'normal')
+        self.assertEqual(self.rpc.calls, [
+            ('add', 'active'), ('add', 'waiting'), ('front', 'waiting')])
+
+    def test_report(self):
+        queue = PriorityQueue(self.rpc, slots=1)
+        queue.submit(job('file'), 'interactive')
+        self.clock.now = 2
+        self.rpc.finish('file')
+        queue.join(interval=1)
+        stream = io.StringIO()
+        queue.report(stream)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1].split(),
+                         ['interactive', '1', '0.00', '0.00', '2.00', '2.00'])
+
+    def test_rejected(self):
+        self.rpc.rejected.add('bad')
+        queue = PriorityQueue(self.rpc, slots=1)
+        bad = queue.submit(job('bad'))
+        good = queue.submit(job('good'))
+        with self.assertRaises(RPCError):
+            bad.result(0)
+        # Slot of the rejected download goes to the next one
+        self.assertEqual(self.rpc.running(), ['good'])
+        self.rpc.finish('good')
+        self.assertEqual(queue.step(), 0)
+        self.assertEqual(good.result(0), 'complete')
+
+    def test_daemon_down(self):
+        self.rpc.down = True
+        queue = PriorityQueue(self.rpc, slots=1)
+        future = queue.submit(job('a'))
+        self.assertFalse(future.done())
+        self.assertEqual(queue.queue_depth()['normal'], 1)
+        self.rpc.down = False
+        self.assertEqual(queue.step(), 1)
+        self.assertEqual(self.rpc.running(), ['a'])
+
+    def test_arguments(self):
+        with self.assertRaises(TypeError):
+            PriorityQueue(self.rpc, slots=1.5)
+        with self.assertRaises(ValueError):
+            PriorityQueue(self.rpc, slots=0)
+        with self.assertRaises(ValueError):
+            PriorityQueue(self.rpc, aging=0)
+        with self.assertRaises(ValueError):
+            PriorityQueue(self.rpc).submit(job('file'), 'urgent')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Parser of aria2c console output"""
+
+import unittest
+
+from downloader.progress import (CompleteEvent, ErrorEvent, ProgressEvent,
+                                 ProgressParser, parse_eta, parse_size)
+
+READOUT = (b'\r[#2089b0 1.0MiB/4.0MiB(25%) CN:4 DL:512KiB ETA:6s]'
+           b'\r[#2089b0 2.0MiB/4.0MiB(50%) CN:4 DL:1.0MiB ETA:2s]')
+RESULTS = (b'\nDownload Results:\n'
+           b'gid   |stat|avg speed  |path/URI\n'
+           b'======+====+===========+=======================================\n'
+           b'2089b0|OK  |   1.5MiB/s|/tmp/file.iso\n'
+           b'd2f1a3|ERR |       0B/s|http://example.com/missing.iso\n'
+           b'\nStatus Legend:\n(OK):download completed.\n')
+
+
+class ProgressParserTest(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(parse_size('512B'), 512)
+        self.assertEqual(parse_size('1.5KiB'), 1536)
+        self.assertEqual(parse_size('2GiB'), 2 * 1024 ** 3)
+        self.assertIsNone(parse_size('n/a'))
+        self.assertEqual(parse_eta('1h2m3s'), 3723)
+        self.assertEqual(parse_eta('45s'), 45)
+        self.assertIsNone(parse_eta(''))
+        self.assertIsNone(parse_eta('soon'))
+
+    def test_readout(self):
+        events = ProgressParser().feed(READOUT + b'\r')
+        self.assertEqual(len(events), 2)
+        event = events[1]
+        self.assertIs(type(event), ProgressEvent)
+        self.assertEqual((event.gid, event.completed, event.total,
+                          event.connections, event.speed, event.eta),
+                         ('2089b0', 2 * 1024 ** 2, 4 * 1024 ** 2, 4,
+                          1024 ** 2, 2))
+        self.assertEqual(event.percent, 50)
+
+    def test_results(self):
+        events = ProgressParser().feed(RESULTS)
+        self.assertEqual([type(event) for event in events],
+                         [CompleteEvent, ErrorEvent])
+        self.assertEqual((events[0].gid, events[0].speed, events[0].path),
+                         ('2089b0', 1536 * 1024, '/tmp/file.iso'))
+        self.assertEqual((events[1].status, events[1].path),
+                         ('ERR', 'http://example.com/missing.iso'))
+
+    def test_chunks(self):
+        output = READOUT + RESULTS
+        parser = ProgressParser()
+        events = []
+        # Lines split between chunks are parsed once they are complete
+        for start in range(0, len(output), 7):
+            events.extend(parser.feed(output[start:start + 7]))
+        events.extend(parser.close())
+        whole = ProgressParser().feed(output)
+        self.assertEqual([repr(event) for event in events],
+                         [repr(event) for event in whole])
+        self.assertEqual(len(events), 4)
+
+    def test_unterminated_line(self):
+        parser = ProgressParser()
+        self.assertEqual(parser.feed(b'[#2089b0 1.0MiB/4.0MiB(25%) CN:1]'),
+                         [])
+        events = parser.close()
+        self.assertEqual(len(events), 1)
+        self.assertIsNone(events[0].eta)
+        self.assertEqual(parser.close(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
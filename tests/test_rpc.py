@@ -0,0 +1,188 @@
+"""JSON-RPC client against fake aria2c daemon"""
+
+import base64
+import json
+import os
+import stat
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from downloader.aria2c import Aria2c, Aria2cDaemon
+from downloader.rpc import Aria2RPC, RPCError
+
+SECRET = 'secret'
+GID = '2089b05ecca3d829'
+
+
+class FakeDaemonHandler(BaseHTTPRequestHandler):
+    """aria2c JSON-RPC interface answering from the server's results
+
+    Calls are recorded as (method, params without token) on the server.
+    Unknown methods and a wrong token return aria2c errors.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _answer(self, request):
+        params = list(request.get('params', []))
+        if not params or params[0] != 'token:{}'.format(SECRET):
+            return {'jsonrpc': '2.0', 'id': request['id'],
+                    'error': {'code': 1, 'message': 'Unauthorized'}}
+        self.server.calls.append((request['method'], params[1:]))
+        if request['method'] not in self.server.results:
+            return {'jsonrpc': '2.0', 'id': request['id'],
+                    'error': {'code': 1,
+                              'message': 'No such method: {}'.format(
+                                  request['method'])}}
+        return {'jsonrpc': '2.0', 'id': request['id'],
+                'result': self.server.results[request['method']]}
+
+    def do_POST(self):
+        self.server.connections.add(self.client_address)
+        body = json.loads(self.rfile.read(
+            int(self.headers['Content-Length'])).decode('utf-8'))
+        if isinstance(body, list):
+            answer = [self._answer(request) for request in body]
+        else:
+            answer = self._answer(body)
+        data = json.dumps(answer).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        # Kept-alive connection closed without notice like by idle timeout
+        self.close_connection = self.server.close
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class RPCTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          FakeDaemonHandler)
+        self.server.daemon_threads = True
+        self.server.calls = []
+        self.server.connections = set()
+        self.server.close = False
+        self.server.results = {
+            'aria2.getVersion': {'version': '1.37.0'},
+            'aria2.addUri': GID,
+            'aria2.addTorrent': GID,
+            'aria2.tellStatus': {'gid': GID, 'status': 'active'},
+            'aria2.changePosition': 0,
+            'aria2.shutdown': 'OK'
+        }
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.port = self.server.server_address[1]
+        self.rpc = Aria2RPC('http://127.0.0.1:{}/jsonrpc'.format(self.port),
+                            secret=SECRET, timeout=5)
+
+    def tearDown(self):
+        self.rpc.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_call_sends_token(self):
+        self.assertEqual(self.rpc.get_version(), {'version': '1.37.0'})
+        self.assertEqual(self.server.calls, [('aria2.getVersion', [])])
+
+    def test_error(self):
+        with self.assertRaises(RPCError) as raised:
+            self.rpc.pause(GID)
+        self.assertEqual(raised.exception.code, 1)
+        self.assertEqual(raised.exception.message,
+                         'No such method: aria2.pause')
+
+    def test_wrong_secret(self):
+        rpc = Aria2RPC('http://127.0.0.1:{}/jsonrpc'.format(self.port),
+                       secret='wrong')
+        try:
+            with self.assertRaises(RPCError):
+                rpc.get_version()
+        finally:
+            rpc.close()
+
+    def test_multicall(self):
+        results = self.rpc.multicall([
+            ('aria2.tellStatus', [GID, ['status']]),
+            ('aria2.changePosition', [GID, 0, 'POS_SET'])])
+        self.assertEqual(results, [{'gid': GID, 'status': 'active'}, 0])
+        self.assertEqual(self.server.calls, [
+            ('aria2.tellStatus', [GID, ['status']]),
+            ('aria2.changePosition', [GID, 0, 'POS_SET'])])
+
+    def test_multicall_error(self):
+        with self.assertRaises(RPCError):
+            self.rpc.multicall([('aria2.getVersion', []),
+                                ('aria2.unpause', [GID])])
+
+    def test_empty_multicall(self):
+        self.assertEqual(self.rpc.multicall([]), [])
+        self.assertEqual(self.server.calls, [])
+
+    def test_connection_reused(self):
+        for _ in range(5):
+            self.rpc.get_version()
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_reconnect_after_close(self):
+        self.server.close = True
+        for _ in range(3):
+            self.assertEqual(self.rpc.tell_status(GID, ['status'])['status'],
+                             'active')
+        self.assertEqual(len(self.server.connections), 3)
+
+    def test_add_torrent(self):
+        self.assertEqual(self.rpc.add_torrent(b'd4:infoe'), GID)
+        method, params = self.server.calls[0]
+        self.assertEqual(method, 'aria2.addTorrent')
+        self.assertEqual(base64.b64decode(params[0]), b'd4:infoe')
+        self.assertEqual(params[1:], [[], {}])
+
+    def test_submit(self):
+        aria2c = Aria2c()
+        aria2c.uri = 'http://example.com/file.iso'
+        aria2c.split = 4
+        self.assertEqual(aria2c.submit(self.rpc), GID)
+        method, params = self.server.calls[0]
+        self.assertEqual(method, 'aria2.addUri')
+        self.assertEqual(params[0], ['http://example.com/file.iso'])
+        self.assertEqual(params[1]['split'], '4')
+        self.assertIn('dir', params[1])
+
+    def test_daemon_is_running(self):
+        daemon = Aria2cDaemon('127.0.0.1', self.port, SECRET)
+        try:
+            self.assertTrue(daemon.is_running())
+        finally:
+            daemon.rpc.close()
+        self.assertFalse(Aria2cDaemon('127.0.0.1', self.port,
+                                      'wrong').is_running())
+
+    def test_daemon_secret(self):
+        daemon = Aria2cDaemon('127.0.0.1', self.port, SECRET)
+        command = daemon.command()
+        # Other users see the command line, not the file
+        self.assertFalse(any(SECRET in arg for arg in command))
+        conf = next(arg.partition('=')[2] for arg in command
+                    if arg.startswith('--conf-path='))
+        self.assertEqual(stat.S_IMODE(os.stat(conf).st_mode), 0o600)
+        with open(conf) as stream:
+            self.assertEqual(stream.read(), 'rpc-secret={}\n'.format(SECRET))
+        # The file is gone once the daemon answers
+        with mock.patch('downloader.aria2c.subprocess.Popen'):
+            daemon.start()
+        daemon.rpc.close()
+        self.assertFalse(os.path.exists(conf))
+        with self.assertRaises(ValueError):
+            Aria2cDaemon(secret='a\nrpc-listen-all=true').command()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""URL rules compiled into tries"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import downloader
+from downloader.aria2c import Aria2c
+from downloader.rules import Rule, RuleSet
+from downloader.user import User
+
+
+class RuleSetTest(unittest.TestCase):
+    def rules(self, *rules):
+        return RuleSet(Rule(**rule) for rule in rules)
+
+    def test_host(self):
+        rules = self.rules({'host': 'Example.com', 'options': {'split': 2}})
+        self.assertEqual(rules.match('https://example.com/a').options,
+                         {'split': 2})
+        self.assertEqual(rules.match('https://EXAMPLE.com:8443/a').options,
+                         {'split': 2})
+        self.assertEqual(rules.match('https://user@example.com/a').options,
+                         {'split': 2})
+        self.assertEqual(rules.match('https://www.example.com/a').options,
+                         {})
+
+    def test_wildcard_host(self):
+        rules = self.rules({'host': '*.example.com',
+                            'options': {'split': 2}})
+        self.assertEqual(rules.match('http://cdn.example.com/a').options,
+                         {'split': 2})
+        self.assertEqual(rules.match('http://a.b.example.com/a').options,
+                         {'split': 2})
+        # Domain itself isn't its subdomain
+        self.assertEqual(rules.match('http://example.com/a').options, {})
+        self.assertEqual(rules.match('http://badexample.com/a').options, {})
+
+    def test_prefix(self):
+        rules = self.rules({'prefix': 'https://example.com/releases/',
+                            'options': {'split': 2}})
+        self.assertEqual(
+            rules.match('https://example.com/releases/1.0/a.iso').options,
+            {'split': 2})
+        self.assertEqual(rules.match('https://example.com/releases').options,
+                         {'split': 2})
+        # Prefix matches whole path segments
+        self.assertEqual(
+            rules.match('https://example.com/releases-old/a.iso').options,
+            {})
+        self.assertEqual(
+            rules.match('http://example.com/releases/a.iso').options, {})
+
+    def test_glob(self):
+        rules = self.rules({'glob': 'https://example.com/*/nightly/*.iso',
+                            'options': {'split': 2}})
+        self.assertEqual(
+            rules.match('https://example.com/x/nightly/a.iso').options,
+            {'split': 2})
+        self.assertEqual(
+            rules.match('https://example.com/x/nightly/a.zip').options, {})
+
+    def test_glob_wildcard_host(self):
+        rules = self.rules({'glob': 'https://*.example.org/*.iso',
+                            'options': {'split': 2}},
+                           {'glob': '*://mirror.example.net/*',
+                            'options': {'split': 3}})
+        self.assertEqual(
+            rules.match('https://cdn.example.org/pub/a.iso').options,
+            {'split': 2})
+        self.assertEqual(rules.match('ftp://mirror.example.net/a').options,
+                         {'split': 3})
+        self.assertEqual(rules.match('https://example.com/a.iso').options,
+                         {})
+
+    def test_specificity(self):
+        rules = self.rules(
+            {'prefix': 'https://a.example.com/pub/deep/',
+             'options': {'split': 5}},
+            {'glob': 'https://a.example.com/pub/*',
+             'options': {'split': 4, 'max_tries': 9}},
+            {'host': 'a.example.com',
+             'options': {'split': 3, 'retry_wait': 7}},
+            {'host': '*.example.com',
+             'options': {'split': 2, 'max_connection_per_server': 2}})
+        match = rules.match('https://a.example.com/pub/deep/file.iso')
+        # Wildcard host, exact host, then by number of literal segments
+        self.assertEqual(match.options, {'split': 5,
+                                         'max_connection_per_server': 2,
+                                         'retry_wait': 7, 'max_tries': 9})
+        self.assertEqual(
+            rules.match('https://a.example.com/pub/file').options['split'],
+            4)
+
+    def test_same_rules_share_match(self):
+        rules = self.rules({'host': 'example.com', 'options': {'split': 2}})
+        self.assertIs(rules.match('https://example.com/a'),
+                      rules.match('https://example.com/b'))
+
+    def test_apply(self):
+        rules = self.rules({'host': 'example.com', 'options': {'split': 2},
+                            'credentials': 'build_user'})
+        user = User('build', 'pa55')
+        with mock.patch.object(downloader, 'secret', create=True) as secret:
+            secret.build_user = user
+            aria2c = Aria2c()
+            rules.match('https://example.com/a').apply(aria2c)
+            options = rules.match('https://example.com/a').aria2c_options()
+        self.assertEqual((aria2c.split, aria2c.http_user,
+                          aria2c.http_passwd), (2, 'build', 'pa55'))
+        self.assertEqual(options['http-passwd'], 'pa55')
+
+    def test_missing_credentials(self):
+        rules = self.rules({'host': 'example.com',
+                            'credentials': 'no_such_user'})
+        with self.assertRaises(LookupError):
+            rules.match('https://example.com/a').user()
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            Rule(options={'split': 2})
+        with self.assertRaises(ValueError):
+            Rule(host='example.com', prefix='https://example.com/')
+        with self.assertRaises(ValueError):
+            Rule(host='example.com', options={'no_such_option': 1})
+        with self.assertRaises(ValueError):
+            Rule(host='example.com', options={'max_concurrent_downloads': 2})
+        with self.assertRaises(TypeError):
+            Rule(host='example.com', options={'split': '2'})
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_load(self):
+        path = os.path.join(self.dir, 'rules.json')
+        with open(path, 'w') as stream:
+            json.dump([{'host': 'example.com', 'options': {'split': 2}}],
+                      stream)
+        rules = RuleSet.load(path)
+        self.assertEqual(rules.match('https://example.com/a').options,
+                         {'split': 2})
+        # Built-in rule of the TeamCity server comes first
+        self.assertEqual(len(rules), 2)
+        self.assertEqual(len(RuleSet.load(path, builtin=False)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
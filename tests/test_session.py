@@ -0,0 +1,100 @@
+"""Journal of downloads and resume after crash"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from downloader.rules import Rule, RuleSet
+from downloader.session import Session, completed, read_gids
+
+SESSION = '''http://example.com/a.iso
+ dir=/tmp
+ gid=00000000000000AA
+http://example.com/b.iso
+ gid=00000000000000bb
+ split=4
+'''
+
+
+class SessionTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+        self.session = Session(os.path.join(self.dir, 'session.sqlite'))
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, name, data=b'data'):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as stream:
+            stream.write(data)
+        return path
+
+    def test_read_gids(self):
+        path = os.path.join(self.dir, 'aria2c.session')
+        self.assertEqual(read_gids(path), set())
+        with open(path, 'w') as stream:
+            stream.write(SESSION)
+        self.assertEqual(read_gids(path),
+                         {'00000000000000aa', '00000000000000bb'})
+
+    def test_completed(self):
+        path = self.write('a.iso')
+        self.assertTrue(completed(path))
+        self.write('a.iso.aria2')
+        self.assertFalse(completed(path))
+        self.assertFalse(completed(os.path.join(self.dir, 'missing')))
+
+    def test_add(self):
+        gids = self.session.add([
+            (['http://example.com/a', 'http://mirror.example.com/a'],
+             {'split': '4', 'http-user': 'build', 'http-passwd': 'pa55'},
+             None),
+            (['http://example.com/b'], None, None)])
+        self.assertEqual(len(set(gids)), 2)
+        self.assertTrue(all(len(gid) == 16 for gid in gids))
+        # Credentials are not stored
+        self.assertEqual(self.session.unfinished(), [
+            (['http://example.com/a', 'http://mirror.example.com/a'],
+             {'split': '4', 'gid': gids[0]}),
+            (['http://example.com/b'], {'gid': gids[1]})])
+        self.assertEqual(self.session.counts(), {'pending': 2})
+
+    def test_unfinished_rules(self):
+        gid, = self.session.add([(['http://example.com/a'], None, None)])
+        rules = RuleSet([Rule(host='example.com', options={'split': 2})])
+        self.assertEqual(self.session.unfinished(rules), [
+            (['http://example.com/a'], {'split': '2', 'gid': gid})])
+
+    def test_reconcile(self):
+        done = self.write('done.iso')
+        partial = self.write('partial.iso')
+        self.write('partial.iso.aria2')
+        listed = self.write('listed.iso')
+        gids = self.session.add([
+            (['http://example.com/done.iso'], None, done),
+            (['http://example.com/partial.iso'], None, partial),
+            (['http://example.com/listed.iso'], None, listed),
+            (['http://example.com/unknown.iso'], None, None)])
+        # aria2c still lists the download, its file is not complete yet
+        with open(self.session.aria2c_session, 'w') as stream:
+            stream.write('http://example.com/listed.iso\n gid={}\n'
+                         .format(gids[2]))
+        self.assertEqual(self.session.reconcile(), 3)
+        self.assertEqual(self.session.counts(),
+                         {'complete': 1, 'pending': 3})
+        self.assertEqual([options['gid'] for _, options in
+                          self.session.unfinished()], gids[1:])
+
+    def test_mark(self):
+        gids = self.session.add([(['http://example.com/a'], None, None)])
+        self.session.mark(gids)
+        self.assertEqual(self.session.unfinished(), [])
+        self.session.mark(gids, 'pending')
+        self.assertEqual(self.session.counts(), {'pending': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Mount detection, file allocation and free space"""
+
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+
+from downloader.storage import (PREALLOC_LIMIT, Volume, check_space,
+                                read_mounts, volume)
+
+# Mount points are under {0}, the test directory
+MOUNTS = '''sysfs /sys sysfs rw,nosuid 0 0
+/dev/sda1 / ext4 rw,relatime 0 0
+server:/export {0}/my\\040files nfs4 rw 0 0
+/dev/sdb1 {0}/data xfs rw 0 0
+/dev/sdc1 {0}/data vfat rw 0 0
+/dev/sdd1 {0}/data/usb vfat rw 0 0
+'''
+
+
+class MountsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = os.path.realpath(
+            tempfile.mkdtemp(prefix='downloader-test-'))
+        for name in ('my files', 'data/usb'):
+            os.makedirs(os.path.join(self.dir, name))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def mounts(self):
+        path = self.path('mounts')
+        with open(path, 'w') as stream:
+            stream.write(MOUNTS.format(self.dir))
+        return read_mounts(path)
+
+    def test_read_mounts(self):
+        mounts = self.mounts()
+        self.assertEqual(mounts[2], (self.path('my files'), 'nfs4',
+                                     'server:/export'))
+        self.assertEqual(len(mounts), 6)
+        self.assertEqual(read_mounts(self.path('missing')), [])
+
+    def test_volume(self):
+        mounts = self.mounts()
+        # Longest mount point, the last mount of it covers earlier ones
+        # Paths which don't exist yet are on the filesystem of the parent
+        self.assertEqual(volume(self.path('data/iso/a.iso'), mounts).device,
+                         '/dev/sdc1')
+        self.assertEqual(volume(self.path('data/usb'), mounts).device,
+                         '/dev/sdd1')
+        self.assertEqual(volume(self.path('data/usbstick'), mounts).device,
+                         '/dev/sdc1')
+        self.assertEqual(volume(self.path('my files/a'), mounts).fstype,
+                         'nfs4')
+        self.assertEqual(volume(self.path('a.iso'), mounts).fstype, 'ext4')
+        self.assertIsNone(volume(self.path('a.iso'), []).fstype)
+
+    def test_allocation(self):
+        ext4 = Volume('/', '/', 'ext4')
+        self.assertEqual(ext4.allocation(None, 'prealloc'), 'falloc')
+        self.assertEqual(ext4.allocation(None, 'trunc'), 'trunc')
+        self.assertEqual(ext4.allocation(None, 'none'), 'none')
+        for fstype in ('overlay', 'zfs'):
+            self.assertEqual(Volume('/', '/', fstype).allocation(),
+                             'falloc')
+        for fstype in ('nfs4', 'fuse.sshfs', 'cifs'):
+            self.assertEqual(Volume('/', '/', fstype).allocation(),
+                             'none')
+        vfat = Volume('/', '/', 'vfat')
+        self.assertEqual(vfat.allocation(PREALLOC_LIMIT, 'prealloc'),
+                         'prealloc')
+        self.assertEqual(vfat.allocation(PREALLOC_LIMIT + 1, 'prealloc'),
+                         'trunc')
+        self.assertEqual(vfat.allocation(None, 'prealloc'), 'trunc')
+        self.assertEqual(vfat.allocation(1, 'falloc'), 'trunc')
+        self.assertEqual(Volume('/').allocation(1, 'falloc'), 'trunc')
+
+    def test_check_space(self):
+        path = self.path('new/a.iso')
+        partial = self.path('partial.iso')
+        with open(partial, 'wb') as stream:
+            stream.write(b'x' * 100)
+        needed = check_space([(path, 1000), (partial, 150),
+                              (self.path('b.iso'), None)])
+        self.assertEqual(needed, {os.stat(self.dir).st_dev: 1050})
+        with self.assertRaises(OSError) as context:
+            check_space([(path, 1 << 62)])
+        self.assertEqual(context.exception.errno, errno.ENOSPC)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Checksums, manifests and parallel verification"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from downloader.verify import (file_digest, parse_checksum, parse_manifest,
+                               verify)
+
+DATA = b'downloader' * 1000
+SHA256 = hashlib.sha256(DATA).hexdigest()
+MD5 = hashlib.md5(DATA).hexdigest()
+
+
+class ChecksumTest(unittest.TestCase):
+    def test_parse_checksum(self):
+        self.assertEqual(parse_checksum('sha-256=' + SHA256.upper()),
+                         ('sha-256', SHA256))
+        with self.assertRaises(ValueError):
+            parse_checksum('sha256=' + SHA256)
+        with self.assertRaises(ValueError):
+            parse_checksum('sha-256=' + MD5)
+        with self.assertRaises(ValueError):
+            parse_checksum('md5=' + 'x' * 32)
+
+    def test_gnu_manifest(self):
+        manifest = parse_manifest(io.StringIO(
+            '# comment\n\n'
+            '{}  file.iso\n'
+            '{} *binary name.bin\n'
+            '\\{}  escaped\\\\name\n'.format(SHA256, MD5, SHA256)))
+        self.assertEqual(list(manifest.items()), [
+            ('file.iso', 'sha-256=' + SHA256),
+            ('binary name.bin', 'md5=' + MD5),
+            ('escaped\\\\name', 'sha-256=' + SHA256)])
+
+    def test_bsd_manifest(self):
+        manifest = parse_manifest(io.StringIO(
+            'SHA256 (file.iso) = {}\nMD5 ((1).bin) = {}\n'.format(
+                SHA256.upper(), MD5)))
+        self.assertEqual(manifest['file.iso'], 'sha-256=' + SHA256)
+        self.assertEqual(manifest['(1).bin'], 'md5=' + MD5)
+
+    def test_invalid_manifest(self):
+        with self.assertRaises(ValueError):
+            parse_manifest(io.StringIO('{}  file.iso\n'.format(SHA256[:-1])))
+        with self.assertRaises(ValueError):
+            parse_manifest(io.StringIO('not a manifest\n'))
+
+
+class VerifyTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='downloader-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as stream:
+            stream.write(data)
+        return path
+
+    def test_file_digest(self):
+        path = self.write('file.bin', DATA)
+        # Chunks smaller than the file and an empty file
+        self.assertEqual(file_digest(path, 'sha-256', chunk_size=4096),
+                         SHA256)
+        self.assertEqual(file_digest(self.write('empty.bin', b''), 'md5'),
+                         hashlib.md5(b'').hexdigest())
+
+    def test_verify(self):
+        good = self.write('good.bin', DATA)
+        bad = self.write('bad.bin', DATA[:-1])
+        missing = os.path.join(self.dir, 'missing.bin')
+        checksums = dict((path, 'sha-256=' + SHA256)
+                         for path in (good, bad, missing))
+        expected = {good: True, bad: False, missing: False}
+        self.assertEqual(verify(checksums, workers=2), expected)
+        self.assertEqual(verify(checksums, workers=1), expected)
+        self.assertEqual(verify({}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()